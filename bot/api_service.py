@@ -1,9 +1,44 @@
 """
 API Service для взаємодії з API Львівобленерго
 """
+import re
+from functools import lru_cache
+
 import aiohttp
 from typing import Optional, List, Dict, Any
 from config import LOE_API_BASE, LOE_MAIN_API_BASE
+from metrics import http_trace_config
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Регулярні вирази парсера rawHtml (перевірка: python parser_bench.py)
+_DATE_RE = re.compile(r'на (\d{2}\.\d{2}\.\d{4})')
+_UPDATE_TIME_RE = re.compile(r'станом на (\d{2}:\d{2} \d{2}\.\d{2}\.\d{4})')
+_INTERVAL_RE = re.compile(r'з (\d{2}:\d{2}) до (\d{2}:\d{2})')
+
+
+def _decode_html(html: str, newlines: bool = False) -> str:
+    """Розекранувати rawHtml (\\u003C, \\/ ...); звичайний HTML повертається як є"""
+    if "\\" not in html:
+        return html
+    decoded = html.replace("\\u003C", "<").replace("\\u003E", ">").replace("\\/", "/")
+    return decoded.replace("\\n", "\n") if newlines else decoded
+
+
+def extract_update_time(html: str) -> str:
+    """Час "станом на" з rawHtml ("HH:MM DD.MM.YYYY"), або порожній рядок"""
+    if not html:
+        return ""
+    match = _UPDATE_TIME_RE.search(_decode_html(html))
+    if match:
+        return match.group(1)
+    return ""
+
+
+@lru_cache(maxsize=64)
+def _group_pattern(formatted_group: str) -> "re.Pattern[str]":
+    return re.compile(rf'Група {re.escape(formatted_group)}\.[^<]*')
 
 
 class LoeApiService:
@@ -17,7 +52,8 @@ class LoeApiService:
     async def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
             self._session = aiohttp.ClientSession(
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                trace_configs=[http_trace_config("loe")]
             )
         return self._session
     
@@ -34,7 +70,19 @@ class LoeApiService:
                     return await response.json()
                 return None
         except Exception as e:
-            print(f"API request error: {e}")
+            log.error("API request error", error=e)
+            return None
+    
+    async def fetch_bytes(self, url: str) -> Optional[bytes]:
+        """Завантажити бінарний вміст (наприклад, зображення графіку)"""
+        try:
+            session = await self._get_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status == 200:
+                    return await response.read()
+                return None
+        except Exception as e:
+            log.error("API download error", error=e)
             return None
     
     async def get_otgs(self) -> List[Dict]:
@@ -82,86 +130,60 @@ class LoeApiService:
             return f"{cherg_gpv[0]}.{cherg_gpv[1]}"
         return cherg_gpv
     
-    async def get_current_grafics(self) -> Dict[str, Any]:
-        """Отримати поточні графіки відключень з меню"""
+    async def get_menu_grafics(self) -> Dict[str, Dict[str, Any]]:
+        """Отримати графіки на сьогодні і завтра одним запитом до меню"""
         url = f"{self.main_api_base}/menus?page=1&type=photo-grafic"
         data = await self._make_request(url)
+        result: Dict[str, Dict[str, Any]] = {"today": {}, "tomorrow": {}}
         if data and "hydra:member" in data and len(data["hydra:member"]) > 0:
             menu = data["hydra:member"][0]
             menu_items = menu.get("menuItems", [])
             
-            # Шукаємо Today (orders=0)
             for item in menu_items:
-                if item.get("orders") == 0 or item.get("name") == "Today":
-                    return {
-                        "imageUrl": item.get("imageUrl", ""),
-                        "rawHtml": item.get("rawHtml", ""),
-                        "date": self._extract_date_from_html(item.get("rawHtml", "")),
-                        "updateTime": self._extract_update_time(item.get("rawHtml", ""))
-                    }
+                # Today (orders=0), Tomorrow (orders=1)
+                if not result["today"] and (item.get("orders") == 0 or item.get("name") == "Today"):
+                    result["today"] = self._menu_item_to_grafics(item)
+                elif not result["tomorrow"] and (item.get("orders") == 1 or item.get("name") == "Tomorrow"):
+                    result["tomorrow"] = self._menu_item_to_grafics(item)
             
             # Якщо Today не знайдено, беремо перший елемент
-            if menu_items:
-                first_item = menu_items[0]
-                return {
-                    "imageUrl": first_item.get("imageUrl", ""),
-                    "rawHtml": first_item.get("rawHtml", ""),
-                    "date": self._extract_date_from_html(first_item.get("rawHtml", "")),
-                    "updateTime": self._extract_update_time(first_item.get("rawHtml", ""))
-                }
-        return {}
+            if not result["today"] and menu_items:
+                result["today"] = self._menu_item_to_grafics(menu_items[0])
+        return result
+    
+    def _menu_item_to_grafics(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        raw_html = item.get("rawHtml", "")
+        return {
+            "imageUrl": item.get("imageUrl", ""),
+            "rawHtml": raw_html,
+            "date": self._extract_date_from_html(raw_html),
+            "updateTime": extract_update_time(raw_html)
+        }
+    
+    async def get_current_grafics(self) -> Dict[str, Any]:
+        """Отримати поточні графіки відключень з меню"""
+        return (await self.get_menu_grafics())["today"]
     
     async def get_tomorrow_grafics(self) -> Dict[str, Any]:
         """Отримати графіки на завтра"""
-        url = f"{self.main_api_base}/menus?page=1&type=photo-grafic"
-        data = await self._make_request(url)
-        if data and "hydra:member" in data and len(data["hydra:member"]) > 0:
-            menu = data["hydra:member"][0]
-            menu_items = menu.get("menuItems", [])
-            
-            # Шукаємо Tomorrow (orders=1)
-            for item in menu_items:
-                if item.get("orders") == 1 or item.get("name") == "Tomorrow":
-                    return {
-                        "imageUrl": item.get("imageUrl", ""),
-                        "rawHtml": item.get("rawHtml", ""),
-                        "date": self._extract_date_from_html(item.get("rawHtml", "")),
-                        "updateTime": self._extract_update_time(item.get("rawHtml", ""))
-                    }
-        return {}
+        return (await self.get_menu_grafics())["tomorrow"]
     
     def _extract_date_from_html(self, html: str) -> str:
         """Витягти дату з HTML"""
-        import re
-        if not html:
-            return ""
-        decoded = html.replace("\\u003C", "<").replace("\\u003E", ">").replace("\\/", "/")
-        match = re.search(r'на (\d{2}\.\d{2}\.\d{4})', decoded)
-        if match:
-            return match.group(1)
-        return ""
-    
-    def _extract_update_time(self, html: str) -> str:
-        """Витягти час оновлення з HTML"""
-        import re
         if not html:
             return ""
-        decoded = html.replace("\\u003C", "<").replace("\\u003E", ">").replace("\\/", "/")
-        match = re.search(r'станом на (\d{2}:\d{2} \d{2}\.\d{2}\.\d{4})', decoded)
+        match = _DATE_RE.search(_decode_html(html))
         if match:
             return match.group(1)
         return ""
     
     def parse_schedule_for_group(self, raw_html: str, cherg_gpv: str) -> Dict[str, Any]:
         """Парсити графік для конкретної групи"""
-        import re
-        from html.parser import HTMLParser
-        
         if not raw_html or not cherg_gpv:
             return {"outages": [], "rawText": "", "hasPower": True}
         
         # Декодувати HTML
-        decoded = raw_html.replace("\\u003C", "<").replace("\\u003E", ">").replace("\\/", "/").replace("\\n", "\n")
+        decoded = _decode_html(raw_html, newlines=True)
         
         # Форматувати групу (12 -> 6.2)
         if len(cherg_gpv) == 2:
@@ -170,8 +192,7 @@ class LoeApiService:
             formatted_group = cherg_gpv
         
         # Знайти рядок для цієї групи
-        pattern = rf'Група {re.escape(formatted_group)}\.[^<]*'
-        match = re.search(pattern, decoded)
+        match = _group_pattern(formatted_group).search(decoded)
         
         if not match:
             return {"outages": [], "rawText": f"Група {formatted_group}: дані не знайдено", "hasPower": True}
@@ -184,8 +205,7 @@ class LoeApiService:
             return {"outages": [], "rawText": group_text, "hasPower": True}
         
         # Парсити інтервали відключень
-        time_pattern = r'з (\d{2}:\d{2}) до (\d{2}:\d{2})'
-        for time_match in re.finditer(time_pattern, group_text):
+        for time_match in _INTERVAL_RE.finditer(group_text):
             outages.append({
                 "start": time_match.group(1),
                 "end": time_match.group(2)
@@ -0,0 +1,366 @@
+"""End-to-end load benchmark with fake LOE, Firebase and Bot API servers
+
+Піднімає в окремому процесі локальні заглушки power-api/api.loe.lviv.ua,
+Firebase REST і Telegram Bot API, засіває N синтетичних підписників і
+проганяє справжній NotificationService._check_and_notify разом з потоком
+натискань кнопок. Звіт: час циклів, повідомлень/с, піковий RSS процесу
+бота і p50/p99 затримки обробника callback-ів.
+
+    python benchmark.py --users 10000
+    python benchmark.py --users 100000 --callbacks 2000 --tg-latency 20
+
+Заглушки працюють в окремому процесі, тож RSS і CPU у звіті - лише бота.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+BOT_TOKEN = "123456:benchmark"
+# Коди груп ГПВ у форматі Firebase (cherg_gpv) - "11" ... "62"
+GROUP_CODES = [f"{queue}{sub}" for queue in range(1, 7) for sub in (1, 2)]
+
+
+def _outages(rng: random.Random) -> str:
+    count = rng.choice((0, 1, 1, 2, 3))
+    if not count:
+        return "Електроенергія є."
+    hours = sorted(rng.sample(range(0, 22, 3), count))
+    return "Електроенергії немає " + ", ".join(
+        f"з {hour:02d}:00 до {hour + rng.choice((2, 3)):02d}:30" for hour in hours
+    ) + "."
+
+
+def schedule_html(date: str, updated: str, version: int, seed: int) -> str:
+    """Синтетичний rawHtml у форматі меню LOE.
+
+    Нова версія змінює графік лише половини груп - як правки вдень.
+    """
+    lines = [
+        f"<div><p><b>Графік погодинних відключень на {date}</b></p>",
+        f"<p>Інформація станом на {updated}</p>",
+    ]
+    for index, code in enumerate(GROUP_CODES):
+        group_version = version if index % 2 == 0 else 1
+        rng = random.Random(f"{seed}:{date}:{code}:{group_version}")
+        lines.append(f"<p>Група {code[0]}.{code[1]}. {_outages(rng)}</p>")
+    lines.append("</div>")
+    # API віддає теги екранованими
+    return "".join(lines).replace("<", "\\u003C").replace(">", "\\u003E")
+
+
+def synthetic_users(count: int) -> Dict[str, Dict]:
+    """Профілі Firebase: рівномірно по групах, половина - з адресою"""
+    users = {}
+    for index in range(count):
+        profile = {
+            "cherg_gpv": GROUP_CODES[index % len(GROUP_CODES)],
+            "notifications_enabled": True,
+        }
+        if index % 2:
+            profile.update(city_name="Львів", street_name=f"вул. Тестова {index % 300}",
+                           building_name=str(index % 97 + 1))
+        users[str(100000 + index)] = profile
+    return users
+
+
+def run_fake_servers(port: int, users_count: int, tg_latency: float, seed: int) -> None:
+    """Заглушки зовнішніх сервісів (виконується в дочірньому процесі)"""
+    from aiohttp import web
+
+    users = synthetic_users(users_count)
+    enabled = json.dumps(users, ensure_ascii=False)
+    state = {"version": 1, "message_id": 0}
+    hits: Dict[str, int] = {}
+    today = datetime.now()
+    tomorrow = today + timedelta(days=1)
+
+    def count(name: str) -> None:
+        hits[name] = hits.get(name, 0) + 1
+
+    async def menus(request):
+        count("loe:menus")
+        updated = (today.replace(hour=20, minute=0) + timedelta(minutes=state["version"])).strftime("%H:%M %d.%m.%Y")
+        items = [
+            {"orders": 0, "name": "Today", "imageUrl": "/media/today.png",
+             "rawHtml": schedule_html(today.strftime("%d.%m.%Y"), updated, 1, seed)},
+            {"orders": 1, "name": "Tomorrow", "imageUrl": "/media/tomorrow.png",
+             "rawHtml": schedule_html(tomorrow.strftime("%d.%m.%Y"), updated, state["version"], seed)},
+        ]
+        return web.json_response({"hydra:member": [{"menuItems": items}]})
+
+    async def options(request):
+        count("loe:options")
+        return web.json_response({"hydra:member": [{"optionValue": today.strftime("%d.%m.%Y %H:%M")}]})
+
+    async def firebase_users(request):
+        count("firebase:users")
+        return web.Response(text=enabled, content_type="application/json")
+
+    async def firebase_user(request):
+        count("firebase:" + request.method.lower())
+        user_id, _, field = request.match_info["path"].removesuffix(".json").partition("/")
+        if request.method != "GET":
+            return web.json_response(await request.json())
+        profile = users.get(user_id)
+        if profile and field:
+            return web.json_response(profile.get(field))
+        return web.json_response(profile)
+
+    async def control(request):
+        state["version"] = int(request.query["version"])
+        return web.json_response(state)
+
+    async def stats(request):
+        return web.json_response(hits)
+
+    async def bot_api(request):
+        method = request.match_info["method"]
+        count("telegram:" + method)
+        if tg_latency:
+            await asyncio.sleep(tg_latency)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+            return web.json_response({"ok": True, "result": result})
+        params = await request.post()
+        if method in ("answerCallbackQuery", "deleteMessage"):
+            return web.json_response({"ok": True, "result": True})
+        state["message_id"] += 1
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": int(params.get("message_id") or state["message_id"]),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": f"photo{state['message_id']}",
+                                 "file_unique_id": f"u{state['message_id']}", "width": 1, "height": 1}]
+        return web.json_response({"ok": True, "result": message})
+
+    app = web.Application()
+    app.router.add_get("/api/menus", menus)
+    app.router.add_get("/power/options", options)
+    app.router.add_get("/firebase/users.json", firebase_users)
+    app.router.add_route("*", "/firebase/users/{path:.+}", firebase_user)
+    app.router.add_post("/control", control)
+    app.router.add_get("/stats", stats)
+    app.router.add_post("/bot{token}/{method}", bot_api)
+    web.run_app(app, host="127.0.0.1", port=port, access_log=None, print=None)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: КБ на Linux, байти на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def _request_json(session, method: str, url: str) -> Dict:
+    async with session.request(method, url) as resp:
+        return await resp.json()
+
+
+async def _wait_ready(base: str) -> None:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                await _request_json(session, "GET", f"{base}/stats")
+                return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("Fake servers did not start")
+
+
+async def _callback_traffic(bot, user_ids: List[int], total: int, concurrency: int,
+                            latencies: List[float]) -> None:
+    """Натискання кнопок випадковими користувачами; час обробника - в latencies"""
+    from telegram import Update
+    from handlers import callback_handler
+
+    actions = ["show_schedule"] * 4 + ["notifications", "settings", "back_to_main", "help"]
+    rng = random.Random(7)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def press(index: int) -> None:
+        user_id = rng.choice(user_ids)
+        update = Update.de_json({
+            "update_id": index,
+            "callback_query": {
+                "id": str(index),
+                "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+                "chat_instance": str(user_id),
+                "data": rng.choice(actions),
+                "message": {"message_id": 1, "date": int(time.time()),
+                            "chat": {"id": user_id, "type": "private"}, "text": "menu"},
+            },
+        }, bot)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await callback_handler(update, None)
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(press(index) for index in range(total)))
+
+
+async def benchmark(args, base: str) -> Dict:
+    from telegram import Bot
+    from database import db
+    from api_service import api_service
+    from firebase_service import firebase_service
+    from metrics import InstrumentedHTTPXRequest, NOTIFY_USERS_NOTIFIED
+    import aiohttp
+    import handlers
+    import notifications
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    db.db_path = os.path.join(workdir, "users.db")
+    await db.init_db()
+    db.start_write_behind()
+
+    report: Dict = {"users": args.users, "cycles": []}
+    user_ids = [100000 + index for index in range(args.users)]
+    handler_latencies: List[float] = []
+    session = aiohttp.ClientSession()
+    request = InstrumentedHTTPXRequest(connection_pool_size=max(8, args.concurrency))
+    try:
+        async with Bot(BOT_TOKEN, base_url=f"{base}/bot", request=request) as bot:
+            service = notifications.NotificationService(bot)
+            notifications.notification_service = service
+            # Довгі цикли переживають LEASE_TTL - оренду треба продовжувати
+            await service.leader.try_acquire()
+            service.leader.start()
+
+            # publish - перша поява графіку на завтра (розсилка всім),
+            # change - правка половини груп під натисканнями кнопок,
+            # idle - перевірка без змін
+            for name, version, with_callbacks in (("publish", 1, False),
+                                                  ("change", 2, True),
+                                                  ("idle", 2, False)):
+                await _request_json(session, "POST", f"{base}/control?version={version}")
+                notified = NOTIFY_USERS_NOTIFIED.value()
+                started = time.perf_counter()
+                cycle = asyncio.create_task(service._check_and_notify())
+                if with_callbacks and args.callbacks:
+                    await _callback_traffic(bot, user_ids, args.callbacks, args.concurrency,
+                                            handler_latencies)
+                await cycle
+                elapsed = time.perf_counter() - started
+                # Правки карток від натискань кнопок сюди не входять
+                sent = int(NOTIFY_USERS_NOTIFIED.value() - notified)
+                report["cycles"].append({
+                    "cycle": name,
+                    "seconds": round(elapsed, 3),
+                    "messages": sent,
+                    "messages_per_second": round(sent / elapsed, 1) if elapsed else None,
+                    "stages": {
+                        stage: stats.get("busy_time") for stage, stats in
+                        service.last_cycle_stats.get("stages", {}).items()
+                    },
+                })
+            await asyncio.gather(*handlers._render_tasks.values(), return_exceptions=True)
+            await service.leader.stop()
+        report["requests"] = await _request_json(session, "GET", f"{base}/stats")
+    finally:
+        await session.close()
+        await db.close()
+        await api_service.close()
+        await firebase_service.close()
+
+    report["handler_latency_ms"] = {
+        "count": len(handler_latencies),
+        "p50": round((_percentile(handler_latencies, 0.5) or 0) * 1000, 1),
+        "p99": round((_percentile(handler_latencies, 0.99) or 0) * 1000, 1),
+    }
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--callbacks", type=int, default=500,
+                        help="натискань кнопок під час циклу change")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="одночасних обробників callback-ів")
+    parser.add_argument("--send-delay", type=float, default=0.0,
+                        help="NOTIFY_SEND_DELAY; 0 - міряємо власні накладні витрати")
+    parser.add_argument("--tg-latency", type=float, default=0.0,
+                        help="штучна затримка відповіді Bot API, мс")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="логи бота з рівня INFO (інакше лише помилки)")
+    args = parser.parse_args()
+
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = multiprocessing.get_context("spawn").Process(
+        target=run_fake_servers,
+        args=(port, args.users, args.tg_latency / 1000, args.seed),
+        daemon=True,
+    )
+    server.start()
+
+    # Конфіг читається при імпорті - адреси заглушок задаємо до нього
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "LOE_API_BASE": f"{base}/power",
+        "LOE_MAIN_API_BASE": f"{base}/api",
+        "FIREBASE_DATABASE_URL": f"{base}/firebase",
+        "NOTIFY_SEND_DELAY": str(args.send_delay),
+        "NOTIFIER_SHARDS": "1",
+        "METRICS_PORT": "0",
+    })
+
+    from logs import setup_logging, shutdown_logging
+    setup_logging("INFO" if args.verbose else "ERROR")
+
+    async def run() -> Dict:
+        await _wait_ready(base)
+        return await benchmark(args, base)
+
+    try:
+        report = asyncio.run(run())
+    finally:
+        server.terminate()
+        server.join()
+        shutdown_logging()
+
+    print(f"Users: {report['users']}, peak RSS: {report['peak_rss_mb']} MB")
+    for cycle in report["cycles"]:
+        print(f"  {cycle['cycle']:<8} {cycle['seconds']:>8.3f}s  {cycle['messages']:>7} msgs  "
+              f"{cycle['messages_per_second'] or 0:>8.1f} msg/s  stages={cycle['stages']}")
+    latency = report["handler_latency_ms"]
+    print(f"Callback handler: {latency['count']} calls, p50 {latency['p50']} ms, p99 {latency['p99']} ms")
+    print(f"External requests: {report['requests']}")
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Lightweight cross-process change signals stored in SQLite"""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from database import db
+from config import SIGNAL_POLL_INTERVAL
+from logs import get_logger
+
+log = get_logger(__name__)
+
+
+class ChangeSignalWatcher:
+    """Опитує версію сигналу в SQLite і викликає callback, коли вона змінюється.
+
+    Читання одного рядка раз на кілька секунд дешевше за будь-який брокер
+    повідомлень і працює між процесами на одному файлі БД.
+    """
+
+    def __init__(self, name: str, callback: Callable[[], Awaitable[None]],
+                 interval: float = SIGNAL_POLL_INTERVAL) -> None:
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self._version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, fire_initial: bool = True) -> None:
+        self._fire_initial = fire_initial
+        self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                version = await db.get_signal_version(self.name)
+                initial = self._version is None
+                if version != self._version:
+                    self._version = version
+                    if not initial or self._fire_initial:
+                        await self.callback()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.error("Signal watcher error", signal=self.name, error=e)
+            await asyncio.sleep(self.interval)
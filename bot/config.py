@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,13 +19,130 @@ LOE_MAIN_API_BASE = os.getenv("LOE_MAIN_API_BASE", "https://api.loe.lviv.ua/api"
 # Формат: https://PROJECT-ID-default-rtdb.REGION.firebasedatabase.app
 FIREBASE_DATABASE_URL = os.getenv("FIREBASE_DATABASE_URL")
 
+# Адміністратори бота (Telegram user_id через кому)
+ADMIN_IDS = {
+    int(value) for value in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if value
+}
+
 # Notification settings
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 5))  # minutes
+# Адаптивне опитування: у "гарячі" вікна (коли графік зазвичай публікують)
+# перевіряємо кожні POLL_MIN_INTERVAL секунд, поза ними - CHECK_INTERVAL з
+# експоненційним збільшенням до POLL_MAX_INTERVAL, поки графік не змінюється
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", 30))  # seconds
+POLL_HOT_MAX_INTERVAL = int(os.getenv("POLL_HOT_MAX_INTERVAL", 120))  # seconds
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", 1800))  # seconds
+# За скільки днів історії публікацій вчитися
+POLL_HISTORY_DAYS = int(os.getenv("POLL_HISTORY_DAYS", 30))
+# Часовий пояс, у якому публікуються графіки
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "Europe/Kyiv")
+# Додавати офіційне зображення графіку до сповіщення про публікацію графіку на завтра
+NOTIFY_WITH_IMAGE = os.getenv("NOTIFY_WITH_IMAGE", "false").lower() == "true"
+# Як довго file_id зображення за URL вважається актуальним; потім вміст
+# завантажується знову і порівнюється за хешем (LOE може замінити файл за тим самим URL)
+MEDIA_CACHE_TTL = int(os.getenv("MEDIA_CACHE_TTL", 3600))  # seconds
+# Режим розсилки: private - кожному користувачу, channels - один пост у канал групи
+# (особисті повідомлення тоді лише для тих, хто їх увімкнув)
+BROADCAST_MODE = os.getenv("BROADCAST_MODE", "private").lower()
+
+# Де працює цикл сповіщень: embedded - у процесі бота,
+# external - в окремому процесі (python notifier.py), стан спільний через SQLite
+NOTIFIER_MODE = os.getenv("NOTIFIER_MODE", "embedded").lower()
+# Як часто перевіряти сигнали змін у SQLite
+SIGNAL_POLL_INTERVAL = float(os.getenv("SIGNAL_POLL_INTERVAL", 2))  # seconds
+# Мінімальна пауза між циклами, запущеними сигналом про зміну підписників
+SIGNAL_MIN_CYCLE_GAP = int(os.getenv("SIGNAL_MIN_CYCLE_GAP", 30))  # seconds
+# Недоставлені сповіщення старші за цей вік після перезапуску не надсилаються
+OUTBOX_MAX_AGE = int(os.getenv("OUTBOX_MAX_AGE", 60))  # minutes
+# Базовий цикл: записати поточні графіки користувачам без надсилання.
+# auto - якщо в БД ще немає жодного хешу (перший запуск), always - при кожному
+# старті (після відновлення БД з бекапу), never - вимкнено. Адмін: /baseline
+NOTIFY_BASELINE = os.getenv("NOTIFY_BASELINE", "auto").lower()
+
+# Відкладений запис некритичних upsert-ів (користувачі, хеші, останні повідомлення):
+# буфер скидається однією транзакцією раз на N мс або при M рядках
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", 200))
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", 200))
+
+# Очищення старих даних: хеші/сповіщення/outbox старші за RETENTION_DAYS
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 14))
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", 6))  # hours
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", 500))
+
+# Шардування розсилки між кількома воркерами (1 - без шардування)
+NOTIFIER_SHARDS = int(os.getenv("NOTIFIER_SHARDS", 1))
+# Ідентифікатор воркера (за замовчуванням hostname:pid)
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+# Тривалість оренди шарду; воркер продовжує її кожну третину періоду
+LEASE_TTL = int(os.getenv("LEASE_TTL", 30))  # seconds
+
+# Конвеєр циклу сповіщень: розмір черг між стадіями і кількість воркерів на стадію
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 100))
+PIPELINE_AUDIENCE_CONCURRENCY = int(os.getenv("PIPELINE_AUDIENCE_CONCURRENCY", 4))
+PIPELINE_RENDER_CONCURRENCY = int(os.getenv("PIPELINE_RENDER_CONCURRENCY", 1))
+PIPELINE_SEND_CONCURRENCY = int(os.getenv("PIPELINE_SEND_CONCURRENCY", 1))
+# Пауза між повідомленнями розсилки (ліміти Telegram)
+NOTIFY_SEND_DELAY = float(os.getenv("NOTIFY_SEND_DELAY", 0.3))  # seconds
+# Скільки чатів тримати в пам'яті: останнє повідомлення з графіком і хеш його тексту
+# (лише при NOTIFIER_MODE=embedded; воркер в окремому процесі читає SQLite)
+MESSAGE_STATE_CACHE_SIZE = int(os.getenv("MESSAGE_STATE_CACHE_SIZE", 100000))
+# Користувачі, що заблокували бота або видалили акаунт, відписуються пакетами:
+# раз на PRUNE_INTERVAL секунд або щойно в черзі PRUNE_BATCH_SIZE користувачів
+PRUNE_INTERVAL = float(os.getenv("PRUNE_INTERVAL", 60))  # seconds
+PRUNE_BATCH_SIZE = int(os.getenv("PRUNE_BATCH_SIZE", 200))
+
+# Interactive handlers
+# Повторні натискання "Оновити" в межах цього вікна показують кешовану картку
+SCHEDULE_REFRESH_WINDOW = int(os.getenv("SCHEDULE_REFRESH_WINDOW", 30))  # seconds
+# Скільки останніх карток графіку тримати в пам'яті (LRU)
+SCHEDULE_CARD_CACHE_SIZE = int(os.getenv("SCHEDULE_CARD_CACHE_SIZE", 10000))
+# Скільки Telegram кешує відповіді на інлайн-запити
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 60))  # seconds
+# Скільки різних інлайн-запитів тримати в пам'яті (LRU, скидається зі зміною графіку)
+INLINE_RESULTS_CACHE_SIZE = int(os.getenv("INLINE_RESULTS_CACHE_SIZE", 2000))
+
+# Local data directory
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 # Database (local SQLite as fallback)
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "data", "users.db")
+DATABASE_PATH = os.path.join(DATA_DIR, "users.db")
+
+# Гарячий стан (snapshot графіку, відбитки груп, довідник адрес) для швидкого
+# рестарту. Воркер сповіщень (notifier.py) пише у власний файл
+STATE_PATH = os.path.join(DATA_DIR, "state.json")
+NOTIFIER_STATE_PATH = os.path.join(DATA_DIR, "notifier-state.json")
+STATE_SAVE_INTERVAL = int(os.getenv("STATE_SAVE_INTERVAL", 300))  # seconds
+# Старіший файл стану не відновлюється
+STATE_MAX_AGE = int(os.getenv("STATE_MAX_AGE", 6 * 3600))  # seconds
+
+# Timeline images (рендер таймлайну групи)
+TIMELINE_CACHE_DIR = os.path.join(DATA_DIR, "timelines")
+TIMELINE_EXECUTOR = os.getenv("TIMELINE_EXECUTOR", "process")  # process або thread
+TIMELINE_RENDER_WORKERS = int(os.getenv("TIMELINE_RENDER_WORKERS", 1))
+TIMELINE_FONT_PATH = os.getenv("TIMELINE_FONT_PATH")  # TTF з кирилицею
+
+# Метрики у форматі Prometheus на локальному порту (0 - вимкнено).
+# Воркер сповіщень (notifier.py) слухає NOTIFIER_METRICS_PORT
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+NOTIFIER_METRICS_PORT = int(os.getenv("NOTIFIER_METRICS_PORT", METRICS_PORT + 1 if METRICS_PORT else 0))
+
+# Моніторинг event loop: як часто міряти затримку і з якої тривалості
+# блокування логувати стеки. USE_UVLOOP=true - uvloop замість стандартного циклу
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))  # seconds
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.3))  # seconds
+USE_UVLOOP = os.getenv("USE_UVLOOP", "false").lower() == "true"
+
+# Траси циклів сповіщень і обробників кнопок (адмін-команди /traces, /profile)
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 50))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", 40))
 
 # Logging level: DEBUG, INFO, WARNING, ERROR
 # На продакшені встановити WARNING або ERROR для економії квоти
 LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
 DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
+# Не більше LOG_RATE_LIMIT записів з одного місця коду за LOG_RATE_WINDOW секунд
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 20))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 60))  # seconds
+# Частка записів, що пишуться з гарячих шляхів (по одному на користувача)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
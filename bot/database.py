@@ -2,9 +2,128 @@
 Database module for storing user data and preferences
 """
 import aiosqlite
+import asyncio
+import hashlib
 import os
-from typing import Optional, List, Dict, Any
-from config import DATABASE_PATH
+import time
+import zlib
+from typing import Optional, List, Dict, Any, AsyncIterator
+from config import DATABASE_PATH, WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_MAX_ROWS, LOG_SAMPLE_RATE
+from metrics import QUEUE_DEPTH
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Сигнали змін між процесами (бот <-> воркер сповіщень)
+SIGNAL_SUBSCRIBERS = "subscribers"
+SIGNAL_SNAPSHOT = "snapshot"
+SIGNAL_BASELINE = "baseline"
+
+# Ідемпотентні upsert-и для відкладеного запису (write-behind)
+_UPSERT_USER_SQL = """
+    INSERT INTO users (user_id, username, first_name, last_name)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name
+"""
+_UPSERT_GROUP_HASH_SQL = """
+    INSERT OR REPLACE INTO user_schedule_hashes
+    (user_id, schedule_date, schedule_hash, created_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+"""
+_DELETE_GROUP_HASH_SQL = """
+    DELETE FROM user_schedule_hashes WHERE user_id = ? AND schedule_date = ?
+"""
+_UPSERT_LAST_MESSAGE_SQL = """
+    INSERT OR REPLACE INTO user_last_schedule_message
+    (user_id, message_id, schedule_date, content_hash, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+
+_BUMP_SIGNAL_SQL = """
+    INSERT INTO change_signals (name, version, updated_at)
+    VALUES (?, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT(name) DO UPDATE SET
+        version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Сирі графіки зберігаються один раз у schedule_blobs (ключ - sha256 вмісту)
+BLOB_CODEC_ZLIB = "zlib"
+
+
+def _payload_hash(text: str) -> str:
+    """Хеш вмісту - ключ у schedule_blobs"""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _pack_payload(text: str) -> tuple:
+    """(hash, codec, size, data) для запису в schedule_blobs"""
+    raw = text.encode()
+    return _payload_hash(text), BLOB_CODEC_ZLIB, len(raw), zlib.compress(raw, 9)
+
+
+def _unpack_payload(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    if codec == BLOB_CODEC_ZLIB:
+        return zlib.decompress(data).decode()
+    return bytes(data).decode()
+
+
+# Контекст графіка користувача: основна адреса, інакше ручна група.
+# {source} - таблиця/підзапит з колонкою user_id, {where} - додаткові умови
+_SCHEDULE_CONTEXT_SQL = """
+    SELECT u.user_id,
+           CASE WHEN ua.id IS NOT NULL THEN 'address' ELSE 'manual' END AS context_type,
+           CASE WHEN ua.id IS NOT NULL THEN ua.cherg_gpv ELSE mg.group_code END AS cherg_gpv,
+           ua.city_name, ua.street_name, ua.building_name,
+           CASE WHEN ua.id IS NULL THEN mg.label END AS label
+    FROM {source} u
+    LEFT JOIN user_addresses ua ON ua.id = (
+        SELECT MAX(id) FROM user_addresses
+        WHERE user_id = u.user_id AND is_primary = 1
+    )
+    LEFT JOIN user_manual_groups mg ON ua.id IS NULL AND mg.user_id = u.user_id
+    WHERE (ua.id IS NOT NULL OR mg.user_id IS NOT NULL) {where}
+"""
+
+# Гарячі запити і індекси, якими вони мають користуватись:
+# {назва: (запит, параметри, індекс)}
+HOT_QUERY_PLANS = {
+    "get_user_address": (
+        "SELECT * FROM user_addresses WHERE user_id = ? AND is_primary = 1",
+        (1,), "idx_user_addresses_primary",
+    ),
+    "check_notification_sent": (
+        "SELECT id FROM sent_notifications WHERE user_id = ? AND notification_type = ? "
+        "AND schedule_date = ? AND created_at >= date('now')",
+        (1, "t", "d"), "COVERING INDEX idx_sent_notifications_lookup",
+    ),
+    "get_user_group_hash": (
+        "SELECT schedule_hash FROM user_schedule_hashes WHERE user_id = ? AND schedule_date = ?",
+        # UNIQUE(user_id, schedule_date) вже дає індекс
+        (1, "d"), "sqlite_autoindex_user_schedule_hashes_1",
+    ),
+    "get_pending_outbox": (
+        "SELECT id, user_id, message, schedule_date, image_day FROM notification_outbox "
+        "WHERE sent_at IS NULL AND created_at >= datetime('now', ?) ORDER BY created_at, id",
+        ("-60 minutes",), "idx_notification_outbox_pending",
+    ),
+    "users_with_notifications": (
+        _SCHEDULE_CONTEXT_SQL.format(
+            source="users", where="AND u.notifications_enabled = 1 ORDER BY u.user_id"
+        ),
+        (), "idx_users_notifications",
+    ),
+    "schedule_history_by_date": (
+        "SELECT blob_hash FROM schedule_history WHERE schedule_date = ? "
+        "ORDER BY created_at DESC, id DESC LIMIT 1",
+        ("d",), "idx_schedule_history_date",
+    ),
+}
 
 
 class Database:
@@ -14,12 +133,118 @@ class Database:
         self.db_path = DATABASE_PATH
         # Створити директорію якщо не існує
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        print(f"[DB] Database path: {self.db_path}")
+        log.debug("Database path", path=self.db_path)
+        # Відкладені записи: {(вид, ключ...): (sql, params)}. Новий запис з тим
+        # самим ключем замінює попередній, тож у БД потрапляє лише останній
+        self._pending: Dict[tuple, tuple] = {}
+        # Пакет, який зараз пишеться: читання бачать його до кінця транзакції
+        self._inflight: Dict[tuple, tuple] = {}
+        self._flush_stopping = False
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_wake: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def start_write_behind(self) -> None:
+        """Увімкнути відкладений запис (до цього записи йдуть у БД одразу)"""
+        if self._flush_task is None:
+            self._flush_lock = asyncio.Lock()
+            self._flush_wake = asyncio.Event()
+            self._flush_stopping = False
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self) -> None:
+        """Зупинити відкладений запис і зберегти все, що залишилось"""
+        if self._flush_task:
+            # Не скасовуємо задачу: вона дописує поточний пакет і виходить
+            self._flush_stopping = True
+            self._flush_wake.set()
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+    
+    async def _flush_loop(self) -> None:
+        while not self._flush_stopping:
+            try:
+                try:
+                    await asyncio.wait_for(
+                        self._flush_wake.wait(), timeout=WRITE_BEHIND_INTERVAL_MS / 1000
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_wake.clear()
+                if self._flush_stopping:
+                    break
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.warning("Write-behind flush failed", error=e)
+    
+    async def _write(self, key: tuple, sql: str, params: tuple) -> bool:
+        """Записати одразу або поставити в буфер, якщо write-behind увімкнено"""
+        if self._flush_task is None:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute(sql, params)
+                await db.commit()
+            return True
+        self._pending.pop(key, None)  # новий запис - в кінець черги
+        self._pending[key] = (sql, params)
+        QUEUE_DEPTH.set(len(self._pending), queue="write_behind")
+        if len(self._pending) >= WRITE_BEHIND_MAX_ROWS:
+            self._flush_wake.set()
+        return True
+    
+    def _pending_params(self, key: tuple) -> Optional[tuple]:
+        pending = self._pending.get(key) or self._inflight.get(key)
+        return pending[1] if pending else None
+    
+    def _has_pending(self, key: tuple) -> bool:
+        return key in self._pending or key in self._inflight
+    
+    async def _discard_pending(self, user_id: int) -> None:
+        for key in [key for key in self._pending if key[1] == user_id]:
+            del self._pending[key]
+        if any(key[1] == user_id for key in self._inflight):
+            # Пакет уже пишеться - чекаємо, щоб видалення пішло після нього
+            await self.flush()
+    
+    async def flush(self) -> int:
+        """Записати буфер однією транзакцією. Повертає кількість рядків"""
+        if not self._pending and not self._inflight:
+            return 0
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            self._inflight = batch
+            committed = False
+            try:
+                async with aiosqlite.connect(self.db_path) as db:
+                    for sql, params in batch.values():
+                        await db.execute(sql, params)
+                    await db.commit()
+                committed = True
+            finally:
+                self._inflight = {}
+                if not committed:
+                    # Помилка або скасування: повертаємо в буфер те, що не
+                    # встигли перезаписати новішим (upsert-и можна повторити)
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                QUEUE_DEPTH.set(len(self._pending), queue="write_behind")
+            return len(batch)
     
     async def init_db(self):
         """Ініціалізувати базу даних та створити таблиці"""
-        print(f"[DB] Initializing database at {self.db_path}")
+        log.info("Initializing database", path=self.db_path)
         async with aiosqlite.connect(self.db_path) as db:
+            # Нова БД одразу створюється з інкрементальним auto_vacuum (діє лише до
+            # першої таблиці і до WAL; стару БД переводить python maintenance.py vacuum)
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL дозволяє кільком процесам (бот, воркери) читати під час запису
+            await db.execute("PRAGMA journal_mode=WAL")
+            
             # Таблиця користувачів
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -69,8 +294,7 @@ class Database:
                     schedule_date TEXT NOT NULL,
                     image_url TEXT,
                     raw_html TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(schedule_date, image_url)
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
@@ -122,22 +346,271 @@ class Database:
                 )
             """)
 
+            # Кеш file_id зображень, вже завантажених у Telegram
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS telegram_file_cache (
+                    url TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_telegram_file_cache_hash
+                ON telegram_file_cache(content_hash)
+            """)
+
+            # Канали для розсилки змін графіку по групах ГПВ
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS group_channels (
+                    group_code TEXT PRIMARY KEY,
+                    chat_id INTEGER NOT NULL,
+                    invite_link TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Хеші графіків по групах (для публікацій у канали)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS group_schedule_hashes (
+                    group_code TEXT NOT NULL,
+                    schedule_date TEXT NOT NULL,
+                    schedule_hash TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (group_code, schedule_date)
+                )
+            """)
+
+            # Легкі сигнали змін: версія зростає при кожній зміні
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS change_signals (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Черга вихідних сповіщень (доставка переживає перезапуск воркера)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    schedule_date TEXT,
+                    image_day TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    sent_at TIMESTAMP
+                )
+            """)
+
+            # Оренди (leases): шарди розсилки, лідерство тощо
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+            # Стиснуті сирі графіки, адресовані хешем вмісту
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_blobs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
             await db.commit()
+            
+            # Індекси і зміни існуючих таблиць - лише через міграції
+            await self._run_migrations(db)
+            await self._check_query_plans(db)
     
-    async def add_user(self, user_id: int, username: str = None, 
-                       first_name: str = None, last_name: str = None) -> bool:
-        """Додати нового користувача"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _run_migrations(self, db):
+        """Застосувати міграції, новіші за PRAGMA user_version.
+        
+        Кожна міграція - окрема транзакція разом із записом нової версії.
+        BEGIN IMMEDIATE не дає двом процесам застосувати одну міграцію двічі.
+        """
+        for version, description, migrate in self._migrations():
+            await db.execute("BEGIN IMMEDIATE")
             try:
-                await db.execute("""
-                    INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, username, first_name, last_name))
+                async with db.execute("PRAGMA user_version") as cursor:
+                    current = (await cursor.fetchone())[0]
+                if version <= current:
+                    await db.rollback()
+                    continue
+                log.info("Applying migration", version=version, description=description)
+                await migrate(db)
+                await db.execute(f"PRAGMA user_version = {int(version)}")
                 await db.commit()
-                return True
-            except Exception as e:
-                print(f"Error adding user: {e}")
-                return False
+            except Exception:
+                await db.rollback()
+                raise
+    
+    def _migrations(self):
+        """Міграції схеми: (версія, опис, функція). Лише додавати в кінець"""
+        return [
+            (1, "move raw schedules to schedule_blobs", self._migrate_schedule_blobs),
+            (2, "date indexes for schedule history and cache", self._migrate_schedule_indexes),
+            (3, "indexes for retention cleanup", self._migrate_retention_indexes),
+            (4, "covering indexes for hot queries", self._migrate_hot_query_indexes),
+            (5, "content hash of the last schedule message", self._migrate_last_message_hash),
+            (6, "schedule history row per content version", self._migrate_schedule_history_versions),
+            (7, "publication time of schedule history rows", self._migrate_schedule_history_update_time),
+        ]
+    
+    async def _migrate_schedule_blobs(self, db):
+        """Перенести raw_html зі schedule_cache/schedule_history у schedule_blobs"""
+        for table in ("schedule_cache", "schedule_history"):
+            async with db.execute(f"PRAGMA table_info({table})") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+            if "blob_hash" not in columns:
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN blob_hash TEXT")
+            
+            async with db.execute(
+                f"SELECT id, raw_html FROM {table} WHERE raw_html IS NOT NULL"
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for row_id, raw_html in rows:
+                blob_hash = await self._store_blob(db, raw_html)
+                await db.execute(
+                    f"UPDATE {table} SET blob_hash = ?, raw_html = NULL WHERE id = ?",
+                    (blob_hash, row_id)
+                )
+            if rows:
+                log.info("Moved raw schedules to schedule_blobs", table=table, rows=len(rows))
+    
+    async def _migrate_schedule_indexes(self, db):
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_schedule_history_date ON schedule_history(schedule_date, created_at)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_schedule_history_created ON schedule_history(created_at)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_schedule_cache_date ON schedule_cache(schedule_date, image_url)"
+        )
+    
+    async def _migrate_retention_indexes(self, db):
+        for table, column in (
+            ("sent_notifications", "created_at"),
+            ("user_schedule_hashes", "created_at"),
+            ("notification_outbox", "created_at"),
+            ("schedule_cache", "last_check"),
+        ):
+            await db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})"
+            )
+    
+    async def _migrate_hot_query_indexes(self, db):
+        # Основна адреса користувача (get_user_address, розсилка)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_addresses_primary
+            ON user_addresses(user_id, is_primary)
+        """)
+        # Підписники: відбір за notifications_enabled без перегляду всієї таблиці
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_notifications
+            ON users(notifications_enabled, user_id)
+        """)
+        # check_notification_sent повністю читається з індексу
+        await db.execute("DROP INDEX IF EXISTS idx_sent_notifications_lookup")
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sent_notifications_lookup
+            ON sent_notifications(user_id, notification_type, schedule_date, created_at)
+        """)
+        # Недоставлені сповіщення outbox
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+            ON notification_outbox(created_at) WHERE sent_at IS NULL
+        """)
+    
+    async def _migrate_last_message_hash(self, db):
+        # Хеш тексту останнього повідомлення: незмінний текст не редагуємо
+        async with db.execute("PRAGMA table_info(user_last_schedule_message)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if "content_hash" not in columns:
+            await db.execute("ALTER TABLE user_last_schedule_message ADD COLUMN content_hash TEXT")
+    
+    async def _migrate_schedule_history_versions(self, db):
+        # UNIQUE(schedule_date, image_url) відкидав нову версію графіку, якщо LOE
+        # лишала той самий URL зображення. SQLite не видаляє обмеження - перебудова
+        await db.execute("""
+            CREATE TABLE schedule_history_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                schedule_date TEXT NOT NULL,
+                image_url TEXT,
+                raw_html TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                blob_hash TEXT
+            )
+        """)
+        await db.execute("""
+            INSERT INTO schedule_history_new (id, schedule_date, image_url, raw_html, created_at, blob_hash)
+            SELECT id, schedule_date, image_url, raw_html, created_at, blob_hash FROM schedule_history
+        """)
+        await db.execute("DROP TABLE schedule_history")
+        await db.execute("ALTER TABLE schedule_history_new RENAME TO schedule_history")
+        await self._migrate_schedule_indexes(db)
+    
+    async def _migrate_schedule_history_update_time(self, db):
+        # Час "станом на" зберігається при записі - PollScheduler не розбирає rawHtml
+        from api_service import extract_update_time
+        async with db.execute("PRAGMA table_info(schedule_history)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if "update_time" not in columns:
+            await db.execute("ALTER TABLE schedule_history ADD COLUMN update_time TEXT")
+        async with db.execute("""
+            SELECT h.id, b.codec, b.data FROM schedule_history h
+            JOIN schedule_blobs b ON b.hash = h.blob_hash
+            WHERE h.update_time IS NULL
+        """) as cursor:
+            rows = await cursor.fetchall()
+        for row_id, codec, data in rows:
+            update_time = extract_update_time(_unpack_payload(codec, data) or "")
+            if update_time:
+                await db.execute(
+                    "UPDATE schedule_history SET update_time = ? WHERE id = ?", (update_time, row_id)
+                )
+    
+    async def _check_query_plans(self, db) -> Dict[str, str]:
+        """Перевірити через EXPLAIN QUERY PLAN, що гарячі запити йдуть по індексах.
+        
+        Повертає {запит: план} для запитів, які НЕ використовують очікуваний індекс.
+        """
+        problems = {}
+        for name, (query, params, index) in HOT_QUERY_PLANS.items():
+            async with db.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+                plan = " | ".join(row[-1] for row in await cursor.fetchall())
+            if index not in plan:
+                problems[name] = plan
+                log.warning("Query does not use expected index", query=name, index=index, plan=plan)
+        return problems
+    
+    async def _store_blob(self, db, text: str) -> str:
+        """Записати вміст у schedule_blobs (якщо його ще немає) і повернути хеш"""
+        blob_hash, codec, size, data = _pack_payload(text)
+        await db.execute("""
+            INSERT OR IGNORE INTO schedule_blobs (hash, codec, size, data)
+            VALUES (?, ?, ?, ?)
+        """, (blob_hash, codec, size, data))
+        return blob_hash
+    
+    async def add_user(self, user_id: int, username: str = None, 
+                       first_name: str = None, last_name: str = None) -> bool:
+        """Додати нового користувача (або оновити ім'я, не чіпаючи налаштувань)"""
+        try:
+            return await self._write(
+                ("user", user_id), _UPSERT_USER_SQL, (user_id, username, first_name, last_name)
+            )
+        except Exception as e:
+            log.error("Error adding user", error=e)
+            return False
     
     async def get_user(self, user_id: int) -> Optional[Dict]:
         """Отримати дані користувача"""
@@ -147,14 +620,20 @@ class Database:
                 "SELECT * FROM users WHERE user_id = ?", (user_id,)
             ) as cursor:
                 row = await cursor.fetchone()
-                return dict(row) if row else None
+        user = dict(row) if row else None
+        pending = self._pending_params(("user", user_id))
+        if pending:
+            user = user or {"user_id": user_id, "notifications_enabled": 0}
+            user.update(username=pending[1], first_name=pending[2], last_name=pending[3])
+        return user
     
     async def save_user_address(self, user_id: int, otg_id: int, otg_name: str,
                                 city_id: int, city_name: str, street_id: int,
                                 street_name: str, building_name: str, 
                                 cherg_gpv: str) -> bool:
         """Зберегти адресу користувача"""
-        print(f"[DB] Saving address for user {user_id}: city_id={city_id}, street_id={street_id}, building={building_name}, cherg_gpv={cherg_gpv}")
+        log.debug("Saving address", user_id=user_id, city_id=city_id, street_id=street_id,
+                  building=building_name, cherg_gpv=cherg_gpv)
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 # Спочатку перевірити чи існує користувач, якщо ні - створити
@@ -162,7 +641,7 @@ class Database:
                     "SELECT user_id FROM users WHERE user_id = ?", (user_id,)
                 ) as cursor:
                     if not await cursor.fetchone():
-                        print(f"[DB] User {user_id} not found, creating...")
+                        log.debug("User not found, creating", user_id=user_id)
                         await db.execute(
                             "INSERT INTO users (user_id) VALUES (?)", (user_id,)
                         )
@@ -182,7 +661,7 @@ class Database:
                 
                 if existing:
                     # Оновити існуючу адресу
-                    print(f"[DB] Updating existing address id={existing[0]}")
+                    log.debug("Updating existing address", address_id=existing[0])
                     await db.execute("""
                         UPDATE user_addresses 
                         SET is_primary = 1, cherg_gpv = ?, otg_id = ?, otg_name = ?
@@ -190,7 +669,7 @@ class Database:
                     """, (cherg_gpv, otg_id, otg_name, existing[0]))
                 else:
                     # Додати нову адресу
-                    print(f"[DB] Inserting new address for user {user_id}")
+                    log.debug("Inserting new address", user_id=user_id)
                     await db.execute("""
                         INSERT INTO user_addresses 
                         (user_id, otg_id, otg_name, city_id, city_name, street_id, 
@@ -199,16 +678,15 @@ class Database:
                     """, (user_id, otg_id, otg_name, city_id, city_name, 
                           street_id, street_name, building_name, cherg_gpv))
                 
+                await db.execute(_BUMP_SIGNAL_SQL, (SIGNAL_SUBSCRIBERS,))
                 await db.commit()
-                print(f"[DB] Address saved successfully for user {user_id}")
+                log.debug("Address saved", user_id=user_id)
 
                 # Якщо користувач зберігає адресу через WebApp, видалити ручну групу
                 await self.clear_manual_group(user_id)
                 return True
-            except Exception as e:
-                print(f"[DB] Error saving address: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                log.exception("Error saving address", user_id=user_id)
                 return False
 
     async def get_manual_group(self, user_id: int) -> Optional[Dict]:
@@ -249,10 +727,11 @@ class Database:
                     """,
                     (user_id, group_code, label)
                 )
+                await db.execute(_BUMP_SIGNAL_SQL, (SIGNAL_SUBSCRIBERS,))
                 await db.commit()
                 return True
             except Exception as e:
-                print(f"Error saving manual group: {e}")
+                log.error("Error saving manual group", error=e)
                 return False
 
     async def clear_manual_group(self, user_id: int) -> None:
@@ -266,26 +745,16 @@ class Database:
 
     async def get_schedule_context(self, user_id: int) -> Optional[Dict]:
         """Отримати контекст (адресу або ручну групу) для показу графіка"""
-        address = await self.get_user_address(user_id)
-        if address:
-            address["context_type"] = "address"
-            return address
-
-        manual = await self.get_manual_group(user_id)
-        if manual:
-            return {
-                "context_type": "manual",
-                "cherg_gpv": manual.get("group_code", ""),
-                "label": manual.get("label"),
-                "city_name": None,
-                "street_name": None,
-                "building_name": None
-            }
-        return None
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            query = _SCHEDULE_CONTEXT_SQL.format(source="(SELECT ? AS user_id)", where="")
+            async with db.execute(query, (user_id,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
     
     async def get_user_address(self, user_id: int) -> Optional[Dict]:
         """Отримати основну адресу користувача"""
-        print(f"[DB] Getting address for user {user_id}")
+        log.debug("Getting address", user_id=user_id, sample=LOG_SAMPLE_RATE)
         async with aiosqlite.connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute("""
@@ -294,7 +763,7 @@ class Database:
             """, (user_id,)) as cursor:
                 row = await cursor.fetchone()
                 result = dict(row) if row else None
-                print(f"[DB] Address for user {user_id}: {result}")
+                log.debug("Address loaded", user_id=user_id, found=result is not None, sample=LOG_SAMPLE_RATE)
                 return result
     
     async def get_all_user_addresses(self, user_id: int) -> List[Dict]:
@@ -319,65 +788,71 @@ class Database:
                 await db.commit()
                 return True
             except Exception as e:
-                print(f"Error deleting address: {e}")
+                log.error("Error deleting address", error=e)
                 return False
     
     async def set_notifications(self, user_id: int, enabled: bool) -> bool:
         """Увімкнути/вимкнути сповіщення для користувача"""
+        if self._has_pending(("user", user_id)):
+            # UPDATE має знайти рядок, доданий щойно через add_user
+            await self.flush()
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 await db.execute(
                     "UPDATE users SET notifications_enabled = ? WHERE user_id = ?",
                     (enabled, user_id)
                 )
+                await db.execute(_BUMP_SIGNAL_SQL, (SIGNAL_SUBSCRIBERS,))
                 await db.commit()
                 return True
             except Exception as e:
-                print(f"Error setting notifications: {e}")
+                log.error("Error setting notifications", error=e)
                 return False
     
-    async def get_users_with_notifications(self) -> List[Dict]:
-        """Отримати всіх користувачів з увімкненими сповіщеннями"""
+    async def disable_notifications(self, user_ids: List[int]) -> bool:
+        """Вимкнути сповіщення кільком користувачам однією транзакцією.
+        
+        Сигнал підписників не змінюється: відписані вже не отримують
+        повідомлень, а наступний повний цикл просто їх не побачить.
+        """
+        if not user_ids:
+            return True
+        if any(self._has_pending(("user", user_id)) for user_id in user_ids):
+            await self.flush()
+        async with aiosqlite.connect(self.db_path) as db:
+            try:
+                await db.executemany(
+                    "UPDATE users SET notifications_enabled = 0 WHERE user_id = ?",
+                    [(user_id,) for user_id in user_ids]
+                )
+                await db.commit()
+                return True
+            except Exception as e:
+                log.error("Error disabling notifications", users=len(user_ids), error=e)
+                return False
+    
+    async def iter_users_with_notifications(self, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Користувачі з увімкненими сповіщеннями разом із контекстом.
+        
+        Один запит з тими ж правилами, що й get_schedule_context (основна
+        адреса важливіша за ручну групу); рядки читаються пакетами.
+        """
         async with aiosqlite.connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
-            users: List[Dict[str, Any]] = []
-
-            async with db.execute("""
-                SELECT u.user_id, ua.cherg_gpv, ua.city_name, ua.street_name, ua.building_name
-                FROM users u
-                JOIN user_addresses ua ON u.user_id = ua.user_id
-                WHERE u.notifications_enabled = 1 AND ua.is_primary = 1
-            """) as cursor:
-                rows = await cursor.fetchall()
-                for row in rows:
-                    data = dict(row)
-                    data["context_type"] = "address"
-                    users.append(data)
-
-            existing_ids = {user["user_id"] for user in users}
-
-            async with db.execute("""
-                SELECT u.user_id, mg.group_code, mg.label
-                FROM users u
-                JOIN user_manual_groups mg ON u.user_id = mg.user_id
-                WHERE u.notifications_enabled = 1
-            """) as cursor:
-                rows = await cursor.fetchall()
-                for row in rows:
-                    user_id = row["user_id"]
-                    if user_id in existing_ids:
-                        continue
-                    users.append({
-                        "user_id": user_id,
-                        "cherg_gpv": row["group_code"],
-                        "city_name": None,
-                        "street_name": None,
-                        "building_name": None,
-                        "label": row["label"],
-                        "context_type": "manual"
-                    })
-
-            return users
+            query = _SCHEDULE_CONTEXT_SQL.format(
+                source="users", where="AND u.notifications_enabled = 1 ORDER BY u.user_id"
+            )
+            async with db.execute(query) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield dict(row)
+    
+    async def get_users_with_notifications(self) -> List[Dict]:
+        """Отримати всіх користувачів з увімкненими сповіщеннями"""
+        return [user async for user in self.iter_users_with_notifications()]
     
     async def get_last_schedule_hash(self, schedule_type: str = None) -> Optional[str]:
         """Отримати хеш останнього графіку (today або tomorrow)"""
@@ -400,6 +875,10 @@ class Database:
     
     async def get_user_group_hash(self, user_id: int, schedule_date: str) -> Optional[str]:
         """Отримати збережений хеш графіку для користувача"""
+        pending = self._pending_params(("group_hash", user_id, schedule_date))
+        if pending:
+            # Відкладене видалення має лише (user_id, schedule_date)
+            return pending[2] if len(pending) > 2 else None
         async with aiosqlite.connect(self.db_path) as db:
             async with db.execute("""
                 SELECT schedule_hash FROM user_schedule_hashes 
@@ -408,77 +887,373 @@ class Database:
                 row = await cursor.fetchone()
                 return row[0] if row else None
     
+    async def has_user_group_hashes(self) -> bool:
+        """Чи є в БД хоч один хеш графіку користувача (інакше БД нова)"""
+        if any(key[0] == "group_hash" for key in (*self._pending, *self._inflight)):
+            return True
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT 1 FROM user_schedule_hashes LIMIT 1") as cursor:
+                return await cursor.fetchone() is not None
+    
     async def save_user_group_hash(self, user_id: int, schedule_date: str, schedule_hash: str) -> bool:
         """Зберегти хеш графіку для користувача"""
+        try:
+            return await self._write(
+                ("group_hash", user_id, schedule_date), _UPSERT_GROUP_HASH_SQL,
+                (user_id, schedule_date, schedule_hash)
+            )
+        except Exception as e:
+            log.error("Error saving user schedule hash", error=e)
+            return False
+    
+    async def restore_user_group_hash(self, user_id: int, schedule_date: str,
+                                      schedule_hash: Optional[str]) -> bool:
+        """Повернути попередній хеш користувача (None - видалити хеш)"""
+        if schedule_hash is not None:
+            return await self.save_user_group_hash(user_id, schedule_date, schedule_hash)
+        try:
+            return await self._write(
+                ("group_hash", user_id, schedule_date), _DELETE_GROUP_HASH_SQL,
+                (user_id, schedule_date)
+            )
+        except Exception as e:
+            log.error("Error restoring user schedule hash", error=e)
+            return False
+    
+    async def get_user_last_message(self, user_id: int) -> Optional[Dict]:
+        """Отримати останнє повідомлення з графіком для редагування"""
+        pending = self._pending_params(("last_message", user_id))
+        if pending:
+            return {"message_id": pending[1], "schedule_date": pending[2], "content_hash": pending[3]}
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT message_id, schedule_date, content_hash FROM user_last_schedule_message 
+                WHERE user_id = ?
+            """, (user_id,)) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return {"message_id": row[0], "schedule_date": row[1], "content_hash": row[2]}
+                return None
+    
+    async def save_user_last_message(self, user_id: int, message_id: int, schedule_date: str = None,
+                                     content_hash: str = None) -> bool:
+        """Зберегти останнє повідомлення з графіком (і хеш його тексту)"""
+        try:
+            return await self._write(
+                ("last_message", user_id), _UPSERT_LAST_MESSAGE_SQL,
+                (user_id, message_id, schedule_date, content_hash)
+            )
+        except Exception as e:
+            log.error("Error saving user last message", error=e)
+            return False
+    
+    async def save_schedule_hash(self, schedule_date: str, image_url: str, raw_html: str = None,
+                                 update_time: str = None) -> bool:
+        """Зберегти хеш нового графіку.
+        
+        Повертає True, якщо вміст для цієї дати і URL зображення новий - тоді ж
+        додається рядок історії (LOE може змінити графік, лишивши той самий URL)
+        разом з часом "станом на" (update_time).
+        """
+        blob_hash = _payload_hash(raw_html) if raw_html else None
+        async with aiosqlite.connect(self.db_path) as db:
+            try:
+                async with db.execute("""
+                    SELECT id, blob_hash FROM schedule_cache
+                    WHERE schedule_date = ? AND image_url = ?
+                    ORDER BY id DESC LIMIT 1
+                """, (schedule_date, image_url)) as cursor:
+                    existing = await cursor.fetchone()
+                if existing and existing[1] == blob_hash:
+                    return False
+                
+                # Сам вміст зберігається один раз, таблиці тримають лише хеш
+                if raw_html:
+                    await self._store_blob(db, raw_html)
+                if existing:
+                    await db.execute("""
+                        UPDATE schedule_cache SET blob_hash = ?, last_check = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (blob_hash, existing[0]))
+                else:
+                    await db.execute("""
+                        INSERT INTO schedule_cache (schedule_date, image_url, blob_hash)
+                        VALUES (?, ?, ?)
+                    """, (schedule_date, image_url, blob_hash))
+                
+                # В історію - лише якщо вміст відрізняється від останнього на цю дату
+                async with db.execute("""
+                    SELECT blob_hash FROM schedule_history
+                    WHERE schedule_date = ?
+                    ORDER BY created_at DESC, id DESC LIMIT 1
+                """, (schedule_date,)) as cursor:
+                    last = await cursor.fetchone()
+                if last is None or last[0] != blob_hash:
+                    await db.execute("""
+                        INSERT INTO schedule_history (schedule_date, image_url, blob_hash, update_time)
+                        VALUES (?, ?, ?, ?)
+                    """, (schedule_date, image_url, blob_hash, update_time or None))
+                
+                await db.commit()
+                return True
+            except Exception as e:
+                log.error("Error saving schedule hash", error=e)
+                return False
+    
+    async def get_schedule_blob(self, blob_hash: str) -> Optional[str]:
+        """Отримати сирий графік за хешем вмісту"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT codec, data FROM schedule_blobs WHERE hash = ?", (blob_hash,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return _unpack_payload(row[0], row[1]) if row else None
+    
+    async def get_schedule_history(self, days: int) -> List[Dict]:
+        """Отримати публікації графіків за останні N днів (created_at у UTC)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT h.schedule_date, h.created_at, b.codec, b.data
+                FROM schedule_history h
+                LEFT JOIN schedule_blobs b ON b.hash = h.blob_hash
+                WHERE h.created_at >= datetime('now', ?)
+                ORDER BY h.created_at
+            """, (f"-{int(days)} days",)) as cursor:
+                rows = await cursor.fetchall()
+                return [{
+                    "schedule_date": row["schedule_date"],
+                    "created_at": row["created_at"],
+                    "raw_html": _unpack_payload(row["codec"], row["data"]),
+                } for row in rows]
+    
+    async def get_schedule_publications(self, days: int) -> List[Dict]:
+        """Моменти публікацій за останні N днів без самих графіків (created_at у UTC)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT schedule_date, created_at, update_time FROM schedule_history
+                WHERE created_at >= datetime('now', ?)
+                ORDER BY created_at
+            """, (f"-{int(days)} days",)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+    
+    async def get_group_channels(self) -> Dict[str, Dict]:
+        """Отримати відповідність група -> канал"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT group_code, chat_id, invite_link FROM group_channels
+                ORDER BY group_code
+            """) as cursor:
+                rows = await cursor.fetchall()
+                return {row["group_code"]: dict(row) for row in rows}
+    
+    async def set_group_channel(self, group_code: str, chat_id: int, invite_link: str = None) -> bool:
+        """Призначити канал для групи"""
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 await db.execute("""
-                    INSERT OR REPLACE INTO user_schedule_hashes 
-                    (user_id, schedule_date, schedule_hash, created_at)
+                    INSERT INTO group_channels (group_code, chat_id, invite_link, updated_at)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                """, (user_id, schedule_date, schedule_hash))
+                    ON CONFLICT(group_code) DO UPDATE SET
+                        chat_id = excluded.chat_id,
+                        invite_link = excluded.invite_link,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (group_code, chat_id, invite_link))
                 await db.commit()
                 return True
             except Exception as e:
-                print(f"Error saving user schedule hash: {e}")
+                log.error("Error saving group channel", error=e)
                 return False
     
-    async def get_user_last_message(self, user_id: int) -> Optional[Dict]:
-        """Отримати останнє повідомлення з графіком для редагування"""
+    async def delete_group_channel(self, group_code: str) -> bool:
+        """Прибрати канал групи"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "DELETE FROM group_channels WHERE group_code = ?", (group_code,)
+            )
+            await db.commit()
+            return cursor.rowcount > 0
+    
+    async def get_group_hash(self, group_code: str, schedule_date: str) -> Optional[str]:
+        """Отримати збережений хеш графіку групи"""
         async with aiosqlite.connect(self.db_path) as db:
             async with db.execute("""
-                SELECT message_id, schedule_date FROM user_last_schedule_message 
-                WHERE user_id = ?
-            """, (user_id,)) as cursor:
+                SELECT schedule_hash FROM group_schedule_hashes
+                WHERE group_code = ? AND schedule_date = ?
+            """, (group_code, schedule_date)) as cursor:
                 row = await cursor.fetchone()
-                if row:
-                    return {"message_id": row[0], "schedule_date": row[1]}
-                return None
+                return row[0] if row else None
     
-    async def save_user_last_message(self, user_id: int, message_id: int, schedule_date: str = None) -> bool:
-        """Зберегти останнє повідомлення з графіком"""
+    async def save_group_hash(self, group_code: str, schedule_date: str, schedule_hash: str) -> bool:
+        """Зберегти хеш графіку групи"""
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 await db.execute("""
-                    INSERT OR REPLACE INTO user_last_schedule_message 
-                    (user_id, message_id, schedule_date, updated_at)
+                    INSERT OR REPLACE INTO group_schedule_hashes
+                    (group_code, schedule_date, schedule_hash, updated_at)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                """, (user_id, message_id, schedule_date))
+                """, (group_code, schedule_date, schedule_hash))
                 await db.commit()
                 return True
             except Exception as e:
+                log.error("Error saving group schedule hash", error=e)
                 return False
     
-    async def save_schedule_hash(self, schedule_date: str, image_url: str, raw_html: str = None) -> bool:
-        """Зберегти хеш нового графіку"""
+    async def bump_signal(self, name: str, payload: str = None) -> None:
+        """Збільшити версію сигналу (і за потреби оновити payload)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(_BUMP_SIGNAL_SQL, (name,))
+            if payload is not None:
+                await db.execute(
+                    "UPDATE change_signals SET payload = ? WHERE name = ?",
+                    (payload, name)
+                )
+            await db.commit()
+    
+    async def get_signal_version(self, name: str) -> int:
+        """Отримати поточну версію сигналу"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT version FROM change_signals WHERE name = ?", (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+    
+    async def get_signal_payload(self, name: str) -> Optional[str]:
+        """Отримати payload сигналу"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT payload FROM change_signals WHERE name = ?", (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+    
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Захопити або продовжити оренду. True, якщо вона належить owner"""
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            """, (name, owner, now + ttl, now))
+            await db.commit()
+            async with db.execute(
+                "SELECT owner FROM leases WHERE name = ?", (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return bool(row and row[0] == owner)
+    
+    async def release_lease(self, name: str, owner: str) -> None:
+        """Звільнити оренду, якщо вона належить owner"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+            )
+            await db.commit()
+    
+    async def get_active_leases(self, prefix: str) -> List[Dict]:
+        """Отримати чинні оренди з іменем, що починається з prefix"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT name, owner, expires_at FROM leases
+                WHERE name LIKE ? AND expires_at >= ?
+                ORDER BY name
+            """, (f"{prefix}%", time.time())) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+    
+    async def enqueue_outbox(self, user_id: int, message: str, schedule_date: str = None,
+                             image_day: str = None) -> Optional[int]:
+        """Додати сповіщення до черги доставки"""
+        # Хеш, через який сповіщення з'явилось, має потрапити в БД раніше за
+        # саме сповіщення - інакше після падіння його згенерує повторно
+        try:
+            await self.flush()
+        except Exception as e:
+            log.warning("Write-behind flush failed", error=e)
         async with aiosqlite.connect(self.db_path) as db:
             try:
-                # Перевірити чи вже існує такий графік
-                async with db.execute("""
-                    SELECT id FROM schedule_cache
-                    WHERE schedule_date = ? AND image_url = ?
-                """, (schedule_date, image_url)) as cursor:
-                    existing = await cursor.fetchone()
-                
-                if not existing:
-                    await db.execute("""
-                        INSERT INTO schedule_cache (schedule_date, image_url, raw_html)
-                        VALUES (?, ?, ?)
-                    """, (schedule_date, image_url, raw_html))
-                    
-                    # Також зберегти в історію
-                    await db.execute("""
-                        INSERT OR IGNORE INTO schedule_history (schedule_date, image_url, raw_html)
-                        VALUES (?, ?, ?)
-                    """, (schedule_date, image_url, raw_html))
-                    
-                    await db.commit()
-                    return True
-                return False
+                cursor = await db.execute("""
+                    INSERT INTO notification_outbox (user_id, message, schedule_date, image_day)
+                    VALUES (?, ?, ?, ?)
+                """, (user_id, message, schedule_date, image_day))
+                await db.commit()
+                return cursor.lastrowid
+            except Exception as e:
+                log.error("Error enqueueing notification", error=e)
+                return None
+    
+    async def mark_outbox_sent(self, outbox_id: int) -> None:
+        """Позначити сповіщення з черги як доставлене"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "UPDATE notification_outbox SET sent_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (outbox_id,)
+            )
+            await db.commit()
+    
+    async def get_pending_outbox(self, max_age_minutes: int) -> List[Dict]:
+        """Отримати недоставлені сповіщення, не старші за max_age_minutes"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT id, user_id, message, schedule_date, image_day
+                FROM notification_outbox
+                WHERE sent_at IS NULL AND created_at >= datetime('now', ?)
+                ORDER BY created_at, id
+            """, (f"-{int(max_age_minutes)} minutes",)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+    
+    async def get_cached_file(self, url: str) -> Optional[Dict]:
+        """Отримати file_id зображення за URL (і вік запису в секундах)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT file_id, content_hash,
+                       (julianday('now') - julianday(created_at)) * 86400
+                FROM telegram_file_cache WHERE url = ?
+            """, (url,)) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return {"file_id": row[0], "content_hash": row[1], "age": row[2] or 0.0}
+                return None
+    
+    async def get_cached_file_by_hash(self, content_hash: str) -> Optional[str]:
+        """Отримати file_id зображення з таким самим вмістом"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT file_id FROM telegram_file_cache WHERE content_hash = ?
+                ORDER BY created_at DESC LIMIT 1
+            """, (content_hash,)) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+    
+    async def save_cached_file(self, url: str, content_hash: str, file_id: str) -> bool:
+        """Зберегти file_id зображення"""
+        async with aiosqlite.connect(self.db_path) as db:
+            try:
+                await db.execute("""
+                    INSERT OR REPLACE INTO telegram_file_cache (url, content_hash, file_id, created_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (url, content_hash, file_id))
+                await db.commit()
+                return True
             except Exception as e:
-                print(f"Error saving schedule hash: {e}")
+                log.error("Error saving cached file", error=e)
                 return False
     
+    async def delete_cached_file(self, file_id: str) -> None:
+        """Видалити недійсний file_id з кешу"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM telegram_file_cache WHERE file_id = ?", (file_id,))
+            await db.commit()
+    
     async def check_notification_sent(self, user_id: int, notification_type: str, schedule_date: str = None) -> bool:
         """Перевірити чи було відправлено сповіщення користувачу"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -509,11 +1284,107 @@ class Database:
                 await db.commit()
                 return True
             except Exception as e:
-                print(f"Error marking notification sent: {e}")
+                log.error("Error marking notification sent", error=e)
                 return False
 
+    async def delete_expired_batch(self, table: str, column: str, days: int,
+                                   batch_size: int, where: str = "") -> int:
+        """Видалити до batch_size рядків, старших за N днів. Повертає кількість.
+        
+        table/column/where - лише з коду (RETENTION_POLICIES), не від користувача.
+        Короткі транзакції не блокують запис сповіщень надовго.
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table}
+                    WHERE {column} < datetime('now', ?) {where}
+                    LIMIT ?
+                )
+            """, (f"-{int(days)} days", batch_size))
+            await db.commit()
+            return cursor.rowcount
+    
+    async def delete_orphan_blobs(self) -> int:
+        """Видалити вміст графіків, на який більше не посилаються"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("""
+                DELETE FROM schedule_blobs
+                WHERE hash NOT IN (SELECT blob_hash FROM schedule_cache WHERE blob_hash IS NOT NULL)
+                  AND hash NOT IN (SELECT blob_hash FROM schedule_history WHERE blob_hash IS NOT NULL)
+            """)
+            await db.commit()
+            return cursor.rowcount
+    
+    async def compact(self, vacuum_pages: int) -> Dict[str, Any]:
+        """Звільнити до vacuum_pages вільних сторінок і оновити статистику планувальника.
+        
+        Лише incremental_vacuum: якщо файл створено без інкрементального
+        auto_vacuum, сторінки не звільняються (повний VACUUM блокував би запис
+        на весь час перезапису файлу - його виконує python maintenance.py vacuum).
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                auto_vacuum = (await cursor.fetchone())[0]
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                free_before = (await cursor.fetchone())[0]
+            free_after = free_before
+            if auto_vacuum == 2:
+                # incremental_vacuum звільняє по сторінці на кожен крок курсора
+                async with db.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})") as cursor:
+                    await cursor.fetchall()
+                async with db.execute("PRAGMA freelist_count") as cursor:
+                    free_after = (await cursor.fetchone())[0]
+            else:
+                log.warning("Incremental auto_vacuum is off, skipping compaction",
+                            free_pages=free_before, hint="python maintenance.py vacuum")
+            await db.execute("PRAGMA optimize")
+            await db.commit()
+            return {"freed_pages": free_before - free_after, "free_pages": free_after}
+    
+    async def enable_incremental_vacuum(self) -> bool:
+        """Перевести існуючу БД на інкрементальний auto_vacuum.
+        
+        Потребує повного VACUUM: файл переписується, запис заблоковано на весь
+        час. Запускати вручну при зупиненому боті. Повертає False, якщо режим
+        уже увімкнено.
+        """
+        await self.flush()
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                if (await cursor.fetchone())[0] == 2:
+                    return False
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+            log.info("Switched database to incremental auto_vacuum")
+            return True
+    
+    async def get_table_sizes(self) -> Dict[str, Dict[str, int]]:
+        """Розмір таблиць: кількість рядків і байти (якщо SQLite зібрано з dbstat)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            ) as cursor:
+                tables = [row[0] for row in await cursor.fetchall()]
+            sizes = {}
+            for table in tables:
+                async with db.execute(f"SELECT COUNT(*) FROM {table}") as cursor:
+                    sizes[table] = {"rows": (await cursor.fetchone())[0]}
+            try:
+                async with db.execute(
+                    "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+                ) as cursor:
+                    for name, size in await cursor.fetchall():
+                        if name in sizes:
+                            sizes[name]["bytes"] = size
+            except Exception:
+                pass  # dbstat недоступний - лише кількість рядків
+            return sizes
+    
     async def delete_all_user_data(self, user_id: int) -> bool:
         """Видалити всі дані користувача з усіх таблиць"""
+        # Відкладені записи не мають повернути видалене
+        await self._discard_pending(user_id)
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 # Видаляємо адреси
@@ -528,16 +1399,21 @@ class Database:
                 # Видаляємо хеші графіків
                 await db.execute("DELETE FROM user_schedule_hashes WHERE user_id = ?", (user_id,))
                 
+                # Видаляємо останнє повідомлення з графіком (інакше новий підписник
+                # отримає пропуск "незмінного" тексту або редагування старого)
+                await db.execute("DELETE FROM user_last_schedule_message WHERE user_id = ?", (user_id,))
+                
                 # Оновлюємо дані користувача (скидаємо сповіщення)
                 await db.execute("""
                     UPDATE users SET notifications_enabled = 0 WHERE user_id = ?
                 """, (user_id,))
                 
+                await db.execute(_BUMP_SIGNAL_SQL, (SIGNAL_SUBSCRIBERS,))
                 await db.commit()
-                print(f"[DB] Deleted all data for user {user_id}")
+                log.info("Deleted all data for user", user_id=user_id)
                 return True
             except Exception as e:
-                print(f"Error deleting user data: {e}")
+                log.error("Error deleting user data", error=e)
                 return False
 
 
@@ -2,9 +2,13 @@
 from __future__ import annotations
 
 import aiohttp
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
-from config import FIREBASE_DATABASE_URL
+from config import FIREBASE_DATABASE_URL, LOG_SAMPLE_RATE
+from metrics import http_trace_config
+from logs import get_logger
+
+log = get_logger(__name__)
 
 
 class FirebaseService:
@@ -16,7 +20,7 @@ class FirebaseService:
 
     async def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            self._session = aiohttp.ClientSession(trace_configs=[http_trace_config("firebase")])
         return self._session
 
     async def close(self) -> None:
@@ -26,13 +30,13 @@ class FirebaseService:
     async def get_user_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Fetch user profile JSON from Firebase Realtime Database"""
         if not self.database_url:
-            print(f"[FIREBASE] No database URL configured")
+            log.debug("No database URL configured")
             return None
 
         # Firebase Realtime Database REST API
         url = f"{self.database_url}/users/{user_id}.json"
         
-        print(f"[FIREBASE] Fetching user {user_id} from {url}")
+        log.debug("Fetching user", user_id=user_id, sample=LOG_SAMPLE_RATE)
 
         try:
             session = await self._get_session()
@@ -43,20 +47,20 @@ class FirebaseService:
                 if resp.status == 200:
                     data = await resp.json()
                     if not data:
-                        print(f"[FIREBASE] No data for user {user_id}")
+                        log.debug("No data for user", user_id=user_id, sample=LOG_SAMPLE_RATE)
                         return None
                     if isinstance(data, dict):
-                        print(f"[FIREBASE] Got data for user {user_id}: {data}")
+                        log.debug("Got user data", user_id=user_id, fields=len(data), sample=LOG_SAMPLE_RATE)
                         return data
-                    print(f"[FIREBASE] Unexpected payload for user {user_id}: {data}")
+                    log.warning("Unexpected payload for user", user_id=user_id, type=type(data).__name__)
                 elif resp.status == 404:
-                    print(f"[FIREBASE] User {user_id} not found")
+                    log.debug("User not found", user_id=user_id, sample=LOG_SAMPLE_RATE)
                     return None
                 else:
                     body = await resp.text()
-                    print(f"[FIREBASE] Unexpected status {resp.status} for user {user_id}: {body}")
+                    log.warning("Unexpected status for user", user_id=user_id, status=resp.status, body=body[:200])
         except Exception as exc:
-            print(f"[FIREBASE] Error fetching user {user_id}: {exc}")
+            log.warning("Error fetching user", user_id=user_id, error=exc)
         return None
 
     async def save_user_profile(self, user_id: int, data: Dict[str, Any]) -> bool:
@@ -74,13 +78,13 @@ class FirebaseService:
                 timeout=aiohttp.ClientTimeout(total=15)
             ) as resp:
                 if resp.status == 200:
-                    print(f"[FIREBASE] Saved data for user {user_id}")
+                    log.debug("Saved user data", user_id=user_id)
                     return True
                 else:
                     body = await resp.text()
-                    print(f"[FIREBASE] Error saving user {user_id}: {resp.status} - {body}")
+                    log.warning("Error saving user", user_id=user_id, status=resp.status, body=body[:200])
         except Exception as exc:
-            print(f"[FIREBASE] Error saving user {user_id}: {exc}")
+            log.warning("Error saving user", user_id=user_id, error=exc)
         return False
 
     async def set_notifications(self, user_id: int, enabled: bool) -> bool:
@@ -103,6 +107,30 @@ class FirebaseService:
             pass
         return False
 
+    async def disable_notifications(self, user_ids: List[int]) -> bool:
+        """Вимкнути сповіщення кільком користувачам одним multi-path PATCH"""
+        if not self.database_url or not user_ids:
+            return True
+
+        url = f"{self.database_url}/users.json"
+        updates = {f"{user_id}/notifications_enabled": False for user_id in user_ids}
+
+        try:
+            session = await self._get_session()
+            async with session.patch(
+                url,
+                json=updates,
+                timeout=aiohttp.ClientTimeout(total=30)
+            ) as resp:
+                if resp.status == 200:
+                    return True
+                body = await resp.text()
+                log.warning("Error disabling notifications", users=len(user_ids),
+                            status=resp.status, body=body[:200])
+        except Exception as exc:
+            log.warning("Error disabling notifications", users=len(user_ids), error=exc)
+        return False
+
     async def save_notification_settings(self, user_id: int, settings: Dict[str, Any]) -> bool:
         """Зберегти налаштування сповіщень користувача"""
         if not self.database_url:
@@ -155,13 +183,13 @@ class FirebaseService:
                 timeout=aiohttp.ClientTimeout(total=15)
             ) as resp:
                 if resp.status == 200:
-                    print(f"[FIREBASE] Deleted user {user_id}")
+                    log.info("Deleted user", user_id=user_id)
                     return True
                 else:
                     body = await resp.text()
-                    print(f"[FIREBASE] Error deleting user {user_id}: {resp.status} - {body}")
+                    log.warning("Error deleting user", user_id=user_id, status=resp.status, body=body[:200])
         except Exception as exc:
-            print(f"[FIREBASE] Error deleting user {user_id}: {exc}")
+            log.warning("Error deleting user", user_id=user_id, error=exc)
         return False
 
     async def get_all_users_with_notifications(self) -> list:
@@ -194,13 +222,13 @@ class FirebaseService:
                             user_data["user_id"] = int(user_id)
                             users.append(user_data)
                     
-                    print(f"[FIREBASE] Found {len(users)} users with notifications")
+                    log.info("Found users with notifications", users=len(users))
                     return users
                 else:
                     body = await resp.text()
-                    print(f"[FIREBASE] Error getting users: {resp.status} - {body}")
+                    log.warning("Error getting users", status=resp.status, body=body[:200])
         except Exception as exc:
-            print(f"[FIREBASE] Error getting users with notifications: {exc}")
+            log.warning("Error getting users with notifications", error=exc)
         return []
 
 
@@ -1,18 +1,67 @@
 """
 Telegram Bot handlers
 """
+import asyncio
+import html
 import re
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from telegram import (
+    Update,
+    InputFile,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    WebAppInfo,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+)
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
 
-from database import db
+from database import db, SIGNAL_SUBSCRIBERS, SIGNAL_BASELINE
 from api_service import api_service
 from user_context_service import user_context_service
-from config import WEBAPP_URL
+from schedule_snapshot import snapshot_store
+from message_state import message_state
+from timeline_renderer import timeline_service
+from tracing import tracer, PROFILE_MODES
+from logs import get_logger
+from config import (
+    WEBAPP_URL,
+    SCHEDULE_REFRESH_WINDOW,
+    SCHEDULE_CARD_CACHE_SIZE,
+    INLINE_CACHE_TIME,
+    INLINE_RESULTS_CACHE_SIZE,
+    ADMIN_IDS,
+    BROADCAST_MODE,
+    NOTIFIER_MODE,
+    PROFILE_TOP,
+)
+
+log = get_logger(__name__)
+
+
+# Остання відрендерена картка графіку: {user_id: (monotonic_time, text)} (LRU)
+_schedule_cards: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+# Фонові задачі рендеру графіку: {user_id: Task}, лише ті, що ще виконуються
+_render_tasks: Dict[int, asyncio.Task] = {}
+# Кеш інлайн-результатів: {query: results} (LRU), валідний для _inline_cache_version
+_inline_cache: "OrderedDict[str, List[InlineQueryResultArticle]]" = OrderedDict()
+_inline_cache_version = ""
+# Довші запити обрізаються: номер групи все одно короткий
+INLINE_QUERY_MAX_LENGTH = 64
+
+
+def _lru_put(cache: OrderedDict, key, value, size: int) -> None:
+    """Записати в OrderedDict-LRU і витіснити найстаріші записи понад size"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
 
 
 def normalize_group_code(raw_value: str) -> Optional[str]:
@@ -59,7 +108,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler для команди /start"""
     user = update.effective_user
     
-    print(f"[START] User {user.id} ({user.username}) started bot")
+    log.info("User started bot", user_id=user.id)
     
     # Зберегти користувача в БД
     await db.add_user(
@@ -72,7 +121,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Перевірити чи є збережений контекст (адреса або група)
     schedule_context = await user_context_service.get_context(user.id)
     
-    print(f"[START] User {user.id} schedule context: {schedule_context}")
+    log.debug("Start context", user_id=user.id, configured=schedule_context is not None)
     
     welcome_text = (
         f"👋 Вітаю, {user.first_name}!\n\n"
@@ -154,9 +203,21 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     data = query.data
     
+    with tracer.trace("handler", data):
+        await _dispatch_callback(query, user_id, data)
+
+
+async def _dispatch_callback(query, user_id: int, data: str):
+    """Виконати дію кнопки"""
     if data == "show_schedule":
         await show_schedule(query, user_id)
     
+    elif data == "show_schedule_image":
+        await send_schedule_images(query, user_id)
+    
+    elif data == "show_timeline":
+        await send_timeline(query, user_id)
+    
     elif data == "notifications":
         await show_notifications_menu(query, user_id)
     
@@ -188,6 +249,12 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "toggle_power_on":
         await toggle_notification_setting(query, user_id, "power_on")
     
+    elif data == "toggle_private_notifications":
+        await toggle_notification_setting(query, user_id, "private_notifications")
+    
+    elif data == "join_channel":
+        await show_group_channel(query, user_id)
+    
     elif data == "set_before_minutes":
         await show_before_minutes_menu(query, user_id)
     
@@ -208,106 +275,167 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
-async def show_schedule(query, user_id: int):
-    """Показати поточний графік"""
-    schedule_context = None
-    try:
-        schedule_context = await user_context_service.get_context(user_id)
-        
-        if not schedule_context or not schedule_context.get("cherg_gpv"):
-            await safe_edit_message(
-                query,
-                "❌ Ви ще не налаштували свою адресу.\n"
-                "Натисніть кнопку 'Налаштувати адресу' або надішліть команду <code>/schedule 4.1</code>.",
-                reply_markup=get_main_keyboard(False),
-                parse_mode=ParseMode.HTML
-            )
-            return
-        
-        # Отримати поточний графік
-        grafics = await api_service.get_current_grafics()
-        
-        if not grafics or not grafics.get("rawHtml"):
-            await safe_edit_message(
-                query,
-                "⚠️ Наразі немає доступних графіків відключень.",
-                reply_markup=get_main_keyboard(True),
-                parse_mode=ParseMode.HTML
-            )
-            return
-        
-        raw_html = grafics.get("rawHtml", "")
-        cherg_gpv = schedule_context.get("cherg_gpv", "")
-        formatted_group = await api_service.get_schedule_group(cherg_gpv)
-        
-        # Парсити персоналізований графік
-        parsed_schedule = api_service.parse_schedule_for_group(raw_html, cherg_gpv)
-        outages = parsed_schedule.get("outages", [])
-        
-        # Визначити поточний статус
-        from datetime import datetime
-        now = datetime.now()
-        current_minutes = now.hour * 60 + now.minute
-        
-        is_power_on = True
-        next_change_time = None
+def get_schedule_keyboard() -> InlineKeyboardMarkup:
+    """Клавіатура під карткою графіку"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔄 Оновити", callback_data="show_schedule")],
+        [
+            InlineKeyboardButton("📊 Таймлайн", callback_data="show_timeline"),
+            InlineKeyboardButton("🖼 Зображення", callback_data="show_schedule_image")
+        ],
+        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
+    ])
+
+
+def invalidate_schedule_card(user_id: int) -> None:
+    """Скинути кешовану картку графіку (після зміни адреси або групи)"""
+    _schedule_cards.pop(user_id, None)
+
+
+async def build_schedule_card(user_id: int) -> Tuple[str, InlineKeyboardMarkup, bool]:
+    """Сформувати картку графіку: (текст, клавіатура, чи вдалося отримати графік)"""
+    # Незалежні запити виконуємо паралельно
+    schedule_context, grafics, sync_time = await asyncio.gather(
+        user_context_service.get_context(user_id),
+        api_service.get_current_grafics(),
+        api_service.get_sync_time()
+    )
+    
+    if not schedule_context or not schedule_context.get("cherg_gpv"):
+        return (
+            "❌ Ви ще не налаштували свою адресу.\n"
+            "Натисніть кнопку 'Налаштувати адресу' або надішліть команду <code>/schedule 4.1</code>.",
+            get_main_keyboard(False),
+            False
+        )
+    
+    if not grafics or not grafics.get("rawHtml"):
+        return (
+            "⚠️ Наразі немає доступних графіків відключень.",
+            get_main_keyboard(True),
+            False
+        )
+    
+    raw_html = grafics.get("rawHtml", "")
+    cherg_gpv = schedule_context.get("cherg_gpv", "")
+    formatted_group = await api_service.get_schedule_group(cherg_gpv)
+    
+    # Парсити персоналізований графік
+    parsed_schedule = api_service.parse_schedule_for_group(raw_html, cherg_gpv)
+    outages = parsed_schedule.get("outages", [])
+    
+    # Визначити поточний статус
+    from datetime import datetime
+    now = datetime.now()
+    current_minutes = now.hour * 60 + now.minute
+    
+    is_power_on = True
+    next_change_time = None
+    
+    for outage in outages:
+        start_h, start_m = map(int, outage["start"].split(":"))
+        end_h, end_m = map(int, outage["end"].split(":"))
+        start_minutes = start_h * 60 + start_m
+        end_minutes = end_h * 60 + end_m
         
+        if start_minutes <= current_minutes < end_minutes:
+            is_power_on = False
+            next_change_time = outage["end"]
+            break
+    
+    if is_power_on:
         for outage in outages:
             start_h, start_m = map(int, outage["start"].split(":"))
-            end_h, end_m = map(int, outage["end"].split(":"))
             start_minutes = start_h * 60 + start_m
-            end_minutes = end_h * 60 + end_m
-            
-            if start_minutes <= current_minutes < end_minutes:
-                is_power_on = False
-                next_change_time = outage["end"]
+            if start_minutes > current_minutes:
+                next_change_time = outage["start"]
                 break
-        
-        if is_power_on:
-            for outage in outages:
-                start_h, start_m = map(int, outage["start"].split(":"))
-                start_minutes = start_h * 60 + start_m
-                if start_minutes > current_minutes:
-                    next_change_time = outage["start"]
-                    break
-        
-        # Форматувати текст відключень
-        if outages:
-            outage_text = ""
-            for outage in outages:
-                outage_text += f"   🔴 <b>{outage['start']} - {outage['end']}</b>\n"
-        else:
-            outage_text = "   🟢 <b>Відключень не заплановано</b>\n"
-        
-        # Статус зараз
-        if is_power_on:
-            status_emoji = "🟢"
-            status_text = "Зараз світло є"
-            if next_change_time:
-                status_text += f" (відключення о {next_change_time})"
-        else:
-            status_emoji = "🔴"
-            status_text = "Зараз світла немає"
-            if next_change_time:
-                status_text += f" (увімкнення о {next_change_time})"
-        
-        sync_time = await api_service.get_sync_time()
-        sync_info = f"\n🕐 Оновлено: {sync_time}" if sync_time else ""
-        
-        message = (
-            f"⚡ <b>Графік погодинних відключень</b>\n\n"
-            f"{build_location_block(schedule_context, formatted_group)}"
-            f"{status_emoji} <b>{status_text}</b>\n\n"
-            f"⏰ <b>Графік на сьогодні:</b>\n"
-            f"{outage_text}"
-            f"{sync_info}"
+    
+    # Форматувати текст відключень
+    if outages:
+        outage_text = ""
+        for outage in outages:
+            outage_text += f"   🔴 <b>{outage['start']} - {outage['end']}</b>\n"
+    else:
+        outage_text = "   🟢 <b>Відключень не заплановано</b>\n"
+    
+    # Статус зараз
+    if is_power_on:
+        status_emoji = "🟢"
+        status_text = "Зараз світло є"
+        if next_change_time:
+            status_text += f" (відключення о {next_change_time})"
+    else:
+        status_emoji = "🔴"
+        status_text = "Зараз світла немає"
+        if next_change_time:
+            status_text += f" (увімкнення о {next_change_time})"
+    
+    sync_info = f"\n🕐 Оновлено: {sync_time}" if sync_time else ""
+    
+    message = (
+        f"⚡ <b>Графік погодинних відключень</b>\n\n"
+        f"{build_location_block(schedule_context, formatted_group)}"
+        f"{status_emoji} <b>{status_text}</b>\n\n"
+        f"⏰ <b>Графік на сьогодні:</b>\n"
+        f"{outage_text}"
+        f"{sync_info}"
+    )
+    
+    return message, get_schedule_keyboard(), True
+
+
+async def show_schedule(query, user_id: int):
+    """Показати поточний графік у дві фази: миттєва картка, потім свіжі дані"""
+    task = _render_tasks.get(user_id)
+    if task and not task.done():
+        # Рендер вже йде - повторне натискання нічого не змінює
+        return
+    
+    cached = _schedule_cards.get(user_id)
+    if cached:
+        _schedule_cards.move_to_end(user_id)
+    if cached and time.monotonic() - cached[0] < SCHEDULE_REFRESH_WINDOW:
+        # Картка свіжа - показуємо її без звернень до API
+        await safe_edit_message(
+            query,
+            cached[1],
+            reply_markup=get_schedule_keyboard(),
+            parse_mode=ParseMode.HTML
         )
-        
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔄 Оновити", callback_data="show_schedule")],
-            [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-        ])
-        
+        return
+    
+    # Фаза 1: миттєво показуємо кешовану картку або заглушку
+    if cached:
+        placeholder = f"{cached[1]}\n\n⏳ <i>Оновлюю графік...</i>"
+    else:
+        placeholder = "⏳ Завантажую графік..."
+    try:
+        await safe_edit_message(
+            query,
+            placeholder,
+            reply_markup=get_schedule_keyboard(),
+            parse_mode=ParseMode.HTML
+        )
+    except BadRequest as e:
+        log.warning("Error showing schedule placeholder", error=e)
+    
+    # Фаза 2: свіжий рендер у фоні, щоб не блокувати обробку інших апдейтів
+    task = asyncio.create_task(_render_schedule(query, user_id))
+    _render_tasks[user_id] = task
+    # Прибираємо задачу, навіть якщо її скасовано до старту
+    task.add_done_callback(
+        lambda done: _render_tasks.pop(user_id, None) if _render_tasks.get(user_id) is done else None
+    )
+
+
+async def _render_schedule(query, user_id: int):
+    """Отримати свіжий графік і відредагувати повідомлення"""
+    has_context = False
+    try:
+        message, keyboard, has_context = await build_schedule_card(user_id)
+        if has_context:
+            _lru_put(_schedule_cards, user_id, (time.monotonic(), message), SCHEDULE_CARD_CACHE_SIZE)
         await safe_edit_message(
             query,
             message,
@@ -315,15 +443,63 @@ async def show_schedule(query, user_id: int):
             parse_mode=ParseMode.HTML
         )
         
+    except Exception:
+        log.exception("Error showing schedule")
+        try:
+            await safe_edit_message(
+                query,
+                "❌ Помилка при отриманні графіку. Спробуйте пізніше.",
+                reply_markup=get_main_keyboard(has_context or user_id in _schedule_cards),
+                parse_mode=ParseMode.HTML
+            )
+        except Exception:
+            pass
+
+
+async def send_schedule_images(query, user_id: int):
+    """Надіслати офіційні зображення графіку на сьогодні та завтра"""
+    from notifications import notification_service
+    if not notification_service:
+        return
+    sent_today = await notification_service.send_schedule_image(user_id, "today")
+    sent_tomorrow = await notification_service.send_schedule_image(user_id, "tomorrow")
+    if not sent_today and not sent_tomorrow:
+        await query.get_bot().send_message(
+            chat_id=user_id,
+            text="⚠️ Зображення графіку наразі недоступне."
+        )
+
+
+async def send_timeline(query, user_id: int):
+    """Надіслати таймлайн групи користувача на сьогодні та завтра"""
+    schedule_context = await user_context_service.get_context(user_id)
+    if not schedule_context or not schedule_context.get("cherg_gpv"):
+        await query.get_bot().send_message(
+            chat_id=user_id,
+            text="❌ Спершу налаштуйте адресу або групу."
+        )
+        return
+    
+    if snapshot_store.is_empty:
+        await snapshot_store.refresh()
+    
+    cherg_gpv = schedule_context["cherg_gpv"]
+    formatted_group = await api_service.get_schedule_group(cherg_gpv)
+    try:
+        sent = await timeline_service.send_timeline(
+            query.get_bot(),
+            user_id,
+            cherg_gpv,
+            formatted_group,
+            caption=f"📊 Графік групи {formatted_group}"
+        )
     except Exception as e:
-        print(f"Error showing schedule: {e}")
-        import traceback
-        traceback.print_exc()
-        await safe_edit_message(
-            query,
-            "❌ Помилка при отриманні графіку. Спробуйте пізніше.",
-            reply_markup=get_main_keyboard(schedule_context is not None),
-            parse_mode=ParseMode.HTML
+        log.warning("Error sending timeline", error=e)
+        sent = None
+    if not sent:
+        await query.get_bot().send_message(
+            chat_id=user_id,
+            text="⚠️ Таймлайн наразі недоступний."
         )
 
 
@@ -436,6 +612,21 @@ async def show_settings_menu(query, user_id: int):
         [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
     ]
     
+    if BROADCAST_MODE == "channels":
+        private_status = "✅" if settings.get("private_notifications") else "❌"
+        text += (
+            f"\n\n📨 <b>Особисті сповіщення:</b> {private_status}\n"
+            "   Зміни графіку публікуються в каналі вашої групи.\n"
+            "   Увімкніть, щоб також отримувати їх особисто"
+        )
+        buttons[-2:-2] = [
+            [InlineKeyboardButton(
+                f"{'🔔' if settings.get('private_notifications') else '🔕'} Особисті сповіщення",
+                callback_data="toggle_private_notifications"
+            )],
+            [InlineKeyboardButton("📢 Канал моєї групи", callback_data="join_channel")]
+        ]
+    
     await safe_edit_message(
         query,
         text,
@@ -444,6 +635,34 @@ async def show_settings_menu(query, user_id: int):
     )
 
 
+async def show_group_channel(query, user_id: int):
+    """Надіслати посилання на канал групи користувача"""
+    schedule_context = await user_context_service.get_context(user_id)
+    if not schedule_context or not schedule_context.get("cherg_gpv"):
+        await query.get_bot().send_message(
+            chat_id=user_id,
+            text="❌ Спершу налаштуйте адресу або групу."
+        )
+        return
+    
+    formatted_group = await api_service.get_schedule_group(schedule_context["cherg_gpv"])
+    channel = (await db.get_group_channels()).get(formatted_group)
+    if not channel or not channel.get("invite_link"):
+        await query.get_bot().send_message(
+            chat_id=user_id,
+            text=f"ℹ️ Для групи {formatted_group} канал ще не створено."
+        )
+        return
+    
+    await query.get_bot().send_message(
+        chat_id=user_id,
+        text=f"📢 Канал з оновленнями графіку для групи {formatted_group}:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("Приєднатися", url=channel["invite_link"])]
+        ])
+    )
+
+
 async def toggle_notification_setting(query, user_id: int, setting_key: str):
     """Перемкнути налаштування сповіщення"""
     from firebase_service import firebase_service
@@ -462,6 +681,7 @@ async def toggle_notification_setting(query, user_id: int, setting_key: str):
     
     # Зберігаємо
     await firebase_service.save_notification_settings(user_id, settings)
+    await db.bump_signal(SIGNAL_SUBSCRIBERS)
     
     status = "увімкнено ✅" if settings[setting_key] else "вимкнено ❌"
     await query.answer(f"Сповіщення {status}")
@@ -564,6 +784,8 @@ async def reset_user_data(query, user_id: int):
         
         # Видаляємо з локальної БД
         await db.delete_all_user_data(user_id)
+        message_state.forget(user_id)
+        invalidate_schedule_card(user_id)
         
         await query.answer("✅ Дані успішно видалено!")
         
@@ -577,7 +799,7 @@ async def reset_user_data(query, user_id: int):
             parse_mode=ParseMode.HTML
         )
     except Exception as e:
-        print(f"Error resetting user data: {e}")
+        log.error("Error resetting user data", error=e)
         await query.answer("❌ Помилка при скиданні даних")
         await show_settings_menu(query, user_id)
 
@@ -706,6 +928,7 @@ async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         label = " ".join(args[1:]).strip() if len(args) > 1 else None
         save_result = await db.set_manual_group(user_id, group_code, label)
+        invalidate_schedule_card(user_id)
         if not save_result:
             await update.message.reply_text(
                 "❌ Не вдалося зберегти групу. Спробуйте ще раз.",
@@ -774,21 +997,196 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 
+def is_admin(user_id: int) -> bool:
+    """Чи є користувач адміністратором бота"""
+    return user_id in ADMIN_IDS
+
+
+def _format_group_arg(raw_value: str) -> Optional[str]:
+    group_code = normalize_group_code(raw_value)
+    if not group_code:
+        return None
+    return f"{group_code[0]}.{group_code[1]}" if len(group_code) == 2 else group_code
+
+
+async def channels_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /channels (адмін): список каналів груп"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    channels = await db.get_group_channels()
+    mode = "канали" if BROADCAST_MODE == "channels" else "особисті повідомлення"
+    text = f"📢 <b>Канали груп</b>\nРежим розсилки: {mode}\n\n"
+    if channels:
+        for group, channel in channels.items():
+            link = channel.get("invite_link") or "без посилання"
+            text += f"• {group} → <code>{channel['chat_id']}</code> ({link})\n"
+    else:
+        text += "Канали ще не налаштовано.\n"
+    text += (
+        "\n<code>/setchannel 4.1 -100123456789 [посилання]</code> - призначити канал\n"
+        "<code>/delchannel 4.1</code> - прибрати канал"
+    )
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+
+
+async def setchannel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /setchannel (адмін): призначити канал групі"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    args = context.args or []
+    group = _format_group_arg(args[0]) if args else None
+    if not group or len(args) < 2:
+        await update.message.reply_text(
+            "Використання: <code>/setchannel 4.1 -100123456789 [посилання]</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    try:
+        chat = await context.bot.get_chat(args[1])
+    except Exception as e:
+        await update.message.reply_text(f"❌ Канал недоступний для бота: {e}")
+        return
+    
+    invite_link = args[2] if len(args) > 2 else chat.invite_link
+    if not invite_link and chat.username:
+        invite_link = f"https://t.me/{chat.username}"
+    if not invite_link:
+        try:
+            invite_link = await context.bot.export_chat_invite_link(chat.id)
+        except Exception:
+            invite_link = None
+    
+    if await db.set_group_channel(group, chat.id, invite_link):
+        await update.message.reply_text(f"✅ Група {group} → {chat.title or chat.id}")
+    else:
+        await update.message.reply_text("❌ Не вдалося зберегти канал.")
+
+
+async def delchannel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /delchannel (адмін): прибрати канал групи"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    args = context.args or []
+    group = _format_group_arg(args[0]) if args else None
+    if not group:
+        await update.message.reply_text(
+            "Використання: <code>/delchannel 4.1</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    if await db.delete_group_channel(group):
+        await update.message.reply_text(f"✅ Канал групи {group} прибрано.")
+    else:
+        await update.message.reply_text(f"ℹ️ Для групи {group} канал не налаштовано.")
+
+
+async def traces_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /traces (адмін): останні траси циклів і кнопок"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    # /traces [N] [cycle|handler]
+    limit, kind = 5, None
+    for arg in context.args or []:
+        if arg.isdigit():
+            limit = max(1, int(arg))
+        elif arg in ("cycle", "handler"):
+            kind = arg
+    traces = tracer.recent(limit, kind)
+    if not traces:
+        note = ""
+        if NOTIFIER_MODE == "external" and kind != "handler":
+            note = "\nЦикл сповіщень працює в окремому процесі (NOTIFIER_MODE=external)."
+        await update.message.reply_text(f"Трас ще немає.{note}")
+        return
+    
+    text = "\n\n".join(trace.format() for trace in traces)
+    if len(text) < 3500:
+        await update.message.reply_text(f"<pre>{html.escape(text)}</pre>", parse_mode=ParseMode.HTML)
+    else:
+        await update.message.reply_document(
+            InputFile(text.encode("utf-8"), filename="traces.txt"),
+            caption=f"Останні траси: {len(traces)}"
+        )
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /profile (адмін): профіль наступного циклу сповіщень файлом"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    if NOTIFIER_MODE == "external":
+        await update.message.reply_text(
+            "Цикл сповіщень працює в окремому процесі (NOTIFIER_MODE=external) - "
+            "профілювання доступне лише для вбудованого режиму."
+        )
+        return
+    
+    from notifications import notification_service
+    if not notification_service or not notification_service.is_active:
+        await update.message.reply_text(
+            "Цей екземпляр у резерві і не виконує цикл сповіщень - "
+            "профілювання доступне лише на активному екземплярі."
+        )
+        return
+    
+    # /profile [cpu|memory] [N]
+    mode, top = "cpu", PROFILE_TOP
+    for arg in context.args or []:
+        if arg.isdigit():
+            top = max(1, int(arg))
+        elif arg in PROFILE_MODES:
+            mode = arg
+    pending = tracer.profile_pending
+    future = tracer.request_profile(mode, top)
+    if pending:
+        mode = pending[0]
+        await update.message.reply_text(f"Профілювання ({mode}) вже заплановано на наступний цикл.")
+    else:
+        await update.message.reply_text(f"⏱ Профілювання ({mode}) наступного циклу сповіщень увімкнено.")
+    asyncio.create_task(_deliver_profile(context.bot, update.effective_chat.id, future))
+
+
+async def baseline_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для команди /baseline (адмін): наступний цикл лише записує поточні графіки"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    # Сигнал через SQLite доходить і до окремого воркера сповіщень
+    await db.bump_signal(SIGNAL_BASELINE)
+    await update.message.reply_text(
+        "📌 Наступний цикл сповіщень запише поточні графіки всіх підписників як базові, "
+        "нічого не надсилаючи. Далі сповіщення йтимуть лише про нові зміни.\n"
+        "Використовуйте після відновлення БД з бекапу."
+    )
+
+
+async def _deliver_profile(bot, chat_id: int, future: asyncio.Future):
+    """Надіслати звіт профілювальника, коли цикл завершиться"""
+    try:
+        filename, report = await future
+        await bot.send_document(chat_id, InputFile(report, filename=filename),
+                                caption="Профіль циклу сповіщень")
+    except Exception as e:
+        log.warning("Failed to deliver profile", error=e)
+
+
 async def webapp_data_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler для даних з Web App"""
     import json
     
-    print(f"[WEBAPP] Received webapp data from user {update.effective_user.id}")
+    log.debug("Received webapp data", user_id=update.effective_user.id)
     
     try:
         raw_data = update.effective_message.web_app_data.data
-        print(f"[WEBAPP] Raw data: {raw_data}")
-        
         data = json.loads(raw_data)
         user_id = update.effective_user.id
         
-        print(f"[WEBAPP] Parsed data: {data}")
-        
         # Дані приходять в snake_case з WebApp
         city_id = data.get("city_id")
         city_name = data.get("city_name", "")
@@ -797,7 +1195,7 @@ async def webapp_data_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         building_name = data.get("building_name", "")
         cherg_gpv = data.get("cherg_gpv", "")
         
-        print(f"[WEBAPP] Saving address for user {user_id}: {city_name}, {street_name}, {building_name}, group: {cherg_gpv}")
+        log.debug("Saving webapp address", user_id=user_id, city_id=city_id, street_id=street_id, cherg_gpv=cherg_gpv)
         
         # Зберегти адресу
         success = await db.save_user_address(
@@ -812,8 +1210,8 @@ async def webapp_data_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             cherg_gpv=cherg_gpv
         )
         
-        print(f"[WEBAPP] Save result: {success}")
-        
+        log.info("Webapp address saved", user_id=user_id, success=success)
+        invalidate_schedule_card(user_id)
         if success:
             formatted_group = await api_service.get_schedule_group(cherg_gpv)
             
@@ -832,11 +1230,112 @@ async def webapp_data_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
                 parse_mode=ParseMode.HTML
             )
             
-    except Exception as e:
-        print(f"[WEBAPP] Error processing webapp data: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error processing webapp data", user_id=update.effective_user.id)
         await update.message.reply_text(
             "❌ Помилка при обробці даних. Спробуйте ще раз.",
             parse_mode=ParseMode.HTML
         )
+
+
+INLINE_DAY_TITLES = {"today": "сьогодні", "tomorrow": "завтра"}
+
+
+def _format_inline_schedule(formatted_group: str, cherg_gpv: str) -> Optional[str]:
+    """Текст графіку групи на сьогодні і завтра зі snapshot"""
+    blocks = []
+    for day, title in INLINE_DAY_TITLES.items():
+        parsed = snapshot_store.get_parsed(day, cherg_gpv)
+        if parsed is None:
+            continue
+        date = snapshot_store.get_day(day).get("date", "")
+        outages = parsed.get("outages", [])
+        if outages:
+            lines = "".join(f"   🔴 <b>{o['start']} - {o['end']}</b>\n" for o in outages)
+        else:
+            lines = "   🟢 <b>Відключень не заплановано</b>\n"
+        blocks.append(f"⏰ <b>Графік на {title} ({date}):</b>\n{lines}")
+    if not blocks:
+        return None
+    header = f"⚡ <b>Група ГПВ {formatted_group}</b>\n"
+    update_time = snapshot_store.get_day("today").get("updateTime")
+    footer = f"\n🕐 Станом на {update_time}" if update_time else ""
+    return header + "\n" + "\n".join(blocks) + footer
+
+
+def _short_outages(cherg_gpv: str, day: str = "today") -> str:
+    parsed = snapshot_store.get_parsed(day, cherg_gpv)
+    if parsed is None:
+        return "немає даних"
+    outages = parsed.get("outages", [])
+    if not outages:
+        return "без відключень"
+    return ", ".join(f"{o['start']}-{o['end']}" for o in outages)
+
+
+def build_inline_results(text: str) -> List[InlineQueryResultArticle]:
+    """Сформувати інлайн-результати лише з пам'яті (snapshot графіку).
+    
+    Відповідаємо лише на номер групи: адреси підписників не можна показувати
+    будь-кому, хто набере @bot вулиця.
+    """
+    global _inline_cache_version
+    
+    version = snapshot_store.version
+    if version != _inline_cache_version:
+        _inline_cache.clear()
+        _inline_cache_version = version
+    
+    key = " ".join(text.lower().split())[:INLINE_QUERY_MAX_LENGTH]
+    cached = _inline_cache.get(key)
+    if cached is not None:
+        _inline_cache.move_to_end(key)
+        return cached
+    
+    results: List[InlineQueryResultArticle] = []
+    group_code = normalize_group_code(key) if re.fullmatch(r"((група|group)\s*)?\d[.,]?\d", key) else None
+    
+    if group_code:
+        formatted_group = f"{group_code[0]}.{group_code[1]}" if len(group_code) == 2 else group_code
+        message = _format_inline_schedule(formatted_group, group_code)
+        if message:
+            results.append(InlineQueryResultArticle(
+                id=f"group:{group_code}:{snapshot_store.version[:8]}",
+                title=f"⚡ Група {formatted_group}",
+                description=f"Сьогодні: {_short_outages(group_code)}",
+                input_message_content=InputTextMessageContent(message, parse_mode=ParseMode.HTML)
+            ))
+    
+    _lru_put(_inline_cache, key, results, INLINE_RESULTS_CACHE_SIZE)
+    return results
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler для інлайн-запитів: @bot 4.1"""
+    inline_query = update.inline_query
+    text = (inline_query.query or "").strip()
+    
+    if snapshot_store.is_empty:
+        # Snapshot ще не завантажено - не блокуємо відповідь мережею
+        # (одночасні запити чекають одне оновлення, див. snapshot_store.refresh)
+        context.application.create_task(snapshot_store.refresh())
+    
+    results = build_inline_results(text) if text else []
+    button = None
+    if not results:
+        button = InlineQueryResultsButton(
+            text="Введіть номер групи, наприклад 4.1",
+            start_parameter="inline"
+        )
+    
+    try:
+        await inline_query.answer(
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=False,
+            button=button
+        )
+    except BadRequest as exc:
+        if "query is too old" in str(exc).lower():
+            return
+        raise
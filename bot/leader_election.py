@@ -0,0 +1,75 @@
+"""Leader lease: only one instance runs the notification loop"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Optional
+
+from database import db
+from config import WORKER_ID, LEASE_TTL
+from logs import get_logger
+
+log = get_logger(__name__)
+
+LEADER_LEASE_NAME = "notifier-leader"
+
+
+class LeaderLease:
+    """Оренда лідера в SQLite з терміном дії.
+
+    Лідер продовжує оренду кожні ttl/3 секунд, резервні екземпляри з тією ж
+    частотою пробують її захопити. Якщо лідер зупинився коректно, оренда
+    звільняється одразу; якщо впав - не пізніше ніж через ttl.
+    """
+
+    def __init__(self, name: str = LEADER_LEASE_NAME, owner: str = WORKER_ID,
+                 ttl: float = LEASE_TTL) -> None:
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        # monotonic-час, до якого оренда гарантовано наша
+        self._valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._valid_until > time.monotonic()
+
+    async def try_acquire(self) -> bool:
+        """Захопити або продовжити оренду"""
+        was_leader = self.is_leader
+        started = time.monotonic()
+        try:
+            acquired = await db.acquire_lease(self.name, self.owner, self.ttl)
+        except Exception as e:
+            log.error("Lease renewal failed", error=e)
+            acquired = False
+        if acquired:
+            self._valid_until = started + self.ttl
+        elif not self.is_leader:
+            self._valid_until = 0.0
+        if self.is_leader != was_leader:
+            state = "acquired" if self.is_leader else "lost"
+            log.info("Leadership changed", state=state, owner=self.owner)
+        return self.is_leader
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            # Звільняємо одразу, щоб резервний екземпляр не чекав ttl
+            await db.release_lease(self.name, self.owner)
+        self._valid_until = 0.0
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.try_acquire()
+            except asyncio.CancelledError:
+                break
+            await asyncio.sleep(self.ttl / 3)
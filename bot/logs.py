@@ -0,0 +1,171 @@
+"""Non-blocking key=value logging with per-call-site rate limiting
+
+Записи кладуться в чергу (QueueHandler), а в stdout їх пише окремий потік
+(QueueListener) - виклик логера не чекає на I/O. Кожен рядок має вигляд
+
+    ts=2025-12-01T19:29:03 level=info logger=notifications msg="Cycle finished" users=120
+
+Кожне місце виклику (файл:рядок) пишеться не частіше LOG_RATE_LIMIT разів
+за LOG_RATE_WINDOW секунд; про пропущені записи повідомляє поле suppressed
+наступного запису з того ж місця. Гарячі шляхи (по запису на користувача)
+передають sample=LOG_SAMPLE_RATE і пишуть лише частку викликів.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+from config import LOG_LEVEL, DEBUG_MODE, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+
+# Бібліотеки пишуть лише попередження
+QUIET_LOGGERS = ("httpx", "httpcore", "telegram", "aiohttp", "apscheduler")
+
+_listener: Optional[QueueListener] = None
+
+
+def _format_value(value: Any) -> str:
+    text = str(value)
+    if not text or any(char in text for char in ' ="\n'):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """ts=... level=... logger=... msg="..." key=value ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            f"ts={time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))}",
+            f"level={record.levelname.lower()}",
+            f"logger={record.name}",
+            f"msg={_format_value(record.getMessage())}",
+        ]
+        for key, value in getattr(record, "fields", {}).items():
+            parts.append(f"{key}={_format_value(value)}")
+        line = " ".join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Не більше `limit` записів з одного місця виклику за `window` секунд"""
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW) -> None:
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # {(файл, рядок): [початок вікна, записано, пропущено]}
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get((record.pathname, record.lineno))
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[(record.pathname, record.lineno)] = [now, 1, 0]
+                if suppressed:
+                    record.fields = {**getattr(record, "fields", {}), "suppressed": suppressed}
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Текст повідомлення і traceback формуються тут, у потоці виклику;
+        # поле fields лишається на записі для форматера в потоці-писачі
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: Optional[str] = None) -> None:
+    """Налаштувати кореневий логер (один раз на процес)"""
+    global _listener
+    if _listener is not None:
+        return
+    level_name = "DEBUG" if DEBUG_MODE else (level or LOG_LEVEL)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(KeyValueFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(getattr(logging, level_name.upper(), logging.WARNING))
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Дописати чергу і зупинити потік-писач"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class Logger:
+    """Обгортка над logging.Logger з полями key=value:
+
+        log.info("Cycle finished", users=120, elapsed=3.2)
+        log.debug("Fetching user", user_id=user_id, sample=LOG_SAMPLE_RATE)
+    """
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str) -> None:
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level: int, msg: str, fields: Dict[str, Any],
+             sample: Optional[float], exc_info: bool = False) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None and random.random() >= sample:
+            return
+        # stacklevel=3: місце виклику log.info(...), а не ця обгортка
+        self._logger.log(level, msg, exc_info=exc_info, stacklevel=3, extra={"fields": fields})
+
+    def debug(self, msg: str, *, sample: Optional[float] = None, **fields: Any) -> None:
+        self._log(logging.DEBUG, msg, fields, sample)
+
+    def info(self, msg: str, *, sample: Optional[float] = None, **fields: Any) -> None:
+        self._log(logging.INFO, msg, fields, sample)
+
+    def warning(self, msg: str, *, sample: Optional[float] = None, **fields: Any) -> None:
+        self._log(logging.WARNING, msg, fields, sample)
+
+    def error(self, msg: str, *, sample: Optional[float] = None, **fields: Any) -> None:
+        self._log(logging.ERROR, msg, fields, sample)
+
+    def exception(self, msg: str, **fields: Any) -> None:
+        self._log(logging.ERROR, msg, fields, None, exc_info=True)
+
+
+def get_logger(name: str) -> Logger:
+    return Logger(name)
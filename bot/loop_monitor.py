@@ -0,0 +1,212 @@
+"""Event-loop lag monitor, blocking-call detector and optional uvloop"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from typing import Callable, Dict, Optional
+
+from config import LOOP_LAG_INTERVAL, LOOP_BLOCK_THRESHOLD, USE_UVLOOP
+from metrics import LOOP_LAG, LOOP_BLOCKS
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Скільки різних стеків показувати для одного блокування
+TOP_STACKS = 3
+STACK_DEPTH = 12
+
+
+class LoopMonitor:
+    """Міряє затримку event loop і ловить довгі блокування.
+
+    Корутина-зонд прокидається кожні `interval` секунд: запізнення
+    пробудження - це lag (гістограма bot_event_loop_lag_seconds). Окремий
+    потік-сторож стежить за серцебиттям зонда; якщо цикл не відповідає
+    довше за `threshold`, він періодично знімає стек потоку циклу і після
+    розблокування логує найчастіші стеки - там і сидить блокуючий виклик.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL,
+                 threshold: float = LOOP_BLOCK_THRESHOLD) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.blocks = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _probe(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def _sample_stack(self) -> Optional[str]:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame, limit=STACK_DEPTH))
+
+    def _watch(self) -> None:
+        """Потік-сторож: знімає стеки, поки цикл заблокований"""
+        # Зонд спить interval - серцебиття пропущене лише після interval + threshold
+        limit = self.interval + self.threshold
+        tick = max(self.threshold / 3, 0.01)
+        while not self._stopped.wait(tick):
+            if time.monotonic() - self._heartbeat < limit:
+                continue
+            if self._task is None or self._task.done():
+                # Зонд зупинено разом з циклом - це не блокування
+                return
+            samples: StackCounter = StackCounter()
+            blocked_since = self._heartbeat
+            while not self._stopped.is_set() and self._heartbeat == blocked_since:
+                stack = self._sample_stack()
+                if stack:
+                    samples[stack] += 1
+                time.sleep(tick)
+            self._report(time.monotonic() - blocked_since - self.interval, samples)
+
+    def _report(self, blocked: float, samples: StackCounter) -> None:
+        self.blocks += 1
+        LOOP_BLOCKS.inc()
+        total = sum(samples.values())
+        stacks = [
+            f"--- {count}/{total} samples:\n{stack.rstrip()}"
+            for stack, count in samples.most_common(TOP_STACKS)
+        ]
+        log.warning("Event loop blocked", blocked=f"{blocked:.2f}s", samples=total,
+                    stacks="\n".join(stacks))
+
+    def stats(self) -> Dict:
+        return {"max_lag": round(self.max_lag, 4), "blocks": self.blocks}
+
+
+def install_uvloop(enabled: bool = USE_UVLOOP) -> bool:
+    """Увімкнути uvloop для нових event loop (до asyncio.run / run_polling)"""
+    if not enabled:
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        log.warning("USE_UVLOOP=true, but uvloop is not installed - using the default loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    log.info("Using uvloop")
+    return True
+
+
+loop_monitor = LoopMonitor()
+
+
+async def _bench_call_soon(count: int) -> None:
+    """Черга колбеків: call_soon ланцюжком"""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    remaining = [count]
+
+    def step() -> None:
+        remaining[0] -= 1
+        if remaining[0]:
+            loop.call_soon(step)
+        else:
+            done.set_result(None)
+
+    loop.call_soon(step)
+    await done
+
+
+async def _bench_tasks(count: int) -> None:
+    """Створення і завершення задач (як конвеєр сповіщень)"""
+    async def job() -> None:
+        await asyncio.sleep(0)
+
+    for _ in range(count // 1000):
+        await asyncio.gather(*(job() for _ in range(1000)))
+
+
+async def _bench_http(count: int) -> None:
+    """HTTP-запити aiohttp до локального сервера (як звернення до LOE/Firebase)"""
+    import aiohttp
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    semaphore = asyncio.Semaphore(32)
+    try:
+        async with aiohttp.ClientSession() as session:
+            async def fetch() -> None:
+                async with semaphore:
+                    async with session.get(f"http://127.0.0.1:{port}/") as resp:
+                        await resp.json()
+
+            await asyncio.gather(*(fetch() for _ in range(count)))
+    finally:
+        await runner.cleanup()
+
+
+BENCHMARKS: Dict[str, tuple] = {
+    "call_soon": (_bench_call_soon, 1_000_000),
+    "tasks": (_bench_tasks, 200_000),
+    "http": (_bench_http, 5_000),
+}
+
+
+def _run_benchmarks(loop_factory: Callable[[], asyncio.AbstractEventLoop]) -> Dict[str, float]:
+    results = {}
+    for name, (bench, count) in BENCHMARKS.items():
+        loop = loop_factory()
+        try:
+            started = time.perf_counter()
+            loop.run_until_complete(bench(count))
+            results[name] = round(count / (time.perf_counter() - started))
+        finally:
+            loop.close()
+    return results
+
+
+if __name__ == "__main__":
+    # Порівняння стандартного циклу з uvloop (операцій за секунду):
+    #   python loop_monitor.py
+    print(f"asyncio: {_run_benchmarks(asyncio.new_event_loop)}")
+    try:
+        import uvloop
+    except ImportError:
+        print("uvloop: not installed (pip install uvloop)")
+    else:
+        print(f"uvloop:  {_run_benchmarks(uvloop.new_event_loop)}")
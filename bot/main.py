@@ -3,64 +3,99 @@
 Main entry point
 """
 import asyncio
-import logging
-import sys
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters
 )
 
-from config import BOT_TOKEN, LOG_LEVEL, DEBUG_MODE
-from database import db
+from config import BOT_TOKEN, NOTIFIER_MODE, METRICS_HOST, METRICS_PORT, STATE_PATH
+from database import db, SIGNAL_SNAPSHOT
 from handlers import (
     start_command,
     callback_handler,
     schedule_command,
     notifications_command,
     help_command,
-    webapp_data_handler
+    webapp_data_handler,
+    inline_query_handler,
+    channels_command,
+    setchannel_command,
+    delchannel_command,
+    traces_command,
+    profile_command,
+    baseline_command
 )
 from notifications import NotificationService
 from api_service import api_service
 from firebase_service import firebase_service
+from timeline_renderer import timeline_service
+from schedule_snapshot import snapshot_store
+from change_signals import ChangeSignalWatcher
+from metrics import InstrumentedHTTPXRequest, MetricsServer
+from loop_monitor import loop_monitor, install_uvloop
+from logs import get_logger, setup_logging, shutdown_logging
+from warm_state import WarmStateStore
 
-# Configure logging - мінімізуємо для економії квоти
-log_level = getattr(logging, LOG_LEVEL.upper(), logging.WARNING)
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=log_level,
-    stream=sys.stdout
-)
-# Вимикаємо логування від бібліотек
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.getLogger("telegram").setLevel(logging.WARNING)
-logging.getLogger("aiohttp").setLevel(logging.WARNING)
-logger = logging.getLogger(__name__)
+log = get_logger(__name__)
 
-# Перевизначаємо print на пустую функцію в продакшені
-if not DEBUG_MODE:
-    import builtins
-    _original_print = builtins.print
-    def silent_print(*args, **kwargs):
-        pass  # Нічого не виводимо
-    builtins.print = silent_print
+# Спостерігач за snapshot від зовнішнього воркера (NOTIFIER_MODE=external)
+snapshot_watcher = None
+metrics_server = None
+# Гарячий стан для швидкого рестарту (data/state.json)
+warm_state = None
 
 
 async def post_init(application: Application):
     """Post initialization hook"""
     # Initialize database
     await db.init_db()
+    db.start_write_behind()
+    loop_monitor.start()
     
-    # Start notification service
-    from notifications import notification_service
+    global warm_state
+    warm_state = WarmStateStore(STATE_PATH)
+    await warm_state.load()
+    warm_state.register("snapshot", snapshot_store.export_state, snapshot_store.restore_state)
+    
+    if METRICS_PORT:
+        global metrics_server
+        metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            log.error("Failed to start metrics server", error=e)
+            metrics_server = None
+    
+    # Notification service (send_schedule_to_user потрібен обробникам завжди)
     import notifications
     notifications.notification_service = NotificationService(application.bot)
     
-    # Run notification service in background
-    asyncio.create_task(notifications.notification_service.start())
+    if NOTIFIER_MODE == "external":
+        # Цикл сповіщень працює в окремому процесі (notifier.py);
+        # snapshot для інлайн-режиму приходить через SQLite
+        global snapshot_watcher
+        snapshot_watcher = ChangeSignalWatcher(SIGNAL_SNAPSHOT, _load_shared_snapshot)
+        snapshot_watcher.start()
+    else:
+        warm_state.register(
+            "notifications",
+            notifications.notification_service.export_state,
+            notifications.notification_service.restore_state,
+        )
+        # Run notification service in background
+        asyncio.create_task(notifications.notification_service.start())
+    warm_state.start()
+
+
+async def _load_shared_snapshot():
+    """Підхопити snapshot, опублікований воркером сповіщень"""
+    payload = await db.get_signal_payload(SIGNAL_SNAPSHOT)
+    if payload:
+        snapshot_store.load(payload)
 
 
 async def shutdown(application: Application):
@@ -68,22 +103,37 @@ async def shutdown(application: Application):
     from notifications import notification_service
     if notification_service:
         await notification_service.stop()
+    if snapshot_watcher:
+        snapshot_watcher.stop()
+    loop_monitor.stop()
+    if warm_state:
+        await warm_state.stop()
     
+    await db.close()
+    if metrics_server:
+        await metrics_server.stop()
     await api_service.close()
+    timeline_service.close()
     await firebase_service.close()
-    logger.info("Bot shutdown complete")
+    log.info("Bot shutdown complete")
 
 
 def main():
     """Main function to run the bot"""
+    setup_logging()
     if not BOT_TOKEN:
-        logger.error("BOT_TOKEN is not set! Please set it in .env file")
+        log.error("BOT_TOKEN is not set! Please set it in .env file")
         return
     
+    # USE_UVLOOP=true - до створення event loop
+    install_uvloop()
+    
     # Build application
     application = (
         Application.builder()
         .token(BOT_TOKEN)
+        # Затримка і помилки викликів Bot API потрапляють у метрики
+        .request(InstrumentedHTTPXRequest(connection_pool_size=256))
         .post_init(post_init)
         .post_shutdown(shutdown)
         .build()
@@ -95,17 +145,31 @@ def main():
     application.add_handler(CommandHandler("notifications", notifications_command))
     application.add_handler(CommandHandler("help", help_command))
     
+    # Адмін-команди
+    application.add_handler(CommandHandler("channels", channels_command))
+    application.add_handler(CommandHandler("setchannel", setchannel_command))
+    application.add_handler(CommandHandler("delchannel", delchannel_command))
+    application.add_handler(CommandHandler("traces", traces_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("baseline", baseline_command))
+    
     # Callback handler for inline buttons
     application.add_handler(CallbackQueryHandler(callback_handler))
     
+    # Inline mode (@bot 4.1 або @bot вулиця)
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    
     # Web App data handler
     application.add_handler(
         MessageHandler(filters.StatusUpdate.WEB_APP_DATA, webapp_data_handler)
     )
     
     # Run bot
-    logger.info("Starting bot...")
-    application.run_polling(allowed_updates=["message", "callback_query", "web_app_data"])
+    log.info("Starting bot...")
+    try:
+        application.run_polling(allowed_updates=["message", "callback_query", "inline_query", "web_app_data"])
+    finally:
+        shutdown_logging()
 
 
 if __name__ == "__main__":
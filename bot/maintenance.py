@@ -0,0 +1,112 @@
+"""Background retention and compaction of the SQLite state tables"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from database import db
+from config import RETENTION_DAYS, MAINTENANCE_INTERVAL, MAINTENANCE_BATCH_SIZE
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# (таблиця, колонка з часом, додаткова умова)
+RETENTION_POLICIES = (
+    ("user_schedule_hashes", "created_at", ""),
+    ("sent_notifications", "created_at", ""),
+    ("notification_outbox", "created_at", ""),
+    ("schedule_cache", "last_check", ""),
+    ("group_schedule_hashes", "updated_at", ""),
+    # Таймлайни прив'язані до версії графіку - старі file_id вже не знадобляться
+    ("telegram_file_cache", "created_at", "AND url LIKE 'timeline://%'"),
+)
+# Скільки сторінок звільняти за один прохід incremental_vacuum
+VACUUM_PAGES = 2000
+# Пауза між пакетами, щоб не тримати БД зайнятою
+BATCH_PAUSE = 0.05  # seconds
+
+
+class MaintenanceService:
+    """Періодично видаляє застарілі рядки пакетами і ущільнює файл БД.
+
+    Історія графіків (schedule_history) не очищується - з неї вчиться
+    PollScheduler, а вміст зберігається стиснутим і без дублікатів.
+    """
+
+    def __init__(self, should_run: Optional[Callable[[], bool]] = None,
+                 retention_days: int = RETENTION_DAYS,
+                 batch_size: int = MAINTENANCE_BATCH_SIZE) -> None:
+        # Щоб на кількох екземплярах очищення виконував лише один
+        self.should_run = should_run or (lambda: True)
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.last_report: Dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        # Не заважаємо першому циклу сповіщень після старту
+        await asyncio.sleep(60)
+        while True:
+            try:
+                if self.should_run():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.error("Maintenance failed", error=e)
+            await asyncio.sleep(MAINTENANCE_INTERVAL * 3600)
+
+    async def _purge(self, table: str, column: str, where: str) -> int:
+        deleted = 0
+        while True:
+            count = await db.delete_expired_batch(
+                table, column, self.retention_days, self.batch_size, where
+            )
+            deleted += count
+            if count < self.batch_size:
+                return deleted
+            await asyncio.sleep(BATCH_PAUSE)
+
+    async def run_once(self) -> Dict:
+        """Один прохід: очищення, ущільнення, звіт про розміри таблиць"""
+        started = time.monotonic()
+        deleted = {}
+        for table, column, where in RETENTION_POLICIES:
+            deleted[table] = await self._purge(table, column, where)
+        deleted["schedule_blobs"] = await db.delete_orphan_blobs()
+        compaction = await db.compact(VACUUM_PAGES)
+        sizes = await db.get_table_sizes()
+
+        self.last_report = {
+            "deleted": {table: count for table, count in deleted.items() if count},
+            "compaction": compaction,
+            "tables": sizes,
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+        log.info("Maintenance finished", report=self.last_report)
+        return self.last_report
+
+
+if __name__ == "__main__":
+    # Одноразовий перехід БД, створеної без інкрементального auto_vacuum
+    # (повний VACUUM; виконувати при зупиненому боті і воркерах):
+    #   python maintenance.py vacuum
+    import sys
+
+    from logs import setup_logging
+
+    if sys.argv[1:] != ["vacuum"]:
+        sys.exit("usage: python maintenance.py vacuum")
+    setup_logging("INFO")
+    switched = asyncio.run(db.enable_incremental_vacuum())
+    print("switched to incremental auto_vacuum" if switched else "incremental auto_vacuum is already on")
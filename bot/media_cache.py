@@ -0,0 +1,120 @@
+"""Telegram file_id cache for schedule images"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Dict, Tuple
+
+from telegram import Bot, Message
+from telegram.error import BadRequest
+
+from api_service import api_service
+from database import db
+from config import MEDIA_CACHE_TTL
+
+
+def _expires(url: str) -> bool:
+    """Чи може вміст за ключем змінитися (http-URL); інші ключі - це вже хеш вмісту"""
+    return url.startswith(("http://", "https://"))
+
+
+class TelegramMediaCache:
+    """Надсилає зображення так, щоб кожне завантажувалось у Telegram лише раз.
+
+    Перше надсилання завантажує файл і зберігає отриманий file_id за URL та
+    хешем вмісту в SQLite. Наступні надсилання (у т.ч. сповіщення) беруть
+    file_id. Запис за http-URL живе MEDIA_CACHE_TTL секунд: потім файл
+    завантажується знову, і якщо хеш вмісту той самий - file_id
+    використовується далі, а якщо LOE замінила зображення - воно
+    завантажується в Telegram заново.
+    """
+
+    def __init__(self, ttl: float = MEDIA_CACHE_TTL) -> None:
+        self.ttl = ttl
+        # {url: (file_id, момент time.monotonic(), до якого запис актуальний)}
+        self._memory: Dict[str, Tuple[str, float]] = {}
+        # {url: [lock, скільки запитів його тримають або чекають]}
+        self._locks: Dict[str, list] = {}
+
+    def _remember(self, url: str, file_id: str, age: float = 0.0) -> None:
+        expires_at = time.monotonic() + self.ttl - age if _expires(url) else float("inf")
+        self._memory[url] = (file_id, expires_at)
+
+    async def get_file_id(self, url: str) -> Optional[str]:
+        cached = self._memory.get(url)
+        if cached:
+            if time.monotonic() < cached[1]:
+                return cached[0]
+            del self._memory[url]
+            return None
+        cached = await db.get_cached_file(url)
+        if cached and (not _expires(url) or cached["age"] < self.ttl):
+            self._remember(url, cached["file_id"], cached["age"])
+            return cached["file_id"]
+        return None
+
+    async def _forget(self, url: str, file_id: str) -> None:
+        self._memory.pop(url, None)
+        await db.delete_cached_file(file_id)
+
+    @asynccontextmanager
+    async def _upload_lock(self, url: str) -> AsyncIterator[None]:
+        """Паралельні запити на той самий URL чекають одне завантаження.
+
+        Lock живе, поки його хтось тримає або чекає, і видаляється після.
+        """
+        entry = self._locks.get(url)
+        if entry is None:
+            entry = self._locks[url] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[url]
+
+    async def send_photo(self, bot: Bot, chat_id: int, url: str,
+                         content: Optional[bytes] = None, **kwargs) -> Optional[Message]:
+        """Надіслати фото за URL (або готові байти з ключем url) через кеш file_id"""
+        file_id = await self.get_file_id(url)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+            except BadRequest as exc:
+                if "file" not in str(exc).lower():
+                    raise
+                # file_id став недійсним - завантажимо заново
+                await self._forget(url, file_id)
+
+        async with self._upload_lock(url):
+            file_id = await self.get_file_id(url)
+            if file_id:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+
+            if content is None:
+                content = await api_service.fetch_bytes(url)
+                if not content:
+                    return None
+            content_hash = hashlib.sha256(content).hexdigest()
+
+            # Той самий вміст міг бути завантажений під іншим URL (або це
+            # перевірка застарілого запису, а файл не змінився)
+            file_id = await db.get_cached_file_by_hash(content_hash)
+            if file_id:
+                await db.save_cached_file(url, content_hash, file_id)
+                self._remember(url, file_id)
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+
+            message = await bot.send_photo(chat_id=chat_id, photo=content, **kwargs)
+            if message.photo:
+                file_id = message.photo[-1].file_id
+                await db.save_cached_file(url, content_hash, file_id)
+                self._remember(url, file_id)
+            return message
+
+
+media_cache = TelegramMediaCache()
@@ -0,0 +1,76 @@
+"""In-memory map of the last schedule message in each chat, backed by SQLite"""
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from database import db
+from config import MESSAGE_STATE_CACHE_SIZE, NOTIFIER_MODE
+
+# (message_id, schedule_date, content_hash) або None - повідомлень ще не було
+MessageEntry = Optional[Tuple[int, Optional[str], Optional[str]]]
+
+
+def content_hash(text: str) -> str:
+    """Короткий хеш тексту повідомлення"""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:16]
+
+
+class MessageStateCache:
+    """Останнє повідомлення з графіком у кожному чаті: id, дата і хеш тексту.
+
+    Пам'ять (LRU на MESSAGE_STATE_CACHE_SIZE чатів) перед таблицею
+    user_last_schedule_message: розсилка не читає SQLite для кожного
+    користувача, а незмінний текст не редагується і не надсилається вдруге.
+    Пам'ять використовується лише тоді, коли цикл сповіщень працює в процесі
+    бота (NOTIFIER_MODE=embedded). В режимі external повідомлення пишуть і бот
+    (/schedule), і воркер, тож кожне читання йде в SQLite.
+    """
+
+    def __init__(self, size: int = MESSAGE_STATE_CACHE_SIZE,
+                 enabled: bool = NOTIFIER_MODE == "embedded") -> None:
+        self.size = size
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, MessageEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, user_id: int) -> Optional[Dict]:
+        """{'message_id', 'schedule_date', 'content_hash'} або None"""
+        if not self.enabled:
+            return await db.get_user_last_message(user_id)
+        if user_id in self._entries:
+            self._entries.move_to_end(user_id)
+            entry = self._entries[user_id]
+        else:
+            row = await db.get_user_last_message(user_id)
+            entry = (row["message_id"], row["schedule_date"], row["content_hash"]) if row else None
+            # Поки читали БД, запис могло оновити надсилання - він новіший
+            if user_id not in self._entries:
+                self._put(user_id, entry)
+        if entry is None:
+            return None
+        return {"message_id": entry[0], "schedule_date": entry[1], "content_hash": entry[2]}
+
+    async def remember(self, user_id: int, message_id: int, schedule_date: Optional[str],
+                       text: str) -> None:
+        """Запам'ятати надіслане/відредаговане повідомлення"""
+        digest = content_hash(text)
+        self._put(user_id, (message_id, schedule_date, digest))
+        await db.save_user_last_message(user_id, message_id, schedule_date, digest)
+
+    def forget(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def _put(self, user_id: int, entry: MessageEntry) -> None:
+        if not self.enabled:
+            return
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+message_state = MessageStateCache()
@@ -0,0 +1,266 @@
+"""In-process metrics exposed in Prometheus text format"""
+from __future__ import annotations
+
+import bisect
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+from telegram.request import HTTPXRequest
+
+from tracing import tracer
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Межі гістограм затримок зовнішніх запитів, секунди
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+LOOP_LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Сегменти шляху з цифрами (id, імена файлів) замінюються на {id}
+_ID_SEGMENT = re.compile(r"\d")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [лічильники по бакетах..., +Inf]}, сума, кількість
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts[key]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {round(self._sums[key], 6)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+EXTERNAL_LATENCY = Histogram(
+    "bot_external_request_seconds",
+    "Latency of requests to external services (LOE API, Firebase, Telegram)",
+    ("service", "endpoint"),
+)
+EXTERNAL_ERRORS = Counter(
+    "bot_external_request_errors_total",
+    "Failed requests to external services by HTTP status or exception",
+    ("service", "endpoint", "reason"),
+)
+NOTIFY_CYCLE_SECONDS = Histogram(
+    "bot_notify_cycle_seconds", "Duration of a notification cycle", buckets=CYCLE_BUCKETS
+)
+NOTIFY_USERS_SCANNED = Counter(
+    "bot_notify_users_scanned_total", "Subscribers checked by notification cycles"
+)
+NOTIFY_USERS_NOTIFIED = Counter(
+    "bot_notify_users_notified_total", "Notifications delivered to users"
+)
+NOTIFY_UNCHANGED = Counter(
+    "bot_notify_unchanged_total", "Notifications skipped because the chat already shows the same text"
+)
+NOTIFY_DELIVERY_ERRORS = Counter(
+    "bot_notify_delivery_errors_total",
+    "Failed notification sends by reason (blocked, deactivated, chat_not_found, transient, other)",
+    ("reason",),
+)
+SUBSCRIBERS_PRUNED = Counter(
+    "bot_subscribers_pruned_total", "Unreachable subscribers whose notifications were disabled",
+    ("reason",),
+)
+QUEUE_DEPTH = Gauge(
+    "bot_queue_depth", "Items waiting in internal queues", ("queue",)
+)
+LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds", "Delay of a scheduled wakeup on the asyncio loop",
+    buckets=LOOP_LAG_BUCKETS
+)
+LOOP_BLOCKS = Counter(
+    "bot_event_loop_blocks_total", "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD"
+)
+
+
+def render() -> str:
+    """Усі метрики у текстовому форматі Prometheus"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def normalize_endpoint(url: str) -> str:
+    """Шлях без query і з {id} замість числових сегментів (обмежує кількість міток)"""
+    segments = [
+        "{id}" if _ID_SEGMENT.search(segment) else segment
+        for segment in urlsplit(str(url)).path.split("/") if segment
+    ]
+    return "/" + "/".join(segments)
+
+
+def http_trace_config(service: str) -> aiohttp.TraceConfig:
+    """TraceConfig для aiohttp-сесії: затримка і помилки кожного запиту"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_start(session, context, params) -> None:
+        context.started = time.perf_counter()
+
+    async def on_end(session, context, params) -> None:
+        endpoint = normalize_endpoint(params.url)
+        elapsed = time.perf_counter() - context.started
+        EXTERNAL_LATENCY.observe(elapsed, service=service, endpoint=endpoint)
+        tracer.record(f"http.{service} {endpoint}", elapsed)
+        if params.response.status >= 400:
+            EXTERNAL_ERRORS.inc(service=service, endpoint=endpoint,
+                                reason=str(params.response.status))
+
+    async def on_exception(session, context, params) -> None:
+        endpoint = normalize_endpoint(params.url)
+        elapsed = time.perf_counter() - context.started
+        EXTERNAL_LATENCY.observe(elapsed, service=service, endpoint=endpoint)
+        tracer.record(f"http.{service} {endpoint}", elapsed)
+        EXTERNAL_ERRORS.inc(service=service, endpoint=endpoint,
+                            reason=type(params.exception).__name__)
+
+    trace_config.on_request_start.append(on_start)
+    trace_config.on_request_end.append(on_end)
+    trace_config.on_request_exception.append(on_exception)
+    return trace_config
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, що рахує затримку і помилки кожного методу Bot API"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            EXTERNAL_ERRORS.inc(service="telegram", endpoint=endpoint, reason=type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            EXTERNAL_LATENCY.observe(elapsed, service="telegram", endpoint=endpoint)
+            tracer.record(f"http.telegram {endpoint}", elapsed)
+        if code >= 400:
+            EXTERNAL_ERRORS.inc(service="telegram", endpoint=endpoint, reason=str(code))
+        return code, payload
+
+
+class MetricsServer:
+    """Локальний HTTP-ендпоінт /metrics (вмикається через METRICS_PORT)"""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info("Serving metrics", url=f"http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
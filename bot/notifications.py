@@ -3,17 +3,52 @@ Notification service for checking and sending schedule updates
 """
 import asyncio
 import hashlib
+import time
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set
 from telegram import Bot
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter, TelegramError
 
 from api_service import api_service
 from database import db
 from firebase_service import firebase_service
 from user_context_service import user_context_service
-from config import CHECK_INTERVAL
+from schedule_snapshot import snapshot_store
+from media_cache import media_cache
+from message_state import message_state, content_hash
+from pipeline import Pipeline, PipelineStage
+from change_signals import ChangeSignalWatcher
+from sharding import ShardCoordinator
+from leader_election import LeaderLease
+from poll_scheduler import PollScheduler, parse_update_time
+from maintenance import MaintenanceService
+from unreachable import unreachable_pruner, classify_delivery_error, PERMANENT_REASONS
+from metrics import (
+    NOTIFY_CYCLE_SECONDS, NOTIFY_USERS_SCANNED, NOTIFY_USERS_NOTIFIED, NOTIFY_UNCHANGED,
+    NOTIFY_DELIVERY_ERRORS,
+)
+from tracing import tracer
+from database import SIGNAL_SUBSCRIBERS, SIGNAL_SNAPSHOT, SIGNAL_BASELINE
+from config import (
+    CHECK_INTERVAL,
+    NOTIFY_WITH_IMAGE,
+    BROADCAST_MODE,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_AUDIENCE_CONCURRENCY,
+    PIPELINE_RENDER_CONCURRENCY,
+    PIPELINE_SEND_CONCURRENCY,
+    NOTIFY_SEND_DELAY,
+    SIGNAL_MIN_CYCLE_GAP,
+    OUTBOX_MAX_AGE,
+    NOTIFY_BASELINE,
+    LEASE_TTL,
+)
+from logs import get_logger
+
+log = get_logger(__name__)
+
+DAY_PERIODS = (("today", "сьогодні"), ("tomorrow", "завтра"))
 
 
 class NotificationService:
@@ -23,8 +58,36 @@ class NotificationService:
         self.bot = bot
         self.running = False
         self._tasks = []
-        # Кеш: {date: {group_code: outages_hash}}
+        self._wake: Optional[asyncio.Event] = None
+        self._subscribers_watcher: Optional[ChangeSignalWatcher] = None
+        self._baseline_watcher: Optional[ChangeSignalWatcher] = None
+        # Наступний цикл - базовий: хеші записуються, повідомлення не надсилаються
+        self._baseline_pending = False
+        # Розподіл користувачів між воркерами (при NOTIFIER_SHARDS > 1)
+        self.shards = ShardCoordinator()
+        # Без шардування цикл виконує лише один екземпляр - власник оренди
+        self.leader = LeaderLease()
+        self._snapshot_signal: Optional[int] = None
+        # Пауза між перевірками залежить від історії публікацій
+        self.poller = PollScheduler()
+        # Очищення старих рядків - лише на екземплярі, що виконує цикл
+        self.maintenance = MaintenanceService(
+            should_run=lambda: self.is_active and self.shards.owns_shard(0)
+        )
+        # Повний цикл (з Firebase) - при зміні графіку/підписників або раз на CHECK_INTERVAL
+        self._audience_dirty = True
+        self._last_full_cycle: Optional[float] = None
+        # Кеш: {date: {group_code: "outages_hash:audience_hash"}}
         self._schedule_cache: Dict[str, Dict[str, str]] = {}
+        # Копія кешу після завершеного циклу - лише її зберігає гарячий стан
+        # (відбитки перерваного циклу могли не дійти до outbox)
+        self._committed_cache: Dict[str, Dict[str, str]] = {}
+        # Посилання на зображення графіку: {day: (snapshot_version, image)}
+        self._image_info: Dict[str, tuple] = {}
+        # Статистика останнього циклу (по стадіях конвеєра)
+        self.last_cycle_stats: Dict = {}
+        # Підписники з останнього списку Firebase: лише їм відписка пишеться й у Firebase
+        self._firebase_user_ids: Set[int] = set()
 
     def _format_location_block(self, context: Dict, formatted_group: str) -> str:
         """Згенерувати блок з описом адреси/групи"""
@@ -42,6 +105,17 @@ class NotificationService:
             f"🔌 <b>Ваша група ГПВ:</b> {formatted_group}\n\n"
         )
     
+    def _format_outages(self, outages: List[Dict]) -> str:
+        """Список відключень для тексту повідомлення"""
+        if not outages:
+            return "   🟢 <b>Відключень не заплановано</b>\n"
+        return "".join(f"   🔴 <b>{o['start']} - {o['end']}</b>\n" for o in outages)
+    
+    def _format_update_header(self, schedule_date: str, period: str, is_new: bool) -> str:
+        if is_new:
+            return f"📅 <b>Графік на {period} ({schedule_date}) опубліковано!</b>"
+        return f"⚠️ <b>Графік на {period} ({schedule_date}) змінився!</b>"
+    
     def _get_outages_hash(self, outages: List[Dict]) -> str:
         """Створити хеш для списку відключень"""
         # Сортуємо для стабільності
@@ -49,9 +123,49 @@ class NotificationService:
         outages_str = "|".join(f"{o.get('start')}-{o.get('end')}" for o in sorted_outages)
         return hashlib.md5(outages_str.encode()).hexdigest()
     
+    def export_state(self) -> Dict:
+        """Відбитки груп і посилання на зображення (для файлу гарячого стану)"""
+        return {
+            "schedule_cache": self._committed_cache,
+            "image_info": {day: list(info) for day, info in self._image_info.items()},
+            "baseline_pending": self._baseline_pending,
+        }
+    
+    def restore_state(self, data: Dict) -> None:
+        """Відновити стан після рестарту: перший цикл не перебирає незмінні групи"""
+        self._schedule_cache = {
+            date: dict(groups) for date, groups in data.get("schedule_cache", {}).items()
+        }
+        self._committed_cache = {date: dict(groups) for date, groups in self._schedule_cache.items()}
+        self._image_info = {day: tuple(info) for day, info in data.get("image_info", {}).items()}
+        self._baseline_pending = self._baseline_pending or data.get("baseline_pending", False)
+    
     async def start(self):
         """Запустити сервіс сповіщень"""
         self.running = True
+        self._wake = asyncio.Event()
+        # Зміна підписників (у т.ч. з іншого процесу) запускає цикл раніше
+        self._subscribers_watcher = ChangeSignalWatcher(SIGNAL_SUBSCRIBERS, self._on_subscribers_changed)
+        self._subscribers_watcher.start(fire_initial=False)
+        # /baseline з процесу бота
+        self._baseline_watcher = ChangeSignalWatcher(SIGNAL_BASELINE, self.request_baseline)
+        self._baseline_watcher.start(fire_initial=False)
+        if NOTIFY_BASELINE == "always" or (
+            NOTIFY_BASELINE == "auto" and not await db.has_user_group_hashes()
+        ):
+            self._baseline_pending = True
+        if self.shards.enabled:
+            # Забираємо свою частку шардів до першого циклу
+            try:
+                await self.shards.rebalance()
+            except Exception as e:
+                log.error("Initial shard rebalance failed", error=e)
+            self.shards.start()
+        else:
+            await self.leader.try_acquire()
+            self.leader.start()
+        self.maintenance.start()
+        unreachable_pruner.start()
         # Мінімальне логування
         self._tasks = [
             asyncio.create_task(self._check_for_updates_loop()),
@@ -60,145 +174,510 @@ class NotificationService:
     async def stop(self):
         """Зупинити сервіс сповіщень"""
         self.running = False
+        if self._subscribers_watcher:
+            self._subscribers_watcher.stop()
+        if self._baseline_watcher:
+            self._baseline_watcher.stop()
         for task in self._tasks:
             task.cancel()
+        self.maintenance.stop()
+        await unreachable_pruner.stop()
+        await self.shards.stop()
+        await self.leader.stop()
+    
+    async def _on_subscribers_changed(self):
+        self._audience_dirty = True
+        self._wake.set()
+    
+    async def request_baseline(self):
+        """Зробити наступний цикл базовим (після відновлення БД з бекапу)"""
+        self._baseline_pending = True
+        self._wake.set()
+    
+    async def _wait_for_next_cycle(self, timeout: float):
+        """Почекати до наступного циклу або до сигналу про зміну підписників"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            # Не запускаємо цикли частіше ніж раз на SIGNAL_MIN_CYCLE_GAP
+            await asyncio.sleep(SIGNAL_MIN_CYCLE_GAP)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+    
+    @property
+    def is_active(self) -> bool:
+        """Чи виконує цей екземпляр цикл сповіщень (а не чекає в резерві)"""
+        return self.shards.enabled or self.leader.is_leader
+    
+    def _may_deliver(self, user_id: int) -> bool:
+        """Чи досі цей екземпляр відповідає за доставку користувачу.
+        
+        Перевіряється перед кожним надсиланням: якщо оренду втрачено посеред
+        циклу, повідомлення лишається в outbox для нового власника.
+        """
+        return self.is_active and self.shards.owns(user_id)
+    
+    async def _follow_shared_snapshot(self):
+        """Резервний екземпляр бере snapshot від лідера (для інлайн-режиму)"""
+        try:
+            version = await db.get_signal_version(SIGNAL_SNAPSHOT)
+            if version == self._snapshot_signal:
+                return
+            self._snapshot_signal = version
+            payload = await db.get_signal_payload(SIGNAL_SNAPSHOT)
+            if payload:
+                snapshot_store.load(payload)
+        except Exception as e:
+            log.error("Failed to load shared snapshot", error=e)
     
     async def _check_for_updates_loop(self):
         """Перевіряти оновлення графіку кожні N хвилин"""
         while self.running:
             try:
+                if not self.is_active:
+                    # Резерв: чекаємо, доки звільниться оренда лідера
+                    await self._follow_shared_snapshot()
+                    await asyncio.sleep(LEASE_TTL / 3)
+                    continue
+                await self.poller.maybe_reload()
                 await self._check_and_notify()
-                await asyncio.sleep(CHECK_INTERVAL * 60)
+                await self._wait_for_next_cycle(self.poller.next_delay())
             except asyncio.CancelledError:
                 break
             except Exception:
                 await asyncio.sleep(60)
     
     async def _check_and_notify(self):
-        """Перевірити графіки і сповістити тільки про РЕАЛЬНІ зміни"""
-        # Отримуємо користувачів з увімкненими сповіщеннями
-        users = await firebase_service.get_all_users_with_notifications()
-        if not users:
-            return
+        """Перевірити графіки і сповістити тільки про РЕАЛЬНІ зміни.
         
-        # Отримуємо графіки
-        today_data = await api_service.get_current_grafics()
-        tomorrow_data = await api_service.get_tomorrow_grafics()
+        Цикл виконується як конвеєр стадій, з'єднаних обмеженими чергами:
+        snapshot -> diff -> audience -> render -> send. Коли Telegram
+        пригальмовує надсилання, черги заповнюються і верхні стадії чекають.
         
-        today_date = today_data.get("date", "") if today_data else ""
-        today_html = today_data.get("rawHtml", "") if today_data else ""
+        Базовий цикл (перший запуск, відновлена БД, /baseline) проходить
+        ті самі стадії, але лише записує поточні хеші - нічого не надсилає.
+        """
+        cycle = {"baseline": self._baseline_pending}
+        if cycle["baseline"]:
+            # Базу записуємо для всіх груп і всіх підписників
+            self._schedule_cache = {}
+            self._audience_dirty = True
+        pipeline = Pipeline([
+            PipelineStage("snapshot", self._stage_snapshot, 1, PIPELINE_QUEUE_SIZE),
+            PipelineStage("diff", self._stage_diff, 1, PIPELINE_QUEUE_SIZE),
+            PipelineStage("audience", self._stage_audience, PIPELINE_AUDIENCE_CONCURRENCY, PIPELINE_QUEUE_SIZE),
+            PipelineStage("render", self._stage_render, PIPELINE_RENDER_CONCURRENCY, PIPELINE_QUEUE_SIZE),
+            PipelineStage("send", self._stage_send, PIPELINE_SEND_CONCURRENCY, PIPELINE_QUEUE_SIZE),
+        ])
+        with tracer.trace("cycle", "baseline" if cycle["baseline"] else "notify"):
+            # Спершу доставляємо те, що залишилось з перерваного циклу
+            if not cycle["baseline"]:
+                with tracer.span("outbox.drain"):
+                    await self._drain_outbox()
+            self.last_cycle_stats = await pipeline.run([cycle])
+        if cycle["baseline"] and not snapshot_store.is_empty:
+            # Без графіку (збій API) база лишається на наступний цикл
+            self._baseline_pending = False
+            log.warning("Baseline recorded without notifications", users=cycle.get("users", 0))
+        self._committed_cache = {date: dict(groups) for date, groups in self._schedule_cache.items()}
+        self.last_cycle_stats["polling"] = self.poller.stats()
+        stages = self.last_cycle_stats["stages"]
+        if not stages["snapshot"]["emitted"]:
+            # Перевірка без змін (часта в гарячих вікнах) - не цикл сповіщень
+            log.debug("Poll without changes", elapsed=self.last_cycle_stats["elapsed"])
+            return
+        NOTIFY_CYCLE_SECONDS.observe(self.last_cycle_stats["elapsed"])
+        log.info(
+            "Cycle finished",
+            elapsed=self.last_cycle_stats["elapsed"],
+            sent=stages["send"]["processed"],
+            errors=sum(stage["errors"] for stage in stages.values()),
+            polls=self.last_cycle_stats["polling"]["polls"],
+        )
+    
+    async def _stage_snapshot(self, cycle: Dict, emit):
+        """Стадія 1: оновити snapshot і згрупувати підписників за групами"""
+        # Оновлюємо спільний snapshot (одним запитом), навіть якщо підписників
+        # немає - його використовує інлайн-режим
+        with tracer.span("snapshot.refresh"):
+            changed = await snapshot_store.refresh()
+        self.poller.record_poll(changed, self._published_at() if changed else None)
+        if changed:
+            # Зміну знято лише після успішного читання підписників нижче
+            self._audience_dirty = True
+            # Ділимося snapshot з процесом бота (інлайн-режим)
+            with tracer.span("sqlite.snapshot"):
+                await db.bump_signal(SIGNAL_SNAPSHOT, snapshot_store.export())
+                await self._save_schedule_history()
+        elif not self._audience_dirty and self._last_full_cycle is not None \
+                and time.monotonic() - self._last_full_cycle < CHECK_INTERVAL * 60:
+            # Часті перевірки в гарячих вікнах не тягнуть щоразу всіх підписників
+            return
+        pending = self._audience_dirty
         
-        tomorrow_date = tomorrow_data.get("date", "") if tomorrow_data else ""
-        tomorrow_html = tomorrow_data.get("rawHtml", "") if tomorrow_data else ""
+        if BROADCAST_MODE == "channels" and self.shards.owns_shard(0):
+            # Одна публікація на групу замість повідомлення кожному
+            # (при шардуванні - лише воркер, що тримає шард 0)
+            with tracer.span("channels.broadcast"):
+                await self._broadcast_to_channels(cycle["baseline"])
         
-        for user in users:
-            try:
-                await self._check_user_schedule(user, today_date, today_html, tomorrow_date, tomorrow_html)
-            except Exception:
-                pass  # Тихо ігноруємо помилки окремих користувачів
-    
-    async def _check_user_schedule(self, user: Dict, today_date: str, today_html: str, 
-                                    tomorrow_date: str, tomorrow_html: str):
-        """Перевірити і сповістити одного користувача про зміни"""
-        user_id = user["user_id"]
-        cherg_gpv = user.get("cherg_gpv", "")
-        if not cherg_gpv:
+        # Групуємо підписників одразу під час читання, без проміжних списків
+        users_by_group: Dict[str, List[Dict]] = {}
+        subscribers_started = time.perf_counter()
+        fetched = 0
+        async for user in self._iter_subscribers():
+            fetched += 1
+            if BROADCAST_MODE == "channels" and not self._wants_private_notifications(user):
+                continue
+            # Кожен воркер обслуговує лише користувачів своїх шардів
+            if not self.shards.owns(user["user_id"]):
+                continue
+            # Вже в черзі на відписку - Firebase ще не встиг оновитись
+            if user["user_id"] in unreachable_pruner:
+                continue
+            cherg_gpv = user.get("cherg_gpv", "")
+            if not cherg_gpv:
+                continue
+            group = await api_service.get_schedule_group(cherg_gpv)
+            users_by_group.setdefault(group, []).append(user)
+            NOTIFY_USERS_SCANNED.inc()
+        tracer.record("subscribers", time.perf_counter() - subscribers_started)
+        if fetched or not pending:
+            self._audience_dirty = False
+            self._last_full_cycle = time.monotonic()
+        else:
+            # Firebase повертає [] і при збої - зміну не можна загубити,
+            # тож повний цикл повториться на наступній перевірці
+            log.warning("No subscribers fetched, retrying on next poll")
+        if not users_by_group:
             return
         
-        formatted_group = await api_service.get_schedule_group(cherg_gpv)
-        
-        # Перевіряємо графік на СЬОГОДНІ
-        if today_html and today_date:
-            parsed = api_service.parse_schedule_for_group(today_html, cherg_gpv)
-            outages = parsed.get("outages", [])
-            current_hash = self._get_outages_hash(outages)
-            
-            # Отримуємо збережений хеш для цієї дати і групи
-            saved_hash = await db.get_user_group_hash(user_id, today_date)
+        cycle["users_by_group"] = users_by_group
+        cycle["users"] = sum(len(users) for users in users_by_group.values())
+        await emit(cycle)
+    
+    async def _iter_subscribers(self):
+        """Користувачі з увімкненими сповіщеннями: з Firebase, а без нього - з локальної БД"""
+        if firebase_service.database_url:
+            users = await firebase_service.get_all_users_with_notifications()
+            self._firebase_user_ids = {user["user_id"] for user in users}
+            for user in users:
+                yield user
+            return
+        async for user in db.iter_users_with_notifications():
+            yield user
+    
+    async def _stage_diff(self, cycle: Dict, emit):
+        """Стадія 2: знайти групи, графік (або аудиторія) яких змінився"""
+        active_dates = set()
+        for day, period in DAY_PERIODS:
+            day_data = snapshot_store.get_day(day)
+            schedule_date = day_data.get("date", "")
+            if not schedule_date or not day_data.get("rawHtml"):
+                continue
+            active_dates.add(schedule_date)
+            cache = self._schedule_cache.setdefault(schedule_date, {})
             
-            if saved_hash is None:
-                # Перша поява графіку на цю дату - зберігаємо без сповіщення
-                await db.save_user_group_hash(user_id, today_date, current_hash)
-            elif saved_hash != current_hash:
-                # Графік ЗМІНИВСЯ - сповіщаємо
-                await db.save_user_group_hash(user_id, today_date, current_hash)
-                await self._send_schedule_update(user, formatted_group, outages, today_date, "сьогодні")
+            for group, users in cycle["users_by_group"].items():
+                with tracer.span("parse"):
+                    parsed = snapshot_store.get_parsed(day, group)
+                outages = parsed.get("outages", [])
+                outages_hash = self._get_outages_hash(outages)
+                # Нові підписники групи теж мають отримати базовий хеш
+                audience_hash = hashlib.md5(
+                    ",".join(str(u["user_id"]) for u in sorted(users, key=lambda u: u["user_id"])).encode()
+                ).hexdigest()
+                fingerprint = f"{outages_hash}:{audience_hash}"
+                previous = cache.get(group)
+                if previous == fingerprint:
+                    continue
+                cache[group] = fingerprint
+                
+                await emit({
+                    "day": day,
+                    "period": period,
+                    "schedule_date": schedule_date,
+                    "group": group,
+                    "outages": outages,
+                    "hash": outages_hash,
+                    # Хеш графіку групи з попереднього циклу (None - група на цю дату ще не траплялась)
+                    "previous_hash": previous.split(":")[0] if previous else None,
+                    "users": users,
+                    "baseline": cycle["baseline"],
+                })
         
-        # Перевіряємо графік на ЗАВТРА
-        if tomorrow_html and tomorrow_date:
-            parsed = api_service.parse_schedule_for_group(tomorrow_html, cherg_gpv)
-            outages = parsed.get("outages", [])
-            current_hash = self._get_outages_hash(outages)
-            
-            saved_hash = await db.get_user_group_hash(user_id, tomorrow_date)
-            
-            if saved_hash is None:
-                # Графік на завтра З'ЯВИВСЯ - сповіщаємо
-                await db.save_user_group_hash(user_id, tomorrow_date, current_hash)
-                await self._send_schedule_update(user, formatted_group, outages, tomorrow_date, "завтра", is_new=True)
-            elif saved_hash != current_hash:
-                # Графік на завтра ЗМІНИВСЯ - сповіщаємо
-                await db.save_user_group_hash(user_id, tomorrow_date, current_hash)
-                await self._send_schedule_update(user, formatted_group, outages, tomorrow_date, "завтра")
-    
-    async def _send_schedule_update(self, user: Dict, formatted_group: str, outages: List[Dict], 
-                                     schedule_date: str, period: str, is_new: bool = False):
-        """Відправити сповіщення про зміну/появу графіку"""
-        user_id = user["user_id"]
+        # Прибираємо кеш для дат, яких вже немає в графіку
+        for schedule_date in list(self._schedule_cache):
+            if schedule_date not in active_dates:
+                del self._schedule_cache[schedule_date]
+    
+    async def _stage_audience(self, diff: Dict, emit):
+        """Стадія 3: визначити, кому з групи потрібно надіслати сповіщення"""
+        schedule_date = diff["schedule_date"]
+        current_hash = diff["hash"]
+        failed = 0
+        for user in diff["users"]:
+            user_id = user["user_id"]
+            try:
+                with tracer.span("sqlite.group_hash"):
+                    saved_hash = await db.get_user_group_hash(user_id, schedule_date)
+                    if saved_hash != current_hash \
+                            and not await db.save_user_group_hash(user_id, schedule_date, current_hash):
+                        raise RuntimeError("group hash not saved")
+                if saved_hash == current_hash or diff["baseline"]:
+                    continue
+                
+                if diff["previous_hash"] == current_hash:
+                    # Графік групи з минулого циклу не змінився - змінилась аудиторія
+                    # (новий підписник, інша адреса, відновлена БД): лише запам'ятовуємо
+                    continue
+                
+                if saved_hash is None and diff["day"] == "today":
+                    # Перша поява графіку на цю дату - зберігаємо без сповіщення
+                    continue
+                
+                # Графік на завтра З'ЯВИВСЯ або графік ЗМІНИВСЯ - сповіщаємо.
+                # "З'явився" - якщо група ще не мала графіку на цю дату
+                is_new = saved_hash is None and diff["previous_hash"] is None
+                await emit({"user": user, "diff": diff, "is_new": is_new, "saved_hash": saved_hash})
+            except Exception as e:
+                failed += 1
+                log.warning("Audience check failed", user_id=user_id, group=diff["group"], error=e)
+        if failed:
+            # Група обробиться повторно в наступному циклі
+            self._forget_group(schedule_date, diff["group"])
+            raise RuntimeError(f"{failed} user(s) of group {diff['group']} failed")
+    
+    def _forget_group(self, schedule_date: str, group: str) -> None:
+        """Прибрати відбиток групи, щоб наступний цикл перевірив усіх її користувачів"""
+        self._schedule_cache.get(schedule_date, {}).pop(group, None)
+    
+    async def _stage_render(self, job: Dict, emit):
+        """Стадія 4: сформувати текст повідомлення і записати його в outbox"""
+        diff = job["diff"]
+        user_id = job["user"]["user_id"]
+        outbox_id = None
+        try:
+            with tracer.span("render"):
+                message = self._render_schedule_update(
+                    job["user"], diff["group"], diff["outages"],
+                    diff["schedule_date"], diff["period"], job["is_new"]
+                )
+            image_day = diff["day"] if job["is_new"] and NOTIFY_WITH_IMAGE else None
+            with tracer.span("sqlite.outbox"):
+                outbox_id = await db.enqueue_outbox(user_id, message, diff["schedule_date"], image_day)
+        finally:
+            if outbox_id is None:
+                # Сповіщення не в outbox - повертаємо попередній хеш користувача,
+                # щоб наступний цикл згенерував його знову
+                await db.restore_user_group_hash(user_id, diff["schedule_date"], job["saved_hash"])
+                self._forget_group(diff["schedule_date"], diff["group"])
+        if outbox_id is None:
+            raise RuntimeError(f"Notification for user {user_id} not enqueued")
+        await emit({
+            "id": outbox_id,
+            "user_id": user_id,
+            "message": message,
+            "schedule_date": diff["schedule_date"],
+            "image_day": image_day,
+        })
+    
+    async def _stage_send(self, item: Dict, emit):
+        """Стадія 5: надіслати повідомлення з урахуванням лімітів Telegram"""
+        if not self._may_deliver(item["user_id"]) or item["user_id"] in unreachable_pruner:
+            return
+        for _ in range(3):
+            try:
+                with tracer.span("send"):
+                    delivered = await self._send_schedule_update(
+                        item["user_id"], item["message"], item["schedule_date"], item["image_day"]
+                    )
+                if item.get("id"):
+                    await db.mark_outbox_sent(item["id"])
+                if delivered:
+                    NOTIFY_USERS_NOTIFIED.inc()
+                await emit(item)
+                break
+            except RetryAfter as e:
+                # Воркер чекає - черга send заповнюється і гальмує верхні стадії
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                await asyncio.sleep(seconds + 0.5)
+            except TelegramError as e:
+                reason = classify_delivery_error(e)
+                NOTIFY_DELIVERY_ERRORS.inc(reason=reason)
+                if reason not in PERMANENT_REASONS:
+                    # Лишається в outbox - наступний цикл спробує ще раз
+                    raise
+                # Користувач недосяжний: не повторюємо і відписуємо його
+                if item.get("id"):
+                    await db.mark_outbox_sent(item["id"])
+                # Сповіщення з outbox до першого повного циклу відпишуть лише в
+                # SQLite; у Firebase - коли користувач знову прийде з її списку
+                unreachable_pruner.mark(
+                    item["user_id"], reason, in_firebase=item["user_id"] in self._firebase_user_ids
+                )
+                log.info("User unreachable", user_id=item["user_id"], reason=reason)
+                return
         
-        # Форматуємо текст
-        if outages:
-            outage_text = ""
-            for outage in outages:
-                outage_text += f"   🔴 <b>{outage['start']} - {outage['end']}</b>\n"
-        else:
-            outage_text = "   🟢 <b>Відключень не заплановано</b>\n"
+        await asyncio.sleep(NOTIFY_SEND_DELAY)  # Невелика затримка між повідомленнями
+    
+    async def _drain_outbox(self):
+        """Доставити сповіщення, які не встигли надіслати до перезапуску"""
+        pending = [
+            item for item in await db.get_pending_outbox(OUTBOX_MAX_AGE)
+            if self._may_deliver(item["user_id"])
+        ]
+        if not pending:
+            return
+        log.info("Delivering pending notifications from outbox", count=len(pending))
         
-        if is_new:
-            header = f"📅 <b>Графік на {period} ({schedule_date}) опубліковано!</b>"
-        else:
-            header = f"⚠️ <b>Графік на {period} ({schedule_date}) змінився!</b>"
+        async def noop(_):
+            pass
         
-        message = (
-            f"{header}\n\n"
+        for item in pending:
+            try:
+                await self._stage_send(item, noop)
+            except Exception:
+                pass
+    
+    def _published_at(self) -> Optional[datetime]:
+        """Найпізніший час "станом на" серед графіків у snapshot"""
+        moments = [
+            parse_update_time(snapshot_store.get_day(day).get("updateTime", ""))
+            for day, _ in DAY_PERIODS
+        ]
+        moments = [moment for moment in moments if moment is not None]
+        return max(moments) if moments else None
+    
+    async def _save_schedule_history(self):
+        """Записати нову версію графіку в історію (з неї вчиться PollScheduler)"""
+        for day, _ in DAY_PERIODS:
+            day_data = snapshot_store.get_day(day)
+            if day_data.get("date") and day_data.get("rawHtml"):
+                await db.save_schedule_hash(
+                    day_data["date"], day_data.get("imageUrl", ""), day_data["rawHtml"],
+                    day_data.get("updateTime")
+                )
+    
+    def _wants_private_notifications(self, user: Dict) -> bool:
+        """Чи хоче користувач особисті сповіщення в режимі каналів"""
+        settings = user.get("notification_settings")
+        return isinstance(settings, dict) and bool(settings.get("private_notifications"))
+    
+    async def _broadcast_to_channels(self, baseline: bool = False):
+        """Опублікувати зміни графіку в канали груп (у базовому циклі - лише записати хеші)"""
+        channels = await db.get_group_channels()
+        for group, channel in channels.items():
+            for day, period in DAY_PERIODS:
+                day_data = snapshot_store.get_day(day)
+                schedule_date = day_data.get("date", "")
+                parsed = snapshot_store.get_parsed(day, group)
+                if not schedule_date or parsed is None:
+                    continue
+                outages = parsed.get("outages", [])
+                current_hash = self._get_outages_hash(outages)
+                saved_hash = await db.get_group_hash(group, schedule_date)
+                if saved_hash == current_hash:
+                    continue
+                
+                if baseline or (saved_hash is None and day == "today"):
+                    # Перша поява графіку на сьогодні - без публікації
+                    await db.save_group_hash(group, schedule_date, current_hash)
+                    continue
+                
+                message = (
+                    f"{self._format_update_header(schedule_date, period, is_new=saved_hash is None)}\n\n"
+                    f"🔌 <b>Група ГПВ:</b> {group}\n\n"
+                    f"⏰ <b>Графік відключень:</b>\n"
+                    f"{self._format_outages(outages)}"
+                )
+                try:
+                    await self.bot.send_message(
+                        chat_id=channel["chat_id"],
+                        text=message,
+                        parse_mode=ParseMode.HTML
+                    )
+                    await db.save_group_hash(group, schedule_date, current_hash)
+                except Exception as e:
+                    log.error("Failed to post to group channel", group=group, error=e)
+                await asyncio.sleep(NOTIFY_SEND_DELAY)
+    
+    def _render_schedule_update(self, user: Dict, formatted_group: str, outages: List[Dict],
+                                schedule_date: str, period: str, is_new: bool = False) -> str:
+        """Сформувати текст сповіщення про зміну/появу графіку"""
+        return (
+            f"{self._format_update_header(schedule_date, period, is_new)}\n\n"
             f"{self._format_location_block(user, formatted_group)}"
             f"⏰ <b>Графік відключень:</b>\n"
-            f"{outage_text}"
+            f"{self._format_outages(outages)}"
         )
+    
+    async def _send_schedule_update(self, user_id: int, message: str, schedule_date: str,
+                                    image_day: Optional[str] = None) -> bool:
+        """Відправити сповіщення про зміну/появу графіку.
         
-        # Пробуємо редагувати попереднє повідомлення
-        last_msg = await db.get_user_last_message(user_id)
+        Повертає False, якщо в чаті вже є повідомлення з таким самим текстом.
+        """
+        # Останнє повідомлення з графіком - з пам'яті, без запиту до SQLite
+        last_msg = await message_state.get(user_id)
+        same_date = last_msg is not None and last_msg["schedule_date"] == schedule_date
+        if same_date and last_msg["content_hash"] == content_hash(message):
+            NOTIFY_UNCHANGED.inc()
+            return False
         
-        try:
-            if last_msg and last_msg.get("schedule_date") == schedule_date:
-                # Редагуємо існуюче повідомлення
+        if image_day:
+            # Зображення надсилається через кеш file_id - LOE не навантажується
+            await self.send_schedule_image(user_id, image_day)
+        
+        if same_date:
+            # Редагуємо існуюче повідомлення
+            try:
                 await self.bot.edit_message_text(
                     chat_id=user_id,
                     message_id=last_msg["message_id"],
                     text=message,
                     parse_mode=ParseMode.HTML
                 )
-            else:
-                # Надсилаємо нове
-                sent = await self.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode=ParseMode.HTML
-                )
-                await db.save_user_last_message(user_id, sent.message_id, schedule_date)
-        except BadRequest:
-            # Якщо не вдалося редагувати - надсилаємо нове
-            try:
-                sent = await self.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode=ParseMode.HTML
-                )
-                await db.save_user_last_message(user_id, sent.message_id, schedule_date)
-            except Exception:
-                pass
+                await message_state.remember(user_id, last_msg["message_id"], schedule_date, message)
+                return True
+            except BadRequest as e:
+                if "message is not modified" in str(e).lower():
+                    # Текст уже такий (хеш ще не був збережений) - дубль не надсилаємо
+                    await message_state.remember(user_id, last_msg["message_id"], schedule_date, message)
+                    NOTIFY_UNCHANGED.inc()
+                    return False
+                # Повідомлення видалене або застаре для редагування - надсилаємо нове
         
-        await asyncio.sleep(0.3)  # Невелика затримка між повідомленнями
+        sent = await self.bot.send_message(
+            chat_id=user_id,
+            text=message,
+            parse_mode=ParseMode.HTML
+        )
+        await message_state.remember(user_id, sent.message_id, schedule_date, message)
+        return True
+    
+    async def send_schedule_image(self, user_id: int, day: str = "today") -> bool:
+        """Надіслати офіційне зображення графіку ('today' або 'tomorrow')"""
+        try:
+            # Посилання на зображення змінюється лише разом зі snapshot
+            cached = self._image_info.get(day)
+            if cached and cached[0] == snapshot_store.version and snapshot_store.version:
+                image = cached[1]
+            else:
+                if day == "tomorrow":
+                    image = await api_service.get_schedule_image_for_tomorrow()
+                else:
+                    image = await api_service.get_schedule_image_for_today()
+                self._image_info[day] = (snapshot_store.version, image)
+            if not image:
+                return False
+            
+            caption = f"🖼 Графік відключень на {image['date']}" if image.get("date") else None
+            sent = await media_cache.send_photo(self.bot, user_id, image["image_url"], caption=caption)
+            return sent is not None
+        except Exception:
+            return False
     
     async def send_schedule_to_user(self, user_id: int) -> bool:
         """Відправити поточний графік конкретному користувачу"""
@@ -298,7 +777,7 @@ class NotificationService:
             )
             
             # Зберігаємо message_id для можливого редагування
-            await db.save_user_last_message(user_id, sent.message_id, schedule_date)
+            await message_state.remember(user_id, sent.message_id, schedule_date, message)
             
             return True
             
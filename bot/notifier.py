@@ -0,0 +1,91 @@
+"""
+Львівобленерго Telegram Bot
+Standalone notification worker (NOTIFIER_MODE=external)
+
+Запускається окремим процесом поруч з main.py. Стан (хеші, outbox,
+підписники, snapshot) спільний з ботом через SQLite, тож навантаження від
+розсилок не впливає на швидкість відповіді на кнопки.
+"""
+import asyncio
+import signal
+
+from telegram import Bot
+
+from config import BOT_TOKEN, METRICS_HOST, NOTIFIER_METRICS_PORT, NOTIFIER_STATE_PATH
+from database import db
+from api_service import api_service
+from firebase_service import firebase_service
+from timeline_renderer import timeline_service
+from schedule_snapshot import snapshot_store
+from metrics import InstrumentedHTTPXRequest, MetricsServer
+from loop_monitor import loop_monitor, install_uvloop
+from logs import get_logger, setup_logging, shutdown_logging
+from warm_state import WarmStateStore
+import notifications
+
+log = get_logger(__name__)
+
+
+async def run():
+    """Запустити цикл сповіщень і чекати сигналу зупинки"""
+    await db.init_db()
+    db.start_write_behind()
+    loop_monitor.start()
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    
+    metrics_server = None
+    if NOTIFIER_METRICS_PORT:
+        metrics_server = MetricsServer(METRICS_HOST, NOTIFIER_METRICS_PORT)
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            log.error("Failed to start metrics server", error=e)
+            metrics_server = None
+    
+    async with Bot(BOT_TOKEN, request=InstrumentedHTTPXRequest(connection_pool_size=8)) as bot:
+        service = notifications.NotificationService(bot)
+        notifications.notification_service = service
+        # Snapshot і відбитки груп з попереднього запуску
+        warm_state = WarmStateStore(NOTIFIER_STATE_PATH)
+        await warm_state.load()
+        warm_state.register("snapshot", snapshot_store.export_state, snapshot_store.restore_state)
+        warm_state.register("notifications", service.export_state, service.restore_state)
+        warm_state.start()
+        await service.start()
+        log.info("Notification worker started")
+        try:
+            await stop_event.wait()
+        finally:
+            await service.stop()
+            await warm_state.stop()
+            loop_monitor.stop()
+            await db.close()
+            if metrics_server:
+                await metrics_server.stop()
+            await api_service.close()
+            timeline_service.close()
+            await firebase_service.close()
+            log.info("Notification worker stopped")
+
+
+def main():
+    setup_logging()
+    if not BOT_TOKEN:
+        log.error("BOT_TOKEN is not set! Please set it in .env file")
+        return
+    install_uvloop()
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Regression corpus and micro-benchmark for the LOE rawHtml parser
+
+Корпус - реальні rawHtml з schedule_history (і збережених сторінок сайту)
+разом з очікуваними відключеннями кожної групи, по файлу на версію графіку
+в parser_corpus/. Перед оптимізацією парсера:
+
+    python parser_bench.py check            # результати збігаються з корпусом
+    python parser_bench.py bench            # payloads/s і мкс на групу
+    python parser_bench.py export --days 90 # доповнити корпус з schedule_history
+    python parser_bench.py export --page ../lvivoblenergo.txt
+
+Очікувані значення для нових файлів генерує поточний парсер - перегляньте
+їх перед комітом, інакше корпус закріпить помилку.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from api_service import api_service, extract_update_time
+
+CORPUS_DIR = Path(__file__).parent / "parser_corpus"
+GROUPS = [f"{queue}.{sub}" for queue in range(1, 7) for sub in (1, 2)]
+# Блок з графіком на збереженій сторінці сайту
+_PAGE_BLOCK = re.compile(r'<div class="power-off__text">(.*?)</div></div>', re.S)
+_GROUP_NAME = re.compile(r"Група (\d+\.\d+)\.")
+
+
+def _groups_in(raw_html: str) -> List[str]:
+    """Стандартні групи плюс будь-які нові, що з'явились у payload"""
+    found = _GROUP_NAME.findall(raw_html)
+    return GROUPS + sorted(set(found) - set(GROUPS))
+
+
+def parse_payload(raw_html: str) -> Dict:
+    """Все, що бот витягує з одного rawHtml"""
+    groups = {}
+    for group in _groups_in(raw_html):
+        parsed = api_service.parse_schedule_for_group(raw_html, group)
+        groups[group] = {"outages": parsed["outages"], "hasPower": parsed["hasPower"]}
+    return {
+        "date": api_service._extract_date_from_html(raw_html),
+        "update_time": extract_update_time(raw_html),
+        "groups": groups,
+    }
+
+
+def load_corpus() -> List[Dict]:
+    return [
+        dict(json.loads(path.read_text(encoding="utf-8")), name=path.stem)
+        for path in sorted(CORPUS_DIR.glob("*.json"))
+    ]
+
+
+def _diff(expected: Dict, actual: Dict) -> List[str]:
+    problems = []
+    for key in ("date", "update_time"):
+        if expected[key] != actual[key]:
+            problems.append(f"{key}: expected {expected[key]!r}, got {actual[key]!r}")
+    for group, want in expected["groups"].items():
+        got = actual["groups"].get(group)
+        if got != want:
+            problems.append(f"group {group}: expected {want}, got {got}")
+    return problems
+
+
+def check(cases: List[Dict]) -> int:
+    """Порівняти результат парсера з корпусом; кількість розбіжностей"""
+    failures = 0
+    for case in cases:
+        actual = parse_payload(case["raw_html"])
+        problems = _diff(case["expected"], actual)
+        # Код групи з Firebase ("11") має давати той самий результат, що й "1.1"
+        for group in GROUPS:
+            code = group.replace(".", "")
+            by_code = api_service.parse_schedule_for_group(case["raw_html"], code)
+            if by_code["outages"] != actual["groups"][group]["outages"]:
+                problems.append(f"group {code}: differs from {group}")
+        for problem in problems:
+            print(f"FAIL {case['name']}: {problem}")
+        failures += len(problems)
+    print(f"{len(cases)} payloads, {failures} mismatches")
+    return failures
+
+
+def bench(cases: List[Dict], min_seconds: float = 2.0) -> Dict:
+    """Пропускна здатність: повний розбір payload (дата, час, усі групи)"""
+    payloads = [case["raw_html"] for case in cases]
+    groups = sum(len(case["expected"]["groups"]) for case in cases)
+    results = {}
+    for name, run in (
+        ("payload", parse_payload),
+        ("date", api_service._extract_date_from_html),
+        ("update_time", extract_update_time),
+    ):
+        rounds = 0
+        started = time.perf_counter()
+        while True:
+            for raw in payloads:
+                run(raw)
+            rounds += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        per_payload = elapsed / (rounds * len(payloads))
+        results[name] = {
+            "payloads_per_second": round(1 / per_payload),
+            "us_per_payload": round(per_payload * 1e6, 2),
+        }
+    results["payload"]["us_per_group"] = round(
+        results["payload"]["us_per_payload"] * len(payloads) / groups, 2
+    )
+    return results
+
+
+def _write_case(raw_html: str, source: str) -> bool:
+    """Додати payload до корпусу (якщо такого ще немає)"""
+    expected = parse_payload(raw_html)
+    digest = hashlib.sha1(raw_html.encode("utf-8")).hexdigest()[:8]
+    date = "-".join(reversed(expected["date"].split("."))) or "undated"
+    path = CORPUS_DIR / f"{date}-{digest}.json"
+    if path.exists():
+        return False
+    case = {"source": source, "raw_html": raw_html, "expected": expected}
+    path.write_text(json.dumps(case, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"Added {path.name}")
+    return True
+
+
+async def _history_payloads(days: int) -> List[str]:
+    from database import db
+    await db.init_db()
+    rows = await db.get_schedule_history(days)
+    return [row["raw_html"] for row in rows if row.get("raw_html")]
+
+
+def export(days: int, pages: List[str]) -> int:
+    CORPUS_DIR.mkdir(exist_ok=True)
+    added = 0
+    if days:
+        for raw_html in asyncio.run(_history_payloads(days)):
+            added += _write_case(raw_html, "schedule_history")
+    for page in pages:
+        html = Path(page).read_text(encoding="utf-8")
+        for block in _PAGE_BLOCK.findall(html):
+            added += _write_case(block + "</div>", f"page:{Path(page).name}")
+    print(f"{added} new payloads")
+    return added
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("check")
+    bench_parser = commands.add_parser("bench")
+    bench_parser.add_argument("--seconds", type=float, default=2.0)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--days", type=int, default=0, help="з schedule_history")
+    export_parser.add_argument("--page", action="append", default=[],
+                               help="збережена сторінка сайту LOE")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.days, args.page)
+        return
+    cases = load_corpus()
+    if not cases:
+        print("Corpus is empty: run 'python parser_bench.py export' first")
+        sys.exit(1)
+    if args.command == "bench":
+        print(json.dumps(bench(cases, args.seconds), indent=2))
+        return
+    # Без команди - і перевірка, і бенчмарк (бенчмарк лише коли все збігається)
+    if check(cases):
+        sys.exit(1)
+    if args.command is None:
+        print(json.dumps(bench(cases), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Minimal staged asyncio pipeline with bounded queues"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from metrics import QUEUE_DEPTH
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Обробник стадії: отримує елемент і функцію emit для передачі результатів далі
+StageHandler = Callable[[Any, Callable[[Any], Awaitable[None]]], Awaitable[None]]
+
+_DONE = object()
+
+
+class PipelineStage:
+    """Одна стадія конвеєра: N воркерів читають з обмеженої черги"""
+
+    def __init__(self, name: str, handler: StageHandler, concurrency: int = 1,
+                 queue_size: int = 100) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    async def put(self, item: Any) -> None:
+        # Якщо черга заповнена, put чекає - так тиск передається вгору
+        await self.queue.put(item)
+        depth = self.queue.qsize()
+        QUEUE_DEPTH.set(depth, queue=f"pipeline_{self.name}")
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "emitted": self.emitted,
+            "errors": self.errors,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "busy_time": round(self.busy_time, 3),
+            "elapsed": round(elapsed, 3),
+            "throughput": round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class Pipeline:
+    """Послідовність стадій, з'єднаних обмеженими чергами asyncio.Queue.
+
+    Кожна стадія обробляє елементи незалежно від інших, тож повільна стадія
+    (наприклад, надсилання в Telegram) не блокує підготовку наступних
+    елементів, доки її черга не заповниться.
+    """
+
+    def __init__(self, stages: List[PipelineStage]) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    async def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        async def emit(item: Any) -> None:
+            stage.emitted += 1
+            if next_stage is not None:
+                await next_stage.put(item)
+
+        while True:
+            item = await stage.queue.get()
+            QUEUE_DEPTH.set(stage.queue.qsize(), queue=f"pipeline_{stage.name}")
+            if item is _DONE:
+                return
+            started = time.monotonic()
+            try:
+                await stage.handler(item, emit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stage.errors += 1
+                log.error("Pipeline stage failed", stage=stage.name, error=e)
+            finally:
+                stage.processed += 1
+                stage.busy_time += time.monotonic() - started
+
+    async def _run_stage(self, index: int) -> None:
+        stage = self.stages[index]
+        stage.started_at = time.monotonic()
+        await asyncio.gather(*(self._worker(index) for _ in range(stage.concurrency)))
+        stage.finished_at = time.monotonic()
+        # Стадія завершена - повідомляємо воркерів наступної
+        if index + 1 < len(self.stages):
+            next_stage = self.stages[index + 1]
+            for _ in range(next_stage.concurrency):
+                await next_stage.queue.put(_DONE)
+
+    async def run(self, items: Iterable[Any]) -> Dict[str, Any]:
+        """Прогнати елементи через усі стадії і повернути статистику"""
+        self.started_at = time.monotonic()
+        tasks = [asyncio.create_task(self._run_stage(i)) for i in range(len(self.stages))]
+        try:
+            first = self.stages[0]
+            for item in items:
+                await first.put(item)
+            for _ in range(first.concurrency):
+                await first.queue.put(_DONE)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            self.finished_at = time.monotonic()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "elapsed": round(elapsed, 3),
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
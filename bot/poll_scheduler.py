@@ -0,0 +1,251 @@
+"""Adaptive polling interval learned from schedule publication history"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Set
+
+from config import (
+    CHECK_INTERVAL,
+    POLL_MIN_INTERVAL,
+    POLL_HOT_MAX_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_HISTORY_DAYS,
+    SCHEDULE_TIMEZONE,
+)
+from logs import get_logger
+
+log = get_logger(__name__)
+
+try:
+    from zoneinfo import ZoneInfo
+    SCHEDULE_TZ = ZoneInfo(SCHEDULE_TIMEZONE)
+except Exception:  # немає tzdata - рахуємо в локальному часі сервера
+    SCHEDULE_TZ = None
+
+BUCKET_MINUTES = 15
+BUCKETS = 24 * 60 // BUCKET_MINUTES
+# Поки історії мало - вечірнє вікно, коли зазвичай публікують графік на завтра
+DEFAULT_HOT_HOURS = range(17, 24)
+MIN_HISTORY_EVENTS = 5
+# Інтервал вважається "гарячим", якщо публікація в ньому (±15 хв) трапляється
+# хоча б у такій частці днів
+HOT_PROBABILITY = 0.1
+# Як часто перечитувати історію
+RELOAD_INTERVAL = 3600  # seconds
+MAX_BACKOFF_STEP = 10
+
+
+def now_local() -> datetime:
+    return datetime.now(SCHEDULE_TZ) if SCHEDULE_TZ else datetime.now().astimezone()
+
+
+def parse_update_time(value: str) -> Optional[datetime]:
+    """Розібрати 'станом на' з графіку ('HH:MM DD.MM.YYYY') у час з поясом"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value, "%H:%M %d.%m.%Y")
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=SCHEDULE_TZ) if SCHEDULE_TZ else parsed.astimezone()
+
+
+def _bucket(moment: datetime) -> int:
+    return (moment.hour * 60 + moment.minute) // BUCKET_MINUTES
+
+
+class PollScheduler:
+    """Обирає паузу до наступної перевірки графіку.
+
+    З історії публікацій будується профіль по 15-хвилинних інтервалах доби.
+    У "гарячих" інтервалах опитуємо кожні POLL_MIN_INTERVAL секунд, поза
+    ними - раз на CHECK_INTERVAL. Поки графік не змінюється, пауза
+    подвоюється (до POLL_HOT_MAX_INTERVAL / POLL_MAX_INTERVAL), після
+    зміни - скидається. Холодна пауза ніколи не перескакує початок
+    гарячого вікна.
+    """
+
+    def __init__(self, min_interval: float = POLL_MIN_INTERVAL,
+                 hot_max_interval: float = POLL_HOT_MAX_INTERVAL,
+                 base_interval: float = CHECK_INTERVAL * 60,
+                 max_interval: float = POLL_MAX_INTERVAL) -> None:
+        self.min_interval = min_interval
+        self.hot_max_interval = max(hot_max_interval, min_interval)
+        self.base_interval = max(base_interval, min_interval)
+        self.max_interval = max(max_interval, self.base_interval)
+        self.hot_buckets: Set[int] = {
+            hour * 60 // BUCKET_MINUTES + i
+            for hour in DEFAULT_HOT_HOURS
+            for i in range(60 // BUCKET_MINUTES)
+        }
+        self.history_events = 0
+        self._step = 0
+        self._loaded_at: Optional[float] = None
+        self.started_at = time.monotonic()
+        self.polls = 0
+        self.changes = 0
+        self.latencies: Deque[float] = deque(maxlen=100)
+
+    def learn(self, events: List[datetime]) -> None:
+        """Побудувати гарячі інтервали з моментів публікацій"""
+        self.history_events = len(events)
+        if len(events) < MIN_HISTORY_EVENTS:
+            return
+        counts = [0] * BUCKETS
+        for moment in events:
+            counts[_bucket(moment)] += 1
+        days = max(1, (max(events).date() - min(events).date()).days + 1)
+        hot = set()
+        for index in range(BUCKETS):
+            window = counts[index - 1] + counts[index] + counts[(index + 1) % BUCKETS]
+            if window / days >= HOT_PROBABILITY:
+                hot.add(index)
+        self.hot_buckets = hot
+
+    async def maybe_reload(self) -> None:
+        """Перечитати історію публікацій з БД (не частіше ніж раз на годину)"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < RELOAD_INTERVAL:
+            return
+        self._loaded_at = time.monotonic()
+        from database import db
+        try:
+            rows = await db.get_schedule_publications(POLL_HISTORY_DAYS)
+        except Exception as e:
+            log.error("Failed to load schedule history", error=e)
+            return
+        events = []
+        for row in rows:
+            # Точніше за "станом на" з самого графіку, інакше - час виявлення
+            moment = parse_update_time(row.get("update_time") or "")
+            if moment is None and row.get("created_at"):
+                created = datetime.strptime(row["created_at"], "%Y-%m-%d %H:%M:%S")
+                moment = created.replace(tzinfo=timezone.utc).astimezone(SCHEDULE_TZ)
+            if moment is not None:
+                events.append(moment)
+        self.learn(events)
+
+    def is_hot(self, moment: Optional[datetime] = None) -> bool:
+        return _bucket(moment or now_local()) in self.hot_buckets
+
+    def _seconds_to_next_hot(self, moment: datetime) -> Optional[float]:
+        if not self.hot_buckets:
+            return None
+        start = moment.replace(second=0, microsecond=0) - timedelta(
+            minutes=moment.minute % BUCKET_MINUTES
+        )
+        for i in range(1, BUCKETS + 1):
+            candidate = start + timedelta(minutes=i * BUCKET_MINUTES)
+            if _bucket(candidate) in self.hot_buckets:
+                return (candidate - moment).total_seconds()
+        return None
+
+    def record_poll(self, changed: bool, published_at: Optional[datetime] = None,
+                    detected_at: Optional[datetime] = None) -> None:
+        """Врахувати результат перевірки"""
+        self.polls += 1
+        if not changed:
+            self._step = min(self._step + 1, MAX_BACKOFF_STEP)
+            return
+        self.changes += 1
+        self._step = 0
+        if published_at is not None:
+            latency = ((detected_at or now_local()) - published_at).total_seconds()
+            if latency >= 0:
+                self.latencies.append(latency)
+                log.info("Schedule change detected", latency=f"{latency:.0f}s")
+
+    def next_delay(self, moment: Optional[datetime] = None) -> float:
+        """Пауза до наступної перевірки, секунд"""
+        moment = moment or now_local()
+        backoff = 2 ** self._step
+        if self.is_hot(moment):
+            return min(self.min_interval * backoff, self.hot_max_interval)
+        delay = min(self.base_interval * backoff, self.max_interval)
+        until_hot = self._seconds_to_next_hot(moment)
+        if until_hot is not None:
+            delay = min(delay, max(until_hot, self.min_interval))
+        return delay
+
+    def hot_windows(self) -> List[str]:
+        """Гарячі інтервали у вигляді ['18:00-21:15', ...]"""
+        windows = []
+        start = None
+        for index in range(BUCKETS + 1):
+            hot = index < BUCKETS and index in self.hot_buckets
+            if hot and start is None:
+                start = index
+            elif not hot and start is not None:
+                begin, end = start * BUCKET_MINUTES, index * BUCKET_MINUTES
+                windows.append(f"{begin // 60:02d}:{begin % 60:02d}-{end // 60:02d}:{end % 60:02d}")
+                start = None
+        return windows
+
+    def stats(self) -> Dict:
+        hours = max((time.monotonic() - self.started_at) / 3600, 1 / 60)
+        latencies = sorted(self.latencies)
+        return {
+            "polls": self.polls,
+            "polls_per_hour": round(self.polls / hours, 1),
+            "changes": self.changes,
+            "history_events": self.history_events,
+            "hot_windows": self.hot_windows(),
+            "latency_avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+def _simulate(scheduler: Optional[PollScheduler], events: List[datetime],
+              start: datetime, end: datetime, fixed_interval: float) -> Dict:
+    """Прогнати опитування по відомих моментах публікацій"""
+    pending = sorted(event for event in events if start <= event < end)
+    moment = start
+    polls = 0
+    latencies = []
+    while moment < end:
+        polls += 1
+        detected = [event for event in pending if event <= moment]
+        if detected:
+            pending = pending[len(detected):]
+            latencies.extend((moment - event).total_seconds() for event in detected)
+        if scheduler is None:
+            delay = fixed_interval
+        else:
+            scheduler.record_poll(bool(detected))
+            delay = scheduler.next_delay(moment)
+        moment += timedelta(seconds=delay)
+    days = (end - start).total_seconds() / 86400
+    latencies.sort()
+    return {
+        "polls_per_day": round(polls / days),
+        "latency_avg": round(sum(latencies) / len(latencies)) if latencies else None,
+        "latency_p95": round(latencies[int(len(latencies) * 0.95)]) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    # Порівняння з фіксованим інтервалом на синтетичній історії:
+    # графік на завтра ввечері, інколи - правки вранці.
+    #   python poll_scheduler.py [days]
+    import random
+    import sys
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    random.seed(1)
+    first_day = now_local().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    events = []
+    for day in range(days):
+        midnight = first_day + timedelta(days=day)
+        events.append(midnight + timedelta(minutes=random.gauss(20 * 60 + 15, 50)))
+        if random.random() < 0.3:
+            events.append(midnight + timedelta(minutes=random.uniform(8 * 60, 10 * 60)))
+
+    split = first_day + timedelta(days=days * 2 // 3)
+    scheduler = PollScheduler()
+    scheduler.learn([event for event in events if event < split])
+    end = first_day + timedelta(days=days)
+    print(f"Hot windows: {scheduler.hot_windows()}")
+    print(f"Fixed {CHECK_INTERVAL} min: {_simulate(None, events, split, end, CHECK_INTERVAL * 60)}")
+    print(f"Adaptive:      {_simulate(scheduler, events, split, end, 0)}")
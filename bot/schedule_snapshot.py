@@ -0,0 +1,117 @@
+"""In-memory snapshot of the latest published schedules"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from api_service import api_service
+
+DAYS = ("today", "tomorrow")
+
+_GROUP_RE = re.compile(r'Група (\d+\.\d+)\.')
+
+
+class ScheduleSnapshotStore:
+    """Останній отриманий графік на сьогодні/завтра з розпарсеними групами.
+
+    Версія змінюється лише коли змінюється вміст rawHtml, тому її можна
+    використовувати як ключ для кешів, похідних від графіку.
+    """
+
+    def __init__(self) -> None:
+        self.version: str = ""
+        self.updated_at: Optional[float] = None
+        self._days: Dict[str, Dict[str, Any]] = {day: {} for day in DAYS}
+        # Кеш парсингу: {(day, cherg_gpv): parsed}
+        self._parsed: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Запит до API, що вже виконується (одночасні refresh() його чекають)
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(self._days[day].get("rawHtml") for day in DAYS)
+
+    def update(self, today: Optional[Dict[str, Any]], tomorrow: Optional[Dict[str, Any]]) -> bool:
+        """Замінити snapshot. Повертає True, якщо вміст змінився"""
+        days = {"today": today or {}, "tomorrow": tomorrow or {}}
+        version = hashlib.md5(
+            "\x00".join(days[day].get("rawHtml", "") for day in DAYS).encode()
+        ).hexdigest()
+        self.updated_at = time.time()
+        if version == self.version:
+            return False
+        self._days = days
+        self._parsed = {}
+        self.version = version
+        return True
+
+    async def refresh(self) -> bool:
+        """Завантажити свіжі графіки з API та оновити snapshot.
+
+        Одночасні виклики (хвиля інлайн-запитів на порожньому snapshot)
+        чекають один запит до API і отримують його результат.
+        """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._fetch())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        # shield: скасування одного з тих, хто чекає, не скасовує запит для інших
+        return await asyncio.shield(self._refresh_task)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        if self._refresh_task is task:
+            self._refresh_task = None
+
+    async def _fetch(self) -> bool:
+        grafics = await api_service.get_menu_grafics()
+        if not grafics.get("today") and not grafics.get("tomorrow"):
+            # Не затираємо робочий snapshot через збій API
+            return False
+        return self.update(grafics.get("today"), grafics.get("tomorrow"))
+
+    def export(self) -> str:
+        """Серіалізувати snapshot (для передачі між процесами)"""
+        return json.dumps(self.export_state(), ensure_ascii=False)
+
+    def load(self, payload: str) -> bool:
+        """Відновити snapshot з export(). Повертає True, якщо вміст змінився"""
+        return self.restore_state(json.loads(payload))
+
+    def export_state(self) -> Dict[str, Dict[str, Any]]:
+        """Графіки на сьогодні/завтра (для файлу гарячого стану)"""
+        return {day: self._days[day] for day in DAYS}
+
+    def restore_state(self, data: Dict[str, Dict[str, Any]]) -> bool:
+        return self.update(data.get("today"), data.get("tomorrow"))
+
+    def get_day(self, day: str) -> Dict[str, Any]:
+        """Дані графіку ('today' або 'tomorrow'): date, rawHtml, imageUrl, updateTime"""
+        return self._days.get(day, {})
+
+    def get_parsed(self, day: str, cherg_gpv: str) -> Optional[Dict[str, Any]]:
+        """Розпарсений графік групи на день (з кешем у межах версії)"""
+        raw_html = self._days.get(day, {}).get("rawHtml", "")
+        if not raw_html or not cherg_gpv:
+            return None
+        key = (day, cherg_gpv)
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            parsed = api_service.parse_schedule_for_group(raw_html, cherg_gpv)
+            self._parsed[key] = parsed
+        return parsed
+
+    def get_groups(self) -> List[str]:
+        """Усі групи (у форматі '4.1'), присутні в графіку"""
+        groups = set()
+        for day in DAYS:
+            raw_html = self._days[day].get("rawHtml", "")
+            if raw_html:
+                decoded = raw_html.replace("\\u003C", "<").replace("\\u003E", ">")
+                groups.update(_GROUP_RE.findall(decoded))
+        return sorted(groups)
+
+
+snapshot_store = ScheduleSnapshotStore()
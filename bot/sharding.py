@@ -0,0 +1,193 @@
+"""Consistent-hash sharding of the notification audience across workers"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import math
+import time
+from typing import Dict, List, Optional, Set
+
+from database import db
+from config import NOTIFIER_SHARDS, WORKER_ID, LEASE_TTL
+from logs import get_logger
+
+log = get_logger(__name__)
+
+SHARD_LEASE_PREFIX = "shard:"
+WORKER_LEASE_PREFIX = "worker:"
+
+
+def _point(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Кільце консистентного хешування user_id -> шард.
+
+    Кожен шард має кілька віртуальних вузлів, тож при зміні кількості
+    шардів переїжджає лише мала частина користувачів.
+    """
+
+    def __init__(self, shard_count: int, vnodes: int = 64) -> None:
+        self.shard_count = shard_count
+        ring = sorted(
+            (_point(f"shard-{shard}-{vnode}"), shard)
+            for shard in range(shard_count)
+            for vnode in range(vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_for(self, user_id: int) -> int:
+        index = bisect.bisect(self._points, _point(str(user_id))) % len(self._points)
+        return self._shards[index]
+
+
+class ShardCoordinator:
+    """Розподіляє шарди між живими воркерами через оренди в SQLite.
+
+    Кожен воркер тримає оренду "worker:<id>" як серцебиття і захоплює до
+    ceil(шардів / живих воркерів) орендованих шардів. Якщо воркер перестає
+    продовжувати оренди, після LEASE_TTL його шарди забирають інші.
+    """
+
+    def __init__(self, shard_count: int = NOTIFIER_SHARDS, worker_id: str = WORKER_ID,
+                 ttl: float = LEASE_TTL) -> None:
+        self.shard_count = shard_count
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.ring = HashRing(shard_count)
+        # {shard: monotonic-час, до якого оренда гарантовано наша}
+        self._owned: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count > 1
+
+    @property
+    def owned_shards(self) -> Set[int]:
+        now = time.monotonic()
+        return {shard for shard, valid_until in self._owned.items() if valid_until > now}
+
+    def owns(self, user_id: int) -> bool:
+        """Чи доставляє цей воркер сповіщення користувачу"""
+        if not self.enabled:
+            return True
+        return self.ring.shard_for(user_id) in self.owned_shards
+
+    def owns_shard(self, shard: int) -> bool:
+        return not self.enabled or shard in self.owned_shards
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.enabled:
+            for shard in list(self._owned):
+                await db.release_lease(f"{SHARD_LEASE_PREFIX}{shard}", self.worker_id)
+            await db.release_lease(f"{WORKER_LEASE_PREFIX}{self.worker_id}", self.worker_id)
+            self._owned = {}
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.rebalance()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.error("Shard rebalance failed", error=e)
+            await asyncio.sleep(self.ttl / 3)
+
+    async def rebalance(self) -> Set[int]:
+        """Продовжити свої оренди і взяти/віддати шарди до справедливої частки"""
+        started = time.monotonic()
+        await db.acquire_lease(f"{WORKER_LEASE_PREFIX}{self.worker_id}", self.worker_id, self.ttl)
+        workers = await db.get_active_leases(WORKER_LEASE_PREFIX)
+        target = math.ceil(self.shard_count / max(1, len(workers)))
+
+        leases = {
+            int(lease["name"][len(SHARD_LEASE_PREFIX):]): lease["owner"]
+            for lease in await db.get_active_leases(SHARD_LEASE_PREFIX)
+        }
+        mine = sorted(shard for shard, owner in leases.items() if owner == self.worker_id)
+
+        # Віддаємо зайве, щоб нові воркери отримали свою частку
+        while len(mine) > target:
+            shard = mine.pop()
+            await db.release_lease(f"{SHARD_LEASE_PREFIX}{shard}", self.worker_id)
+
+        owned: Dict[int, float] = {}
+        for shard in mine:
+            if await db.acquire_lease(f"{SHARD_LEASE_PREFIX}{shard}", self.worker_id, self.ttl):
+                owned[shard] = started + self.ttl
+
+        # Починаємо пошук вільних шардів з різних місць, щоб менше конкурувати
+        offset = _point(self.worker_id) % self.shard_count
+        for i in range(self.shard_count):
+            if len(owned) >= target:
+                break
+            shard = (offset + i) % self.shard_count
+            if shard in owned or shard in leases:
+                continue
+            if await db.acquire_lease(f"{SHARD_LEASE_PREFIX}{shard}", self.worker_id, self.ttl):
+                owned[shard] = started + self.ttl
+
+        if set(owned) != set(self._owned):
+            log.info("Shard ownership changed", worker=self.worker_id, shards=sorted(owned))
+        self._owned = owned
+        return set(owned)
+
+
+def _simulate_worker(db_path: str, worker_id: str, shard_count: int, ttl: float,
+                     lifetime: float) -> None:
+    """Воркер для локальної симуляції (окремий процес)"""
+    async def run():
+        db.db_path = db_path
+        coordinator = ShardCoordinator(shard_count, worker_id, ttl)
+        deadline = time.monotonic() + lifetime
+        while time.monotonic() < deadline:
+            owned = await coordinator.rebalance()
+            print(f"{time.strftime('%H:%M:%S')} {worker_id}: {sorted(owned)}", flush=True)
+            await asyncio.sleep(ttl / 3)
+        # Імітуємо аварію: оренди не звільняються, а просто спливають
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    # Локальна перевірка: кілька процесів на одному файлі SQLite.
+    #   python sharding.py [workers] [shards]
+    # Останній воркер "падає" на середині - його шарди мають перейти іншим.
+    import multiprocessing
+    import sys
+    import tempfile
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    shards = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    ttl = 3.0
+    db.db_path = f"{tempfile.mkdtemp()}/shards.db"
+    asyncio.run(db.init_db())
+
+    processes: List[multiprocessing.Process] = []
+    for index in range(workers):
+        lifetime = 6.0 if index == workers - 1 else 15.0
+        process = multiprocessing.Process(
+            target=_simulate_worker,
+            args=(db.db_path, f"w{index}", shards, ttl, lifetime)
+        )
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+    ring = HashRing(shards)
+    counts = [0] * shards
+    for user_id in range(100_000):
+        counts[ring.shard_for(user_id)] += 1
+    print(f"Users per shard (100k): {counts}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модулі бота імпортуються як верхньорівневі (from database import db)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+"""Ущільнення БД: лише incremental_vacuum, без повного VACUUM з періодичного завдання"""
+import asyncio
+import sqlite3
+
+from database import Database
+
+
+def _auto_vacuum(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def test_new_database_uses_incremental_vacuum(tmp_path):
+    database = Database()
+    database.db_path = str(tmp_path / "users.db")
+    asyncio.run(database.init_db())
+    assert _auto_vacuum(database.db_path) == 2
+    assert "freed_pages" in asyncio.run(database.compact(100))
+
+
+def test_compact_skips_legacy_database(tmp_path):
+    database = Database()
+    database.db_path = str(tmp_path / "users.db")
+    with sqlite3.connect(database.db_path) as conn:
+        conn.execute("CREATE TABLE legacy (x)")
+    asyncio.run(database.init_db())
+    assert _auto_vacuum(database.db_path) == 0
+    assert asyncio.run(database.compact(100))["freed_pages"] == 0
+    # Режим змінює лише явний крок (python maintenance.py vacuum)
+    assert _auto_vacuum(database.db_path) == 0
+    assert asyncio.run(database.enable_incremental_vacuum()) is True
+    assert _auto_vacuum(database.db_path) == 2
@@ -0,0 +1,47 @@
+"""Інлайн-режим: обмежений кеш результатів і одне оновлення snapshot на хвилю запитів"""
+import asyncio
+
+import handlers
+from schedule_snapshot import ScheduleSnapshotStore
+
+
+def test_inline_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(handlers, "INLINE_RESULTS_CACHE_SIZE", 50)
+    handlers._inline_cache.clear()
+    for index in range(500):
+        handlers.build_inline_results(f"вулиця {index}")
+    assert len(handlers._inline_cache) == 50
+    # Найновіші запити лишаються
+    assert "вулиця 499" in handlers._inline_cache
+    handlers.build_inline_results("x" * 300)
+    assert max(len(key) for key in handlers._inline_cache) == handlers.INLINE_QUERY_MAX_LENGTH
+
+
+def test_inline_mode_answers_group_codes_only(monkeypatch):
+    handlers._inline_cache.clear()
+    monkeypatch.setattr(handlers, "_format_inline_schedule", lambda group, cherg_gpv: f"Група {group}")
+    assert [result.title for result in handlers.build_inline_results("4.1")] == ["⚡ Група 4.1"]
+    # Адреси підписників в інлайн-пошук не потрапляють
+    assert handlers.build_inline_results("вулиця Шевченка") == []
+
+
+def test_concurrent_refreshes_share_one_request(monkeypatch):
+    calls = []
+
+    async def fake_get_menu_grafics():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"today": {"date": "01.12.2025", "rawHtml": "<p>Група 1.1. Електроенергія є.</p>"}}
+
+    monkeypatch.setattr("schedule_snapshot.api_service.get_menu_grafics", fake_get_menu_grafics)
+    store = ScheduleSnapshotStore()
+
+    async def scenario():
+        results = await asyncio.gather(*(store.refresh() for _ in range(20)))
+        assert results == [True] * 20
+        assert len(calls) == 1
+        # Наступне оновлення - вже новий запит
+        assert await store.refresh() is False
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
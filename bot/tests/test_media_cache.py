@@ -0,0 +1,54 @@
+"""Кеш file_id: замінене за тим самим URL зображення завантажується заново"""
+import asyncio
+from types import SimpleNamespace
+
+import media_cache as media_module
+from database import db
+from media_cache import TelegramMediaCache
+
+URL = "https://api.loe.lviv.ua/media/today.png"
+
+
+class FakeBot:
+    def __init__(self):
+        self.uploads = 0
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if isinstance(photo, bytes):
+            self.uploads += 1
+            photo = f"file{self.uploads}"
+        self.sent.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=photo)])
+
+
+def test_expired_entry_is_revalidated_by_content(tmp_path, monkeypatch):
+    content = {"bytes": b"v1"}
+
+    async def fetch_bytes(url):
+        return content["bytes"]
+
+    monkeypatch.setattr(media_module.api_service, "fetch_bytes", fetch_bytes)
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "users.db"))
+
+    async def scenario():
+        await db.init_db()
+        bot = FakeBot()
+        cache = TelegramMediaCache(ttl=0.05)
+
+        await asyncio.gather(*(cache.send_photo(bot, chat_id, URL) for chat_id in range(10)))
+        assert bot.uploads == 1 and cache._locks == {}
+
+        # Після TTL той самий вміст - той самий file_id, без нового завантаження
+        await asyncio.sleep(0.06)
+        await cache.send_photo(bot, 1, URL)
+        assert bot.uploads == 1 and bot.sent[-1] == "file1"
+
+        # LOE замінила зображення за тим самим URL
+        content["bytes"] = b"v2"
+        await asyncio.sleep(0.06)
+        await cache.send_photo(bot, 1, URL)
+        assert bot.uploads == 2 and bot.sent[-1] == "file2"
+        assert cache._locks == {}
+
+    asyncio.run(scenario())
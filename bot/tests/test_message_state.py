@@ -0,0 +1,52 @@
+"""Кеш останніх повідомлень: у режимі external кожне читання йде в SQLite"""
+import asyncio
+
+from database import db
+from message_state import MessageStateCache, content_hash
+
+
+def test_external_mode_reads_through(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "users.db"))
+
+    async def scenario():
+        await db.init_db()
+        cache = MessageStateCache(enabled=False)
+        await cache.remember(1, 10, "01.12.2025", "A")
+        assert (await cache.get(1))["message_id"] == 10
+        # Інший процес (бот) надіслав нове повідомлення
+        await db.save_user_last_message(1, 11, "01.12.2025", content_hash("B"))
+        entry = await cache.get(1)
+        assert entry["message_id"] == 11 and entry["content_hash"] == content_hash("B")
+        assert len(cache) == 0
+
+    asyncio.run(scenario())
+
+
+def test_embedded_mode_serves_from_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "users.db"))
+
+    async def scenario():
+        await db.init_db()
+        cache = MessageStateCache(enabled=True)
+        await cache.remember(1, 10, "01.12.2025", "A")
+        await db.save_user_last_message(1, 11, "01.12.2025", content_hash("B"))
+        assert (await cache.get(1))["message_id"] == 10
+
+    asyncio.run(scenario())
+
+
+def test_reset_user_data_drops_last_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "users.db"))
+
+    async def scenario():
+        await db.init_db()
+        await db.save_user_last_message(1, 10, "01.12.2025", content_hash("A"))
+        db.start_write_behind()
+        # Відкладений запис теж не має повернути видалене
+        await db.save_user_last_message(1, 11, "01.12.2025", content_hash("B"))
+        await db.delete_all_user_data(1)
+        assert await db.get_user_last_message(1) is None
+        await db.close()
+        assert await db.get_user_last_message(1) is None
+
+    asyncio.run(scenario())
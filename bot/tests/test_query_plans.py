@@ -0,0 +1,29 @@
+"""EXPLAIN QUERY PLAN: гарячі запити йдуть по своїх індексах, без повного перебору"""
+import asyncio
+
+import aiosqlite
+import pytest
+
+from database import Database, HOT_QUERY_PLANS
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    database = Database()
+    database.db_path = str(tmp_path_factory.mktemp("plans") / "users.db")
+    asyncio.run(database.init_db())
+    return database.db_path
+
+
+async def _plan(db_path: str, query: str, params: tuple) -> list:
+    async with aiosqlite.connect(db_path) as db:
+        async with db.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+            return [row[-1] for row in await cursor.fetchall()]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERY_PLANS))
+def test_hot_query_uses_index(db_path, name):
+    query, params, index = HOT_QUERY_PLANS[name]
+    plan = asyncio.run(_plan(db_path, query, params))
+    assert any(index in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
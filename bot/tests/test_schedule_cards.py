@@ -0,0 +1,33 @@
+"""Картки графіку: кеш обмежений, завершені задачі рендеру не накопичуються"""
+import asyncio
+
+import handlers
+
+
+def test_cards_and_render_tasks_are_bounded(monkeypatch):
+    async def fake_card(user_id):
+        return f"card {user_id}", None, True
+
+    async def fake_edit(query, text, **kwargs):
+        pass
+
+    monkeypatch.setattr(handlers, "build_schedule_card", fake_card)
+    monkeypatch.setattr(handlers, "safe_edit_message", fake_edit)
+    monkeypatch.setattr(handlers, "SCHEDULE_CARD_CACHE_SIZE", 10)
+    handlers._schedule_cards.clear()
+
+    async def scenario():
+        for user_id in range(100):
+            await handlers.show_schedule(None, user_id)
+        await asyncio.sleep(0.05)
+        assert len(handlers._schedule_cards) == 10
+        assert list(handlers._schedule_cards) == list(range(90, 100))
+        assert handlers._render_tasks == {}
+
+        # Задача, скасована до старту, теж прибирається
+        await handlers.show_schedule(None, 500)
+        handlers._render_tasks[500].cancel()
+        await asyncio.sleep(0.01)
+        assert handlers._render_tasks == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+"""Історія графіків: рядок на кожну нову версію вмісту, навіть з тим самим URL"""
+import asyncio
+import shutil
+import sqlite3
+from pathlib import Path
+
+from database import Database
+
+USERS_DB = Path(__file__).resolve().parent.parent / "data" / "users.db"
+
+
+def _history(path: str, columns: str = "schedule_date, image_url, blob_hash") -> list:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT {columns} FROM schedule_history ORDER BY id").fetchall()
+
+
+def test_same_image_url_new_content_gets_history_row(tmp_path):
+    database = Database()
+    database.db_path = str(tmp_path / "users.db")
+
+    async def scenario():
+        await database.init_db()
+        assert await database.save_schedule_hash("01.12.2025", "/media/a.png", "<p>v1</p>") is True
+        assert await database.save_schedule_hash("01.12.2025", "/media/a.png", "<p>v1</p>") is False
+        assert await database.save_schedule_hash("01.12.2025", "/media/a.png", "<p>v2</p>") is True
+        # Повернення до попередньої версії - теж зміна
+        assert await database.save_schedule_hash("01.12.2025", "/media/a.png", "<p>v1</p>") is True
+
+    asyncio.run(scenario())
+    rows = _history(database.db_path)
+    assert len(rows) == 3
+    assert rows[0][2] == rows[2][2] != rows[1][2]
+    with sqlite3.connect(database.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM schedule_cache").fetchone()[0] == 1
+
+
+def test_migration_keeps_existing_history(tmp_path):
+    path = tmp_path / "users.db"
+    shutil.copy(USERS_DB, path)
+    # Файл зі старою схемою (до schedule_blobs)
+    before = _history(str(path), "id, schedule_date, image_url, created_at")
+    database = Database()
+    database.db_path = str(path)
+    asyncio.run(database.init_db())
+    assert _history(str(path), "id, schedule_date, image_url, created_at") == before
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] >= 6
+
+
+def test_publication_time_stored_and_backfilled(tmp_path):
+    database = Database()
+    database.db_path = str(tmp_path / "users.db")
+    raw_html = "<p>Графік погодинних відключень на 01.12.2025</p><p>Інформація станом на 18:30 30.11.2025</p>"
+
+    async def scenario():
+        await database.init_db()
+        await database.save_schedule_hash("01.12.2025", "/media/a.png", raw_html, "18:30 30.11.2025")
+        await database.save_schedule_hash("01.12.2025", "/media/a.png", raw_html + "<p>v2</p>")
+        publications = await database.get_schedule_publications(1)
+        assert [row["update_time"] for row in publications] == ["18:30 30.11.2025", None]
+
+    asyncio.run(scenario())
+    # Рядки, записані до міграції, отримують час з самого графіку
+    with sqlite3.connect(database.db_path) as conn:
+        conn.execute("UPDATE schedule_history SET update_time = NULL")
+        conn.execute("PRAGMA user_version = 6")
+    asyncio.run(database.init_db())
+    assert _history(database.db_path, "update_time") == [("18:30 30.11.2025",), ("18:30 30.11.2025",)]
@@ -0,0 +1,58 @@
+"""Класифікація помилок доставки і пакетна відписка недосяжних користувачів"""
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import unreachable
+from database import db
+from unreachable import PERMANENT_REASONS, UnreachablePruner, classify_delivery_error
+
+
+@pytest.mark.parametrize("error, reason", [
+    (Forbidden("Forbidden: bot was blocked by the user"), "blocked"),
+    (Forbidden("Forbidden: bot can't initiate conversation with a user"), "blocked"),
+    (Forbidden("Forbidden: user is deactivated"), "deactivated"),
+    (BadRequest("Chat not found"), "chat_not_found"),
+    (BadRequest("PEER_ID_INVALID"), "chat_not_found"),
+    (TimedOut(), "transient"),
+    (NetworkError("Bad Gateway"), "transient"),
+    (RetryAfter(5), "transient"),
+    (BadRequest("Can't parse entities: unsupported start tag"), "other"),
+    (ChatMigrated(123), "other"),
+    (RuntimeError("boom"), "other"),
+])
+def test_classify_delivery_error(error, reason):
+    assert classify_delivery_error(error) == reason
+
+
+def test_only_permanent_reasons_prune():
+    assert PERMANENT_REASONS == {"blocked", "deactivated", "chat_not_found"}
+
+
+def test_firebase_patch_only_for_firebase_users(tmp_path, monkeypatch):
+    patched = []
+
+    async def disable_notifications(user_ids):
+        patched.append(list(user_ids))
+        return True
+
+    monkeypatch.setattr(unreachable.firebase_service, "disable_notifications", disable_notifications)
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "users.db"))
+
+    async def scenario():
+        await db.init_db()
+        for user_id in (1, 2, 3):
+            await db.add_user(user_id)
+            await db.set_notifications(user_id, True)
+        pruner = UnreachablePruner(batch_size=10)
+        pruner.mark(1, "blocked", in_firebase=True)
+        pruner.mark(2, "deactivated")
+        assert 1 in pruner and 2 in pruner and 3 not in pruner
+        assert await pruner.flush() == 2
+        assert patched == [[1]]
+        enabled = {user_id: (await db.get_user(user_id))["notifications_enabled"] for user_id in (1, 2, 3)}
+        assert enabled == {1: 0, 2: 0, 3: 1}
+        assert 1 not in pruner
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+"""Відкладений запис: читання бачать пакет, що пишеться, і нічого не губиться"""
+import asyncio
+
+from database import Database
+
+
+def _make_db(tmp_path) -> Database:
+    database = Database()
+    database.db_path = str(tmp_path / "users.db")
+    return database
+
+
+# Повільний перший запис пакета: скасування гарантовано прийде посеред транзакції
+SLOW_SQL = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 2000000) "
+    "SELECT count(*) FROM c"
+)
+
+
+async def _wait_for_inflight(database: Database) -> None:
+    for _ in range(1000):
+        if database._inflight:
+            # Даємо з'єднанню відкритись і почати виконувати пакет
+            await asyncio.sleep(0.05)
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("flush did not start")
+
+
+def test_cancel_mid_flush_keeps_batch(tmp_path):
+    async def scenario():
+        database = _make_db(tmp_path)
+        await database.init_db()
+        database.start_write_behind()
+        await database._write(("slow", 0), SLOW_SQL, ())
+        for user_id in range(1, 51):
+            await database.save_user_group_hash(user_id, "01.12.2025", f"hash{user_id}")
+
+        database._flush_wake.set()
+        await _wait_for_inflight(database)
+        # Поки пакет пишеться, читання бачать його
+        assert await database.get_user_group_hash(7, "01.12.2025") == "hash7"
+        # Так раніше зупинявся відкладений запис - скасуванням посеред flush()
+        database._flush_task.cancel()
+        try:
+            await database._flush_task
+        except asyncio.CancelledError:
+            pass
+        database._flush_task = None
+
+        assert database._inflight == {}
+        assert await database.get_user_group_hash(7, "01.12.2025") == "hash7"
+        await database.close()
+        # Після закриття все в БД, буфер порожній
+        assert database._pending == {}
+        for user_id in range(1, 51):
+            assert await database.get_user_group_hash(user_id, "01.12.2025") == f"hash{user_id}"
+
+    asyncio.run(scenario())
+
+
+def test_close_waits_for_running_flush(tmp_path):
+    async def scenario():
+        database = _make_db(tmp_path)
+        await database.init_db()
+        database.start_write_behind()
+        await database._write(("slow", 0), SLOW_SQL, ())
+        for user_id in range(1, 51):
+            await database.save_user_group_hash(user_id, "01.12.2025", f"hash{user_id}")
+        database._flush_wake.set()
+        await _wait_for_inflight(database)
+        await database.close()
+        assert database._pending == {} and database._inflight == {}
+        for user_id in range(1, 51):
+            assert await database.get_user_group_hash(user_id, "01.12.2025") == f"hash{user_id}"
+
+    asyncio.run(scenario())
+
+
+def test_restore_group_hash_removes_pending_hash(tmp_path):
+    async def scenario():
+        database = _make_db(tmp_path)
+        await database.init_db()
+        await database.save_user_group_hash(1, "01.12.2025", "old")
+        database.start_write_behind()
+        await database.save_user_group_hash(1, "01.12.2025", "new")
+        await database.save_user_group_hash(2, "01.12.2025", "new")
+        # Сповіщення не потрапило в outbox - повертаємо попередній стан
+        await database.restore_user_group_hash(1, "01.12.2025", "old")
+        await database.restore_user_group_hash(2, "01.12.2025", None)
+        assert await database.get_user_group_hash(1, "01.12.2025") == "old"
+        assert await database.get_user_group_hash(2, "01.12.2025") is None
+        await database.close()
+        assert await database.get_user_group_hash(1, "01.12.2025") == "old"
+        assert await database.get_user_group_hash(2, "01.12.2025") is None
+
+    asyncio.run(scenario())
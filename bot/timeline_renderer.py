@@ -0,0 +1,220 @@
+"""Per-group 24-hour timeline images rendered from the parsed schedule"""
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+from telegram import Bot, Message
+
+from config import TIMELINE_CACHE_DIR, TIMELINE_EXECUTOR, TIMELINE_RENDER_WORKERS, TIMELINE_FONT_PATH
+from media_cache import media_cache
+from schedule_snapshot import snapshot_store
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow не встановлено - таймлайни вимкнені
+    Image = None
+
+# Рядок таймлайну: (підпис, [{"start": "08:00", "end": "12:30"}, ...])
+TimelineRow = Tuple[str, List[Dict[str, str]]]
+
+WIDTH = 960
+LEFT = 150
+RIGHT = 20
+TOP = 70
+ROW_HEIGHT = 56
+ROW_GAP = 18
+BOTTOM = 40
+
+COLOR_BG = (255, 255, 255)
+COLOR_ON = (76, 175, 80)
+COLOR_OFF = (229, 57, 53)
+COLOR_GRID = (210, 210, 210)
+COLOR_TEXT = (33, 33, 33)
+
+
+def _to_minutes(value: str) -> int:
+    hours, minutes = map(int, value.split(":"))
+    return min(hours * 60 + minutes, 24 * 60)
+
+
+def _load_font(size: int):
+    for path in (TIMELINE_FONT_PATH, "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"):
+        if path and os.path.exists(path):
+            return ImageFont.truetype(path, size), True
+    return ImageFont.load_default(), False
+
+
+def render_timeline_png(group: str, rows: List[TimelineRow]) -> bytes:
+    """Намалювати PNG з 24-годинною шкалою для кожного рядка (дня).
+
+    Чиста функція без стану - виконується у пулі потоків/процесів.
+    """
+    title_font, has_cyrillic = _load_font(26)
+    label_font, _ = _load_font(18)
+    tick_font, _ = _load_font(14)
+
+    height = TOP + len(rows) * (ROW_HEIGHT + ROW_GAP) + BOTTOM
+    image = Image.new("RGB", (WIDTH, height), COLOR_BG)
+    draw = ImageDraw.Draw(image)
+
+    title = f"Група {group}" if has_cyrillic else f"Group {group}"
+    draw.text((20, 20), title, fill=COLOR_TEXT, font=title_font)
+
+    scale = (WIDTH - LEFT - RIGHT) / (24 * 60)
+    for index, (label, outages) in enumerate(rows):
+        y0 = TOP + index * (ROW_HEIGHT + ROW_GAP)
+        y1 = y0 + ROW_HEIGHT
+        draw.text((20, y0 + ROW_HEIGHT // 2 - 10), label, fill=COLOR_TEXT, font=label_font)
+        draw.rectangle([LEFT, y0, WIDTH - RIGHT, y1], fill=COLOR_ON)
+        for outage in outages:
+            x0 = LEFT + _to_minutes(outage["start"]) * scale
+            x1 = LEFT + _to_minutes(outage["end"]) * scale
+            draw.rectangle([x0, y0, x1, y1], fill=COLOR_OFF)
+
+    # Сітка з годинами
+    grid_bottom = TOP + len(rows) * (ROW_HEIGHT + ROW_GAP) - ROW_GAP
+    for hour in range(25):
+        x = LEFT + hour * 60 * scale
+        draw.line([x, TOP, x, grid_bottom], fill=COLOR_GRID if 0 < hour < 24 else COLOR_TEXT, width=1)
+        if hour % 2 == 0:
+            draw.text((x - 8, grid_bottom + 6), f"{hour:02d}", fill=COLOR_TEXT, font=tick_font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_file(path: str, content: bytes) -> None:
+    """Атомарний запис: читачі не побачать недописаний PNG"""
+    os.makedirs(TIMELINE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale_files(keep_prefix: str) -> None:
+    if not os.path.isdir(TIMELINE_CACHE_DIR):
+        return
+    for name in os.listdir(TIMELINE_CACHE_DIR):
+        if name.endswith(".png") and not name.startswith(keep_prefix):
+            try:
+                os.remove(os.path.join(TIMELINE_CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+class TimelineService:
+    """Рендерить і кешує таймлайни по (версія snapshot, група).
+
+    На кожну зміну графіку рендериться не більше одного зображення на групу:
+    результат кешується на диску і як file_id у Telegram, а паралельні
+    запити на ту саму групу чекають один рендер.
+    """
+
+    def __init__(self) -> None:
+        self._executor: Optional[Executor] = None
+        # {(version, group): Future[bytes]}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._cache_version = ""
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if TIMELINE_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=TIMELINE_RENDER_WORKERS)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=TIMELINE_RENDER_WORKERS,
+                    thread_name_prefix="timeline"
+                )
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _cache_path(self, version: str, group: str) -> str:
+        return os.path.join(TIMELINE_CACHE_DIR, f"{version[:16]}_{group}.png")
+
+    async def _drop_stale_files(self, version: str) -> None:
+        """Видалити зображення попередніх версій графіку"""
+        if self._cache_version == version:
+            return
+        self._cache_version = version
+        await asyncio.to_thread(_remove_stale_files, f"{version[:16]}_")
+
+    def _build_rows(self, cherg_gpv: str) -> List[TimelineRow]:
+        rows: List[TimelineRow] = []
+        for day in ("today", "tomorrow"):
+            parsed = snapshot_store.get_parsed(day, cherg_gpv)
+            if parsed is None:
+                continue
+            date = snapshot_store.get_day(day).get("date", "")
+            rows.append((date[:5] or day, parsed.get("outages", [])))
+        return rows
+
+    async def get_png(self, cherg_gpv: str, group: str) -> Optional[bytes]:
+        """Отримати PNG для групи з кешу або відрендерити його"""
+        version = snapshot_store.version
+        if not self.available or not version:
+            return None
+        await self._drop_stale_files(version)
+
+        # Файловий кеш і рендер - поза event loop; паралельні запити чекають один
+        key = (version, group)
+        future = self._inflight.get(key)
+        if future is None:
+            # Рядки беремо зараз - поки читається файл, snapshot може оновитись
+            rows = self._build_rows(cherg_gpv)
+            future = asyncio.ensure_future(
+                self._load_or_render(self._cache_path(version, group), group, rows)
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load_or_render(self, path: str, group: str,
+                              rows: List[TimelineRow]) -> Optional[bytes]:
+        content = await asyncio.to_thread(_read_file, path)
+        if content is not None:
+            return content
+        if not rows:
+            return None
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(self._get_executor(), render_timeline_png, group, rows)
+        await asyncio.to_thread(_write_file, path, content)
+        return content
+
+    async def send_timeline(self, bot: Bot, chat_id: int, cherg_gpv: str,
+                            group: str, **kwargs) -> Optional[Message]:
+        """Надіслати таймлайн групи, повторно використовуючи file_id"""
+        version = snapshot_store.version
+        if not self.available or not version:
+            return None
+        key = f"timeline://{version}/{group}"
+        if await media_cache.get_file_id(key):
+            return await media_cache.send_photo(bot, chat_id, key, **kwargs)
+        content = await self.get_png(cherg_gpv, group)
+        if content is None:
+            return None
+        return await media_cache.send_photo(bot, chat_id, key, content=content, **kwargs)
+
+
+timeline_service = TimelineService()
@@ -0,0 +1,170 @@
+"""Per-cycle tracing spans and an on-demand profiler"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import TRACE_BUFFER_SIZE, PROFILE_TOP
+from logs import get_logger
+
+log = get_logger(__name__)
+
+PROFILE_MODES = ("cpu", "memory")
+
+
+class Trace:
+    """Один цикл сповіщень або обробка однієї кнопки.
+
+    Спани агрегуються за назвою (кількість, сума, максимум) - цикл на
+    100k користувачів не створює 100k записів. Спани з паралельних задач
+    конвеєра можуть перекриватися, тож їх сума буває більшою за тривалість.
+    """
+
+    __slots__ = ("kind", "name", "started_at", "duration", "error", "spans", "_started")
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self.started_at = datetime.now()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        # {назва: [кількість, сума, максимум]}
+        self.spans: Dict[str, List[float]] = {}
+        self._started = time.perf_counter()
+
+    def add(self, name: str, seconds: float) -> None:
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [1, seconds, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+
+    def format(self) -> str:
+        status = f" ERROR {self.error}" if self.error else ""
+        lines = [
+            f"{self.started_at:%d.%m %H:%M:%S} {self.kind}:{self.name} "
+            f"{(self.duration or 0) * 1000:.1f} ms{status}"
+        ]
+        for name, (count, total, longest) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"  {name:<32} n={int(count):<6} total={total * 1000:9.1f} ms  max={longest * 1000:8.1f} ms"
+            )
+        return "\n".join(lines)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class _ProfileRequest:
+    def __init__(self, mode: str, top: int) -> None:
+        self.mode = mode
+        self.top = top
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def begin(self) -> None:
+        if self.mode == "memory":
+            tracemalloc.start(25)
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def finish(self, trace: Trace) -> None:
+        header = f"{trace.kind}:{trace.name} {trace.started_at:%d.%m.%Y %H:%M:%S}, {trace.duration:.3f}s\n\n"
+        if self.mode == "memory":
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            stats = snapshot.statistics("lineno")[:self.top]
+            body = "\n".join(str(stat) for stat in stats)
+        else:
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats("tottime").print_stats(self.top)
+            body = stream.getvalue()
+        filename = f"profile-{self.mode}-{trace.started_at:%Y%m%d-%H%M%S}.txt"
+        if not self.future.done():
+            self.future.set_result((filename, (header + body).encode("utf-8")))
+
+
+class Tracer:
+    """Кільцевий буфер останніх трас і перемикач профілювання"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE) -> None:
+        self.traces: Deque[Trace] = deque(maxlen=size)
+        self._profile: Optional[_ProfileRequest] = None
+
+    @contextmanager
+    def trace(self, kind: str, name: str) -> Iterator[Trace]:
+        trace = Trace(kind, name)
+        token = _current.set(trace)
+        # Профілюється лише наступний цикл сповіщень, не кнопки
+        profile = self._profile if kind == "cycle" else None
+        if profile:
+            self._profile = None
+            profile.begin()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = type(e).__name__
+            raise
+        finally:
+            trace.duration = time.perf_counter() - trace._started
+            _current.reset(token)
+            self.traces.append(trace)
+            if profile:
+                try:
+                    profile.finish(trace)
+                except Exception as e:
+                    log.error("Profiler failed", error=e)
+                    if not profile.future.done():
+                        profile.future.set_exception(e)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        trace = _current.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace.duration is None:
+                trace.add(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Додати вже виміряний інтервал до поточної траси (якщо вона є)"""
+        trace = _current.get()
+        # Фонові задачі, що пережили трасу, її вже не змінюють
+        if trace is not None and trace.duration is None:
+            trace.add(name, seconds)
+
+    def recent(self, limit: int = 5, kind: Optional[str] = None) -> List[Trace]:
+        traces = [trace for trace in self.traces if kind is None or trace.kind == kind]
+        return traces[-limit:]
+
+    def request_profile(self, mode: str = "cpu", top: int = PROFILE_TOP) -> asyncio.Future:
+        """Профілювати наступний цикл; future -> (ім'я файлу, звіт у байтах)"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        if self._profile is None:
+            self._profile = _ProfileRequest(mode, top)
+        return self._profile.future
+
+    @property
+    def profile_pending(self) -> Optional[Tuple[str, int]]:
+        return (self._profile.mode, self._profile.top) if self._profile else None
+
+
+tracer = Tracer()
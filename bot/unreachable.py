@@ -0,0 +1,137 @@
+"""Delivery error classification and batched pruning of unreachable subscribers"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Optional, Set
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from database import db
+from firebase_service import firebase_service
+from metrics import SUBSCRIBERS_PRUNED
+from config import PRUNE_INTERVAL, PRUNE_BATCH_SIZE
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Причини, з якими повідомлення в цей чат уже не дійде ніколи
+PERMANENT_REASONS = frozenset({"blocked", "deactivated", "chat_not_found"})
+
+
+def classify_delivery_error(error: Exception) -> str:
+    """Причина помилки надсилання: blocked, deactivated, chat_not_found,
+    transient (мережа, таймаут, ліміт) або other (помилка в самому запиті)
+    """
+    text = str(error).lower()
+    if isinstance(error, Forbidden):
+        if "deactivated" in text:
+            return "deactivated"
+        # "bot was blocked by the user", "bot can't initiate conversation with a user"
+        return "blocked"
+    # BadRequest і TimedOut - підкласи NetworkError, тож BadRequest перевіряється першим
+    if isinstance(error, BadRequest):
+        if "chat not found" in text or "user not found" in text or "peer_id_invalid" in text:
+            return "chat_not_found"
+        return "other"
+    if isinstance(error, (NetworkError, RetryAfter)):
+        return "transient"
+    return "other"
+
+
+class UnreachablePruner:
+    """Відписує користувачів, яким повідомлення вже не доставити.
+
+    Розсилка лише позначає користувача (mark), а вимкнення сповіщень у
+    SQLite і Firebase виконується пакетами у фоні - раз на `interval`
+    секунд або щойно назбирається `batch_size` користувачів. Позначених
+    користувачів розсилка пропускає одразу, не чекаючи запису.
+    """
+
+    def __init__(self, interval: float = PRUNE_INTERVAL, batch_size: int = PRUNE_BATCH_SIZE) -> None:
+        self.interval = interval
+        self.batch_size = batch_size
+        # {user_id: причина} - чекають запису (або записуються зараз)
+        self._queued: Dict[int, str] = {}
+        self._flushing: Dict[int, str] = {}
+        # Ті з них, чий профіль є у Firebase (решта - лише в SQLite: PATCH
+        # для них створив би в Firebase неповний вузол користувача)
+        self._in_firebase: Set[int] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._queued or user_id in self._flushing
+
+    def mark(self, user_id: int, reason: str, in_firebase: bool = False) -> None:
+        """Поставити користувача в чергу на відписку.
+
+        in_firebase - користувач прийшов у цикл зі списку підписників Firebase.
+        """
+        if user_id in self:
+            return
+        self._queued[user_id] = reason
+        if in_firebase:
+            self._in_firebase.add(user_id)
+        if self._wake is not None and len(self._queued) >= self.batch_size:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Зупинити фоновий запис і відписати всіх, хто лишився в черзі"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Записати чергу пакетами; повертає кількість відписаних"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        pruned = 0
+        async with self._lock:
+            while self._queued:
+                user_ids = list(self._queued)[:self.batch_size]
+                self._flushing = {user_id: self._queued.pop(user_id) for user_id in user_ids}
+                done = False
+                try:
+                    # SQLite - завжди, бо без Firebase підписники беруться з неї
+                    stored = await db.disable_notifications(user_ids)
+                    synced = await firebase_service.disable_notifications(
+                        [user_id for user_id in user_ids if user_id in self._in_firebase]
+                    )
+                    done = stored and synced
+                except Exception as e:
+                    log.error("Failed to prune unreachable users", users=len(user_ids), error=e)
+                finally:
+                    if not done:
+                        # Помилка або зупинка посеред запису: повторимо наступним
+                        # проходом (оновлення ідемпотентні)
+                        self._queued.update(self._flushing)
+                        self._flushing = {}
+                if not done:
+                    break
+                for reason in self._flushing.values():
+                    SUBSCRIBERS_PRUNED.inc(reason=reason)
+                self._in_firebase.difference_update(user_ids)
+                pruned += len(user_ids)
+                self._flushing = {}
+        if pruned:
+            log.info("Unreachable users unsubscribed", users=pruned)
+        return pruned
+
+
+unreachable_pruner = UnreachablePruner()
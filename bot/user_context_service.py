@@ -5,6 +5,10 @@ from typing import Optional, Dict, Any
 
 from database import db
 from firebase_service import firebase_service
+from config import LOG_SAMPLE_RATE
+from logs import get_logger
+
+log = get_logger(__name__)
 
 
 def _pick(data: Dict[str, Any], *keys: str) -> Optional[str]:
@@ -31,16 +35,16 @@ class UserContextService:
         # Спочатку перевіряємо Firebase (пріоритет)
         firebase_context = await self._get_from_firebase(user_id)
         if firebase_context and firebase_context.get("cherg_gpv"):
-            print(f"[CONTEXT] Got context from Firebase for user {user_id}")
+            log.debug("Got context from Firebase", user_id=user_id, sample=LOG_SAMPLE_RATE)
             return firebase_context
         
         # Якщо в Firebase немає, перевіряємо локальну БД
         local_context = await db.get_schedule_context(user_id)
         if local_context and local_context.get("cherg_gpv"):
-            print(f"[CONTEXT] Got context from local DB for user {user_id}")
+            log.debug("Got context from local DB", user_id=user_id, sample=LOG_SAMPLE_RATE)
             return local_context
         
-        print(f"[CONTEXT] No context found for user {user_id}")
+        log.debug("No context found", user_id=user_id, sample=LOG_SAMPLE_RATE)
         return None
 
     async def _get_from_firebase(self, user_id: int) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,136 @@
+"""Warm restart: hot in-memory state persisted to a local JSON file"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import STATE_SAVE_INTERVAL, STATE_MAX_AGE
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Версія формату файлу: інша версія - файл ігнорується
+STATE_FORMAT = 1
+
+Exporter = Callable[[], Any]
+Restorer = Callable[[Any], Any]
+
+
+class WarmStateStore:
+    """Зберігає гарячий стан сервісів у файл і відновлює його при старті.
+
+    Кожен сервіс реєструє розділ - функції export (знімок стану, придатний
+    для JSON) і restore. Файл пишеться при зупинці і раз на
+    STATE_SAVE_INTERVAL секунд: серіалізація і запис - в окремому потоці,
+    через тимчасовий файл і os.replace, тож обірваний запис не псує
+    попередню версію. Файл, старший за STATE_MAX_AGE, не відновлюється -
+    за цей час графік і підписники встигли б змінитися.
+    """
+
+    def __init__(self, path: str, interval: float = STATE_SAVE_INTERVAL,
+                 max_age: float = STATE_MAX_AGE) -> None:
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._sections: Dict[str, Tuple[Exporter, Restorer]] = {}
+        # Розділи з файлу, які ще не забрав жоден сервіс
+        self._loaded: Dict[str, Any] = {}
+        self._digest: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def load(self) -> bool:
+        """Прочитати файл стану (до реєстрації розділів)"""
+        try:
+            data = await asyncio.to_thread(self._read)
+        except Exception as e:
+            log.error("Failed to read warm state", path=self.path, error=e)
+            return False
+        if not data:
+            return False
+        if data.get("format") != STATE_FORMAT:
+            log.warning("Ignoring warm state of another format", path=self.path)
+            return False
+        age = time.time() - data.get("saved_at", 0)
+        if age > self.max_age:
+            log.info("Ignoring stale warm state", path=self.path, age=f"{age:.0f}s")
+            return False
+        self._loaded = data.get("sections", {})
+        log.info("Warm state loaded", path=self.path, age=f"{age:.0f}s", sections=",".join(self._loaded))
+        return True
+
+    def register(self, name: str, export: Exporter, restore: Restorer) -> bool:
+        """Додати розділ і одразу відновити його з файлу (якщо він там є).
+
+        Повертає True, якщо стан відновлено.
+        """
+        self._sections[name] = (export, restore)
+        data = self._loaded.pop(name, None)
+        if data is None:
+            return False
+        try:
+            restore(data)
+            return True
+        except Exception as e:
+            log.error("Failed to restore warm state section", section=name, error=e)
+            return False
+
+    def _export(self) -> Dict[str, Any]:
+        sections = {}
+        for name, (export, _) in self._sections.items():
+            try:
+                sections[name] = export()
+            except Exception as e:
+                log.error("Failed to export warm state section", section=name, error=e)
+        return sections
+
+    def _write(self, sections: Dict[str, Any]) -> bool:
+        body = json.dumps(sections, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        digest = hashlib.md5(body.encode("utf-8")).hexdigest()
+        if digest == self._digest:
+            return False
+        payload = '{"format":%d,"saved_at":%.3f,"sections":%s}' % (STATE_FORMAT, time.time(), body)
+        tmp_path = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._digest = digest
+        return True
+
+    async def save(self) -> bool:
+        """Записати стан. Знімок береться в циклі подій, JSON і запис - у потоці"""
+        sections = self._export()
+        try:
+            return await asyncio.to_thread(self._write, sections)
+        except Exception as e:
+            log.error("Failed to save warm state", path=self.path, error=e)
+            return False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Зупинити періодичний запис і зберегти стан востаннє"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.save()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()